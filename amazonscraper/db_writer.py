@@ -0,0 +1,95 @@
+"""
+Background database writer for Scrapy item pipelines
+"""
+import logging
+
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+from database.query_stats import query_source
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWriter:
+    """
+    Runs blocking database calls on a dedicated thread pool so the reactor
+    thread keeps driving downloads while writes are in flight.
+
+    At most ``max_pending`` calls are queued or running at once. Further
+    submissions wait on a DeferredSemaphore; the items behind them stay
+    unfinished, which fills the scraper slot and throttles the crawl instead
+    of letting the write backlog grow without bound.
+    """
+
+    def __init__(self, threads: int = 1, max_pending: int = 32):
+        self.threads = max(1, threads)
+        self.max_pending = max(1, max_pending)
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=self.threads, name='DatabaseWriter')
+        self.semaphore = defer.DeferredSemaphore(self.max_pending)
+        self.submitted_count = 0
+        self.failed_count = 0
+        self.peak_pending = 0
+        self.shutdown_trigger = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            threads=settings.getint('DATABASE_WRITER_THREADS', 1),
+            max_pending=settings.getint('DATABASE_WRITER_QUEUE_SIZE', 32),
+        )
+
+    @property
+    def pending(self) -> int:
+        """Number of writes running or waiting for a slot"""
+        return self.max_pending - self.semaphore.tokens + len(self.semaphore.waiting)
+
+    def start(self):
+        """Start the writer threads"""
+        if not self.threadpool.started:
+            self.threadpool.start()
+            self.shutdown_trigger = reactor.addSystemEventTrigger('during', 'shutdown', self._reactor_shutdown)
+            logger.info(f"Database writer started with {self.threads} thread(s), queue size {self.max_pending}")
+
+    def submit(self, func, *args, **kwargs) -> defer.Deferred:
+        """Run func(*args, **kwargs) on a writer thread, returning a Deferred with its result"""
+        self.submitted_count += 1
+        # Slow-query logs name the pipeline method the write came from
+        source = getattr(func, '__qualname__', repr(func))
+        d = self.semaphore.run(threads.deferToThreadPool, reactor, self.threadpool,
+                               _run_as_source, source, func, *args, **kwargs)
+        self.peak_pending = max(self.peak_pending, self.pending)
+        d.addErrback(self._write_failed)
+        return d
+
+    def _write_failed(self, failure):
+        self.failed_count += 1
+        logger.error(f"Database write failed: {failure.getErrorMessage()}")
+        return failure
+
+    def stop(self) -> defer.Deferred:
+        """Wait for every queued write to finish, then stop the writer threads"""
+        # The semaphore queues waiters in order, so holding every token means
+        # all previously submitted writes have completed.
+        drained = defer.gatherResults([self.semaphore.acquire() for _ in range(self.max_pending)])
+        drained.addCallback(lambda _: self._stop_threadpool())
+        return drained
+
+    def _reactor_shutdown(self):
+        # The trigger has already been consumed, so it must not be removed again
+        self.shutdown_trigger = None
+        self._stop_threadpool()
+
+    def _stop_threadpool(self):
+        if self.shutdown_trigger is not None:
+            reactor.removeSystemEventTrigger(self.shutdown_trigger)
+            self.shutdown_trigger = None
+        if self.threadpool.started and not self.threadpool.joined:
+            self.threadpool.stop()
+            logger.info(f"Database writer stopped. Submitted: {self.submitted_count}, "
+                        f"Failed: {self.failed_count}, Peak pending: {self.peak_pending}")
+
+
+def _run_as_source(source: str, func, *args, **kwargs):
+    with query_source(source):
+        return func(*args, **kwargs)
@@ -0,0 +1,161 @@
+"""
+Content-addressed image storage for the image download pipeline
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStore:
+    """
+    Stores every distinct image once, keyed by the SHA-1 of its bytes.
+
+    Files live under ``<root>/full/<2 hex>/<sha1><ext>``. A SQLite index maps
+    each source URL to the content hash it produced, so a URL that was fetched
+    within ``expires_days`` is served from disk without another request, and
+    the same picture reached through different URLs is written only once.
+    The index is used from the reactor thread only.
+    """
+
+    def __init__(self, root: str, expires_days: int = 90):
+        self.root = root
+        self.expires_seconds = expires_days * 86400
+        os.makedirs(os.path.join(root, 'full'), exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS image_urls (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                content_hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                width INTEGER,
+                height INTEGER
+            )
+        """)
+
+    @staticmethod
+    def content_hash(body: bytes) -> str:
+        return hashlib.sha1(body).hexdigest()
+
+    def relative_path(self, content_hash: str, extension: str, kind: str = 'full') -> str:
+        return os.path.join(kind, content_hash[:2], f"{content_hash}{extension}")
+
+    def absolute_path(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+
+    @staticmethod
+    def guess_extension(content_type: Optional[str], url: str) -> str:
+        extension = None
+        if content_type:
+            extension = mimetypes.guess_extension(content_type.split(';')[0].strip())
+        if not extension:
+            extension = os.path.splitext(url.split('?')[0])[1].lower()
+        if extension in ('.jpe', '.jpeg', ''):
+            extension = '.jpg'
+        return extension
+
+    def lookup_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the stored image for a URL if it is still fresh and on disk"""
+        row = self.connection.execute("""
+            SELECT i.content_hash, i.path, i.file_size, i.width, i.height, u.fetched_at
+            FROM image_urls u JOIN images i ON i.content_hash = u.content_hash
+            WHERE u.url = ?
+        """, (url,)).fetchone()
+        if not row:
+            return None
+
+        content_hash, path, file_size, width, height, fetched_at = row
+        if self.expires_seconds and time.time() - fetched_at > self.expires_seconds:
+            return None
+        if not os.path.exists(self.absolute_path(path)):
+            return None
+
+        return {'content_hash': content_hash, 'path': path, 'file_size': file_size,
+                'width': width, 'height': height}
+
+    def lookup_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute(
+            "SELECT path, file_size, width, height FROM images WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if not row or not os.path.exists(self.absolute_path(row[0])):
+            return None
+        path, file_size, width, height = row
+        return {'content_hash': content_hash, 'path': path, 'file_size': file_size,
+                'width': width, 'height': height}
+
+    def write_file(self, relative_path: str, body: bytes):
+        """Write image bytes atomically; safe to call from a worker thread"""
+        path = self.absolute_path(relative_path)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def record(self, url: str, content_hash: str, relative_path: str, file_size: int,
+               width: Optional[int] = None, height: Optional[int] = None):
+        """Index a stored image and the URL it came from"""
+        self.connection.execute("""
+            INSERT INTO images (content_hash, path, file_size, width, height) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                width = COALESCE(excluded.width, images.width),
+                height = COALESCE(excluded.height, images.height)
+        """, (content_hash, relative_path, file_size, width, height))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO image_urls (url, content_hash, fetched_at) VALUES (?, ?, ?)",
+            (url, content_hash, time.time())
+        )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def make_thumbnails(root: str, relative_path: str, content_hash: str,
+                    thumbs: Dict[str, Tuple[int, int]], min_width: int = 0,
+                    min_height: int = 0) -> Tuple[int, int, bool]:
+    """
+    Read a stored image and write its thumbnails.
+
+    Runs in a worker process. Returns (width, height, accepted); images smaller
+    than the minimum size are not accepted and get no thumbnails.
+    """
+    from PIL import Image
+
+    with Image.open(os.path.join(root, relative_path)) as image:
+        width, height = image.size
+        if width < min_width or height < min_height:
+            return width, height, False
+
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        for name, size in thumbs.items():
+            thumb_path = os.path.join(root, 'thumbs', name, content_hash[:2], f"{content_hash}.jpg")
+            if os.path.exists(thumb_path):
+                continue
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size, Image.LANCZOS)
+            tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+            thumbnail.save(tmp_path, 'JPEG', quality=85)
+            os.replace(tmp_path, thumb_path)
+
+    return width, height, True
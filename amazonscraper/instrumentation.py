@@ -0,0 +1,226 @@
+"""
+Per-stage timing and throughput instrumentation for item pipelines
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from scrapy import signals
+from scrapy.exceptions import DropItem
+from twisted.internet import defer
+
+from database.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class StageMetrics:
+    """Counters and latency histogram for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyHistogram()
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.drops = Counter()
+        self.first_item_at = None
+        self.last_item_at = None
+
+    def started(self):
+        now = time.time()
+        if self.first_item_at is None:
+            self.first_item_at = now
+        self.items_in += 1
+
+    def finished(self, seconds: float, outcome: str, reason: Optional[str] = None):
+        self.latency.record(seconds)
+        self.last_item_at = time.time()
+        if outcome == 'passed':
+            self.items_out += 1
+        elif outcome == 'dropped':
+            self.drops[reason or 'unspecified'] += 1
+        else:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self.last_item_at - self.first_item_at) if self.first_item_at and self.last_item_at else 0.0
+        busy = self.latency.total
+        return {
+            'stage': self.name,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'errors': self.errors,
+            'dropped': sum(self.drops.values()),
+            'drop_reasons': dict(self.drops),
+            'wall_seconds': round(elapsed, 3),
+            'busy_seconds': round(busy, 3),
+            'items_per_sec': round(self.latency.count / elapsed, 2) if elapsed > 0 else None,
+            'capacity_items_per_sec': round(self.latency.count / busy, 2) if busy > 0 else None,
+            'latency_ms': self.latency.to_dict(),
+        }
+
+
+class PipelineMetrics:
+    """Registry of StageMetrics keyed by pipeline class name, in pipeline order"""
+
+    def __init__(self):
+        self.stages: Dict[str, StageMetrics] = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name: str) -> StageMetrics:
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, StageMetrics(name))
+        return stage
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'stages': [stage.to_dict() for stage in self.stages.values()],
+        }
+
+    def log_summary(self):
+        logger.info("=== PIPELINE STAGE TIMINGS ===")
+        for stage in self.stages.values():
+            data = stage.to_dict()
+            latency = data['latency_ms']
+            logger.info(
+                f"{data['stage']}: in={data['items_in']} out={data['items_out']} dropped={data['dropped']} "
+                f"errors={data['errors']} items/sec={data['items_per_sec']} "
+                f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms max={latency['max']}ms"
+            )
+            if data['drop_reasons']:
+                logger.info(f"{data['stage']} drop reasons: {data['drop_reasons']}")
+        logger.info("==============================")
+
+
+# Global metrics registry shared by every instrumented pipeline
+pipeline_metrics = PipelineMetrics()
+
+
+class Dropped:
+    """Return value of InstrumentedPipeline.drop(), carrying the drop reason"""
+
+    __slots__ = ('reason',)
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+def _instrument(process_item):
+    @wraps(process_item)
+    def wrapper(self, item, spider):
+        stage = pipeline_metrics.stage(type(self).__name__)
+        stage.started()
+        start = time.perf_counter()
+
+        try:
+            result = process_item(self, item, spider)
+        except DropItem as e:
+            stage.finished(time.perf_counter() - start, 'dropped', str(e) or 'DropItem')
+            raise
+        except Exception:
+            stage.finished(time.perf_counter() - start, 'error')
+            raise
+
+        if isinstance(result, defer.Deferred):
+            result.addCallbacks(
+                lambda value: _settle(stage, start, value),
+                lambda failure: _failed(stage, start, failure),
+            )
+            return result
+        return _settle(stage, start, result)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _settle(stage: StageMetrics, start: float, result):
+    elapsed = time.perf_counter() - start
+    # A None result used to be passed on to the next stage; report it to
+    # Scrapy as a drop instead so later stages never receive None
+    if isinstance(result, Dropped):
+        stage.finished(elapsed, 'dropped', result.reason)
+        raise DropItem(result.reason)
+    if result is None:
+        stage.finished(elapsed, 'dropped', 'filtered')
+        raise DropItem(f"Filtered by {stage.name}")
+    stage.finished(elapsed, 'passed')
+    return result
+
+
+def _failed(stage: StageMetrics, start: float, failure):
+    if failure.check(DropItem):
+        stage.finished(time.perf_counter() - start, 'dropped', failure.getErrorMessage() or 'DropItem')
+    else:
+        stage.finished(time.perf_counter() - start, 'error')
+    return failure
+
+
+class InstrumentedPipeline:
+    """
+    Base class that times every call to a subclass's process_item.
+
+    Latency, items in/out, errors and drops per reason are recorded in
+    pipeline_metrics under the class name. Deferred results are timed until
+    they fire. Subclasses drop items with ``return self.drop('reason')``.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        process_item = cls.__dict__.get('process_item')
+        if process_item is not None and not getattr(process_item, 'instrumented', False):
+            cls.process_item = _instrument(process_item)
+
+    @staticmethod
+    def drop(reason: str) -> Dropped:
+        return Dropped(reason)
+
+
+class PipelineMetricsExtension:
+    """
+    Logs the per-stage summary and writes it as JSON once the spider closes.
+
+    spider_closed fires after every pipeline's close_spider has finished, so
+    writes that complete during shutdown are included.
+    """
+
+    def __init__(self, output_path: Optional[str] = None):
+        self.output_path = output_path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.settings.get('PIPELINE_METRICS_FILE'))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        pipeline_metrics.reset()
+
+    def spider_closed(self, spider, reason):
+        pipeline_metrics.log_summary()
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = (self.output_path or "pipeline_metrics_{spider}_{timestamp}.json").format(
+            spider=spider.name, timestamp=timestamp
+        )
+        try:
+            summary = pipeline_metrics.summary()
+            summary.update({'spider': spider.name, 'close_reason': reason})
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            logger.info(f"Wrote pipeline metrics to {path}")
+        except Exception as e:
+            logger.error(f"Error writing pipeline metrics: {e}")
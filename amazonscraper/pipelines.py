@@ -7,21 +7,34 @@
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 import logging
-from typing import Dict, Any, Optional
-import json
+from typing import Dict, Any, List, Optional
+import time
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-from data_processing.processor import data_processor
+from scrapy import Request
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer, reactor, task, threads
+from twisted.python.failure import Failure
+
+from data_processing.processor import get_data_processor
 from database.db_manager import get_db_manager
+from amazonscraper.db_writer import DatabaseWriter
+from amazonscraper.streaming import StreamingItemWriter
+from amazonscraper.seen_store import SeenStore, item_fingerprint
+from amazonscraper.image_store import ImageStore, make_thumbnails
+from amazonscraper.instrumentation import InstrumentedPipeline
 
 logger = logging.getLogger(__name__)
 
 
-class DataProcessingPipeline:
+class DataProcessingPipeline(InstrumentedPipeline):
     """Pipeline for processing and normalizing scraped data"""
     
     def __init__(self):
-        self.processor = data_processor
+        self.processor = get_data_processor()
         self.processed_count = 0
         self.filtered_count = 0
     
@@ -43,130 +56,293 @@ class DataProcessingPipeline:
             else:
                 self.filtered_count += 1
                 logger.info(f"Item filtered out by curation rules. Total filtered: {self.filtered_count}")
-                return None
+                return self.drop('curation_rules')
                 
         except Exception as e:
             logger.error(f"Error processing item: {e}")
-            return None
+            return self.drop('processing_error')
     
     def close_spider(self, spider):
         """Called when spider closes"""
         logger.info(f"Data processing pipeline closed. Processed: {self.processed_count}, Filtered: {self.filtered_count}")
 
 
-class DatabasePipeline:
-    """Pipeline for saving items to database"""
+class DatabasePipeline(InstrumentedPipeline):
+    """
+    Pipeline for saving items to database.
     
-    def __init__(self):
-        self.db_manager = get_db_manager()
+    Writes run on a DatabaseWriter thread pool and process_item returns a Deferred,
+    so the reactor keeps downloading while rows are written. With DATABASE_BATCH_SIZE > 0
+    items are buffered and written in bulk, either when the buffer is full or when
+    DATABASE_FLUSH_INTERVAL seconds have passed since the last flush. A batch size of 0
+    writes every item on its own.
+    
+    With SIMILARITY_INDEX_PATH set, every inserted or changed product is matched
+    against the catalog's similarity index as soon as it is written, so duplicates
+    across platforms are grouped on arrival instead of by a nightly full pass.
+    """
+    
+    def __init__(self, batch_size: int = 0, flush_interval: float = 5.0, writer: Optional[DatabaseWriter] = None,
+                 similarity_index_path: Optional[str] = None):
+        self._db_manager = None
+        self.similarity_index_path = similarity_index_path
+        self.similarity_index = None
+        self.writer = writer or DatabaseWriter()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.flush_task = None
         self.saved_count = 0
         self.error_count = 0
+        self.flush_count = 0
+        self.duplicate_count = 0
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint('DATABASE_BATCH_SIZE', 0),
+            flush_interval=crawler.settings.getfloat('DATABASE_FLUSH_INTERVAL', 5.0),
+            writer=DatabaseWriter.from_settings(crawler.settings),
+            similarity_index_path=crawler.settings.get('SIMILARITY_INDEX_PATH'),
+        )
+
+    @property
+    def db_manager(self):
+        """Database manager, looked up on first use from a writer thread"""
+        if self._db_manager is None:
+            self._db_manager = get_db_manager()
+        return self._db_manager
+
+    def open_spider(self, spider):
+        """Start the writer threads and, in batch mode, the periodic flush"""
+        if self.similarity_index_path:
+            # numpy is only imported when products are matched on arrival. The index
+            # scores with the global deduplicator, as deduplicate_database does
+            from data_processing.deduplication import deduplicator
+            self.similarity_index = deduplicator.similarity_index(self.similarity_index_path)
+        self.writer.start()
+        if self.batch_size > 0 and self.flush_interval > 0:
+            self.flush_task = task.LoopingCall(self.flush_if_due)
+            self.flush_task.start(self.flush_interval, now=False)
     
     def process_item(self, item, spider):
         """Save item to database"""
+        product_data = dict(ItemAdapter(item))
+        
+        if self.batch_size > 0:
+            self.buffer.append(product_data)
+            if len(self.buffer) >= self.batch_size:
+                # Holding back the item that filled the buffer until its batch is
+                # queued and written keeps the scraper from outrunning the writer
+                return self.flush().addCallback(lambda _: item)
+            return item
+        
+        d = self.writer.submit(self.save_single, product_data)
+        d.addCallback(self.item_saved, item)
+        return d
+    
+    def item_saved(self, product_id: Optional[str], item):
+        """Count the result of a single-item write (runs on the reactor thread)"""
+        if product_id:
+            self.saved_count += 1
+            return item
+        self.error_count += 1
+        return self.drop('database_write_failed')
+    
+    def flush_if_due(self):
+        """Flush the buffer if the flush interval has elapsed"""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            return self.flush()
+    
+    def flush(self) -> defer.Deferred:
+        """Hand all buffered items to the writer as a single bulk transaction"""
+        batch, self.buffer = self.buffer, []
+        self.last_flush = time.monotonic()
+        if not batch:
+            return defer.succeed(None)
+        
+        d = self.writer.submit(self.write_batch, batch)
+        d.addCallbacks(self.batch_written, self.batch_failed,
+                       callbackArgs=(len(batch),), errbackArgs=(len(batch),))
+        return d
+    
+    def write_batch(self, batch: List[Dict[str, Any]]) -> int:
+        """Upsert a batch of items and return how many were saved (runs on a writer thread)"""
         try:
-            adapter = ItemAdapter(item)
-            product_data = dict(adapter)
-            
-            # Save to database
-            product_id = self.db_manager.insert_product(product_data)
-            
-            if product_id:
-                self.saved_count += 1
-                logger.info(f"Saved item to database: {product_id}")
-                
-                # Save related data
-                self.save_related_data(product_id, product_data)
-                
-                return item
-            else:
-                self.error_count += 1
-                logger.error(f"Failed to save item to database")
-                return None
-                
+            results = self.db_manager.upsert_products(batch)
+            logger.info(f"Flushed {len(batch)} items to database, saved {len(results)}")
         except Exception as e:
-            self.error_count += 1
-            logger.error(f"Error saving item to database: {e}")
-            return None
+            # One bad row aborts the whole batch, so retry the items individually
+            logger.error(f"Bulk flush of {len(batch)} items failed, retrying one by one: {e}")
+            return sum(1 for product_data in batch if self.save_single(product_data))
+        
+        for product_data in batch:
+            outcome = results.get((product_data.get('platform'), product_data.get('external_id')))
+            if outcome and outcome['action'] != 'unchanged':
+                self.match_product(product_data, outcome['id'])
+        return len(results)
+    
+    def match_product(self, product_data: Dict[str, Any], product_id: str):
+        """Add a written product to the similarity index, if enabled (runs on a writer thread)"""
+        if self.similarity_index is None:
+            return
+        try:
+            canonical_id = self.similarity_index.insert(product_data, product_id=str(product_id))
+            if canonical_id != str(product_id):
+                self.duplicate_count += 1
+                logger.info(f"Product {product_id} is a duplicate of {canonical_id}")
+        except Exception as e:
+            # A failed match must not fail the write; the next sync re-indexes the product
+            logger.error(f"Error matching product {product_id} against the similarity index: {e}")
     
-    def save_related_data(self, product_id: str, product_data: Dict[str, Any]):
-        """Save related data (specifications, images, variations)"""
+    def batch_written(self, saved: int, batch_size: int):
+        """Count the result of a bulk write (runs on the reactor thread)"""
+        self.flush_count += 1
+        self.saved_count += saved
+        self.error_count += batch_size - saved
+    
+    def batch_failed(self, failure, batch_size: int):
+        """Count a bulk write that raised; the writer has already logged it"""
+        self.error_count += batch_size
+    
+    def save_single(self, product_data: Dict[str, Any]) -> Optional[str]:
+        """Upsert one product with its related data (runs on a writer thread)"""
         try:
-            # Save specifications
-            if product_data.get('specifications'):
-                self.db_manager.insert_product_specifications(product_id, product_data['specifications'])
+            # Specifications, images and variations are replaced only if they changed
+            product_id = self.db_manager.upsert_product(product_data)
             
-            # Save images
-            if product_data.get('images'):
-                self.db_manager.insert_product_images(product_id, product_data['images'])
+            if product_id:
+                logger.info(f"Saved item to database: {product_id}")
+                self.match_product(product_data, product_id)
+                return product_id
+            
+            logger.error(f"Failed to save item to database")
             
-            # Save variations
-            if product_data.get('variations'):
-                self.db_manager.insert_product_variations(product_id, product_data['variations'])
-                
         except Exception as e:
-            logger.error(f"Error saving related data: {e}")
+            logger.error(f"Error saving item to database: {e}")
+        
+        return None
     
     def close_spider(self, spider):
-        """Called when spider closes"""
-        logger.info(f"Database pipeline closed. Saved: {self.saved_count}, Errors: {self.error_count}")
+        """Flush what is left, wait for pending writes and stop the writer"""
+        if self.flush_task and self.flush_task.running:
+            self.flush_task.stop()
+        
+        d = self.flush()
+        d.addBoth(lambda _: self.writer.stop())
+        d.addBoth(lambda _: self.similarity_index and self.similarity_index.close())
+        d.addBoth(lambda _: logger.info(
+            f"Database pipeline closed. Saved: {self.saved_count}, Errors: {self.error_count}, "
+            f"Bulk flushes: {self.flush_count}, Duplicates matched: {self.duplicate_count}"
+        ))
+        return d
 
 
-class JsonWriterPipeline:
-    """Pipeline for writing items to JSON file"""
+class JsonWriterPipeline(InstrumentedPipeline):
+    """
+    Pipeline for streaming items to JSON files as they are scraped.
     
-    def __init__(self):
-        self.file = None
-        self.items = []
+    Items are appended immediately rather than collected until the spider closes, so
+    memory stays flat and a crash keeps everything written up to the last fsync.
+    Format, compression, fsync interval and rotation size come from the JSON_WRITER_*
+    settings.
+    """
+    
+    def __init__(self, fmt: str = 'json', compression: Optional[str] = None,
+                 fsync_interval: float = 5.0, max_bytes: int = 0):
+        self.format = fmt
+        self.compression = compression
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.writer = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            fmt=settings.get('JSON_WRITER_FORMAT', 'json'),
+            compression=settings.get('JSON_WRITER_COMPRESSION') or None,
+            fsync_interval=settings.getfloat('JSON_WRITER_FSYNC_INTERVAL', 5.0),
+            max_bytes=settings.getint('JSON_WRITER_MAX_BYTES', 0),
+        )
     
     def open_spider(self, spider):
         """Open file when spider starts"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"scraped_data_{spider.name}_{timestamp}.json"
-        self.file = open(filename, 'w', encoding='utf-8')
-        self.file.write('[\n')
-        logger.info(f"Opened JSON file: {filename}")
+        self.writer = StreamingItemWriter(
+            f"scraped_data_{spider.name}_{timestamp}",
+            fmt=self.format,
+            compression=self.compression,
+            fsync_interval=self.fsync_interval,
+            max_bytes=self.max_bytes,
+        )
     
     def process_item(self, item, spider):
-        """Add item to JSON file"""
+        """Append item to JSON file"""
         try:
-            adapter = ItemAdapter(item)
-            item_dict = dict(adapter)
-            
-            # Add to items list
-            self.items.append(item_dict)
-            
-            return item
-            
+            self.writer.write(dict(ItemAdapter(item)))
         except Exception as e:
-            logger.error(f"Error processing item for JSON: {e}")
-            return item
+            logger.error(f"Error writing item to JSON: {e}")
+        
+        return item
     
     def close_spider(self, spider):
-        """Write all items to JSON file and close"""
+        """Finish and close the JSON file"""
         try:
-            if self.file:
-                # Write all items
-                for i, item in enumerate(self.items):
-                    if i > 0:
-                        self.file.write(',\n')
-                    json.dump(item, self.file, indent=2, ensure_ascii=False)
-                
-                self.file.write('\n]')
-                self.file.close()
-                logger.info(f"Wrote {len(self.items)} items to JSON file")
+            if self.writer:
+                self.writer.close()
+                logger.info(f"Wrote {self.writer.item_count} items to {len(self.writer.paths)} JSON file(s)")
                 
         except Exception as e:
             logger.error(f"Error closing JSON file: {e}")
 
 
-class DuplicatesPipeline:
-    """Pipeline for detecting and handling duplicate items"""
+class DuplicatesPipeline(InstrumentedPipeline):
+    """
+    Pipeline for detecting and handling duplicate items.
     
-    def __init__(self):
-        self.seen_items = set()
+    Items are keyed by a stable 64-bit fingerprint of platform, external_id and title,
+    checked against a SeenStore on disk so duplicates are suppressed across runs and
+    across worker processes sharing SEEN_STORE_PATH. An item passes again once
+    SEEN_STORE_TTL_HOURS have gone by, so recrawls still reach the database.
+    """
+    
+    def __init__(self, store_path: str = 'seen_items.sqlite3', capacity: int = 1_000_000,
+                 error_rate: float = 0.001, max_bytes: int = 64 * 1024 * 1024, flush_every: int = 1000,
+                 ttl_hours: float = 168):
+        self.store_path = store_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.ttl_hours = ttl_hours
+        self.seen_store = None
         self.duplicate_count = 0
     
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            store_path=settings.get('SEEN_STORE_PATH', 'seen_items.sqlite3'),
+            capacity=settings.getint('SEEN_STORE_CAPACITY', 1_000_000),
+            error_rate=settings.getfloat('SEEN_STORE_ERROR_RATE', 0.001),
+            max_bytes=settings.getint('SEEN_STORE_MAX_BYTES', 64 * 1024 * 1024),
+            flush_every=settings.getint('SEEN_STORE_FLUSH_EVERY', 1000),
+            ttl_hours=settings.getfloat('SEEN_STORE_TTL_HOURS', 168),
+        )
+    
+    def open_spider(self, spider):
+        """Open the persistent seen-item store"""
+        self.seen_store = SeenStore(
+            self.store_path,
+            initial_capacity=self.capacity,
+            error_rate=self.error_rate,
+            max_bytes=self.max_bytes,
+            flush_every=self.flush_every,
+            ttl=self.ttl_hours * 3600 if self.ttl_hours > 0 else None,
+        )
+    
     def process_item(self, item, spider):
         """Check for duplicates"""
         try:
@@ -177,14 +353,13 @@ class DuplicatesPipeline:
             platform = adapter.get('platform', '')
             title = adapter.get('title', '')
             
-            item_id = f"{platform}_{external_id}_{hash(title)}"
+            fingerprint = item_fingerprint(platform, external_id, title)
             
-            if item_id in self.seen_items:
+            if self.seen_store.seen(fingerprint):
                 self.duplicate_count += 1
-                logger.info(f"Duplicate item detected: {item_id}")
-                return None
+                logger.info(f"Duplicate item detected: {platform}_{external_id} ({fingerprint:016x})")
+                return self.drop('duplicate')
             else:
-                self.seen_items.add(item_id)
                 return item
                 
         except Exception as e:
@@ -193,10 +368,15 @@ class DuplicatesPipeline:
     
     def close_spider(self, spider):
         """Called when spider closes"""
-        logger.info(f"Duplicates pipeline closed. Duplicates found: {self.duplicate_count}")
+        if self.seen_store:
+            logger.info(f"Duplicates pipeline closed. Duplicates found: {self.duplicate_count}, "
+                        f"Bloom hits: {self.seen_store.bloom_hits}, "
+                        f"False positives: {self.seen_store.false_positives}, "
+                        f"Expired: {self.seen_store.expired}")
+            self.seen_store.close()
 
 
-class ValidationPipeline:
+class ValidationPipeline(InstrumentedPipeline):
     """Pipeline for validating item data"""
     
     def __init__(self):
@@ -214,19 +394,19 @@ class ValidationPipeline:
                 if not adapter.get(field):
                     self.invalid_count += 1
                     logger.warning(f"Item missing required field '{field}': {adapter.get('external_id', 'unknown')}")
-                    return None
+                    return self.drop(f'missing_{field}')
             
             # Validate data types and ranges
             if not self.validate_data_types(adapter):
                 self.invalid_count += 1
-                return None
+                return self.drop('invalid_data_types')
             
             self.valid_count += 1
             return item
             
         except Exception as e:
             logger.error(f"Error validating item: {e}")
-            return None
+            return self.drop('validation_error')
     
     def validate_data_types(self, adapter) -> bool:
         """Validate data types and ranges"""
@@ -263,60 +443,199 @@ class ValidationPipeline:
         logger.info(f"Validation pipeline closed. Valid: {self.valid_count}, Invalid: {self.invalid_count}")
 
 
-class ImageDownloadPipeline:
-    """Pipeline for downloading product images"""
+class ImageDownloadPipeline(InstrumentedPipeline):
+    """
+    Pipeline for downloading product images.
     
-    def __init__(self):
+    Images are fetched through the Scrapy downloader with at most
+    IMAGES_PER_HOST_CONCURRENCY requests per host, stored once per distinct content
+    in IMAGES_STORE and skipped entirely when their URL is already on disk. Thumbnails
+    are generated in a process pool so the reactor thread never decodes images.
+    """
+    
+    def __init__(self, store_dir: str = 'downloaded_images', per_host_concurrency: int = 4,
+                 thumbs: Optional[Dict[str, Any]] = None, min_width: int = 0, min_height: int = 0,
+                 expires_days: int = 90, thumbnail_workers: int = 2):
+        self.store_dir = store_dir
+        self.per_host_concurrency = per_host_concurrency
+        self.thumbs = thumbs or {}
+        self.min_width = min_width
+        self.min_height = min_height
+        self.expires_days = expires_days
+        self.thumbnail_workers = thumbnail_workers
+        self.crawler = None
+        self.store = None
+        self.executor = None
+        self.host_slots: Dict[str, defer.DeferredSemaphore] = {}
+        self.inflight: Dict[str, List[defer.Deferred]] = {}
         self.downloaded_count = 0
+        self.cached_count = 0
+        self.deduplicated_count = 0
         self.failed_count = 0
-        self.images_dir = "downloaded_images"
-        import os
-        os.makedirs(self.images_dir, exist_ok=True)
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            store_dir=settings.get('IMAGES_STORE', 'downloaded_images'),
+            per_host_concurrency=settings.getint('IMAGES_PER_HOST_CONCURRENCY', 4),
+            thumbs=settings.getdict('IMAGES_THUMBS'),
+            min_width=settings.getint('IMAGES_MIN_WIDTH', 0),
+            min_height=settings.getint('IMAGES_MIN_HEIGHT', 0),
+            expires_days=settings.getint('IMAGES_EXPIRES', 90),
+            thumbnail_workers=settings.getint('IMAGES_THUMBNAIL_WORKERS', 2),
+        )
+        pipeline.crawler = crawler
+        return pipeline
+    
+    def open_spider(self, spider):
+        """Open the image store and the thumbnail process pool"""
+        self.store = ImageStore(self.store_dir, expires_days=self.expires_days)
+        
+        if importlib.util.find_spec('PIL') is None:
+            logger.warning("Pillow is not installed; images will be stored without thumbnails or size checks")
+        elif self.thumbnail_workers > 0:
+            # spawn rather than fork: the reactor process already runs threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.thumbnail_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
     
     def process_item(self, item, spider):
         """Download images for item"""
-        try:
-            adapter = ItemAdapter(item)
-            images = adapter.get('images', [])
-            
-            if not images:
-                return item
-            
-            downloaded_images = []
-            for image in images:
-                try:
-                    # Download image (simplified - in production use proper image downloading)
-                    image_url = image.get('url')
-                    if image_url:
-                        # For now, just keep the URL
-                        # In production, you would download and save the image
-                        downloaded_images.append({
-                            'url': image_url,
-                            'type': image.get('type', 'gallery'),
-                            'alt_text': image.get('alt_text', ''),
-                            'downloaded': False  # Set to True when actually downloaded
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"Error downloading image {image_url}: {e}")
-                    self.failed_count += 1
-            
-            # Update item with downloaded images info
-            adapter['images'] = downloaded_images
-            self.downloaded_count += len(downloaded_images)
-            
-            return item
-            
-        except Exception as e:
-            logger.error(f"Error in image download pipeline: {e}")
+        adapter = ItemAdapter(item)
+        images = [image for image in adapter.get('images') or [] if isinstance(image, dict) and image.get('url')]
+        
+        if not images:
             return item
+        
+        downloads = [self.fetch_image(image['url']) for image in images]
+        d = defer.DeferredList(downloads, consumeErrors=True)
+        d.addCallback(self.images_fetched, images, adapter, item)
+        return d
+    
+    def images_fetched(self, results, images, adapter, item):
+        """Attach download results to the item's image entries"""
+        downloaded_images = []
+        for image, (success, stored) in zip(images, results):
+            entry = {
+                'url': image['url'],
+                'type': image.get('type', 'gallery'),
+                'alt_text': image.get('alt_text', ''),
+                'downloaded': False,
+            }
+            if success and stored:
+                entry.update({
+                    'downloaded': self.meets_min_size(stored),
+                    'local_path': stored['path'],
+                    'content_hash': stored['content_hash'],
+                    'file_size': stored['file_size'],
+                    'width': stored.get('width'),
+                    'height': stored.get('height'),
+                })
+            elif not success:
+                logger.error(f"Error downloading image {image['url']}: {stored.getErrorMessage()}")
+            downloaded_images.append(entry)
+        
+        adapter['images'] = downloaded_images
+        return item
+    
+    def meets_min_size(self, stored: Dict[str, Any]) -> bool:
+        """Images of unknown size (no Pillow) are accepted"""
+        if stored.get('width') is None or stored.get('height') is None:
+            return True
+        return stored['width'] >= self.min_width and stored['height'] >= self.min_height
+    
+    def fetch_image(self, url: str) -> defer.Deferred:
+        """Return the stored image for a URL, downloading it if needed"""
+        stored = self.store.lookup_url(url)
+        if stored:
+            self.cached_count += 1
+            return defer.succeed(stored)
+        
+        # Share one download between items that reference the same URL at once
+        if url in self.inflight:
+            waiter = defer.Deferred()
+            self.inflight[url].append(waiter)
+            return waiter
+        
+        self.inflight[url] = []
+        host = urlparse_cached(Request(url)).netloc
+        slot = self.host_slots.setdefault(host, defer.DeferredSemaphore(self.per_host_concurrency))
+        d = slot.run(self.download_image, url)
+        d.addBoth(self.resolve_waiters, url)
+        return d
+    
+    def resolve_waiters(self, result, url: str):
+        for waiter in self.inflight.pop(url, []):
+            if isinstance(result, Failure):
+                waiter.errback(result)
+            else:
+                waiter.callback(result)
+        if isinstance(result, Failure):
+            self.failed_count += 1
+        return result
+    
+    @defer.inlineCallbacks
+    def download_image(self, url: str):
+        request = Request(url, meta={'dont_cache': True}, priority=-10)
+        response = yield self.crawler.engine.download(request)
+        if response.status != 200 or not response.body:
+            raise IOError(f"HTTP {response.status} for image {url}")
+        
+        body = response.body
+        content_hash = ImageStore.content_hash(body)
+        stored = self.store.lookup_hash(content_hash)
+        
+        if stored:
+            # Same picture under another URL: nothing to write
+            self.deduplicated_count += 1
+        else:
+            content_type = response.headers.get('Content-Type', b'').decode('latin-1')
+            relative_path = self.store.relative_path(content_hash, ImageStore.guess_extension(content_type, url))
+            yield threads.deferToThread(self.store.write_file, relative_path, body)
+            stored = {'content_hash': content_hash, 'path': relative_path, 'file_size': len(body),
+                      'width': None, 'height': None}
+            self.downloaded_count += 1
+        
+        if self.executor and stored.get('width') is None:
+            width, height, _ = yield self.run_in_pool(
+                make_thumbnails, self.store_dir, stored['path'], content_hash,
+                self.thumbs, self.min_width, self.min_height
+            )
+            stored.update({'width': width, 'height': height})
+        
+        self.store.record(url, content_hash, stored['path'], stored['file_size'],
+                          stored.get('width'), stored.get('height'))
+        return stored
+    
+    def run_in_pool(self, func, *args) -> defer.Deferred:
+        """Run func in the thumbnail process pool, firing a Deferred on the reactor thread"""
+        d = defer.Deferred()
+        future = self.executor.submit(func, *args)
+        
+        def done(completed):
+            error = completed.exception()
+            if error is not None:
+                reactor.callFromThread(d.errback, Failure(error))
+            else:
+                reactor.callFromThread(d.callback, completed.result())
+        
+        future.add_done_callback(done)
+        return d
     
     def close_spider(self, spider):
         """Called when spider closes"""
-        logger.info(f"Image download pipeline closed. Downloaded: {self.downloaded_count}, Failed: {self.failed_count}")
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        if self.store:
+            self.store.close()
+        logger.info(f"Image download pipeline closed. Downloaded: {self.downloaded_count}, "
+                    f"From disk: {self.cached_count}, Duplicate content: {self.deduplicated_count}, "
+                    f"Failed: {self.failed_count}")
 
 
-class StatisticsPipeline:
+class StatisticsPipeline(InstrumentedPipeline):
     """Pipeline for collecting statistics"""
     
     def __init__(self):
@@ -406,7 +725,7 @@ class StatisticsPipeline:
         logger.info("===========================")
 
 
-class EcommercescraperPipeline:
+class EcommercescraperPipeline(InstrumentedPipeline):
     """Legacy pipeline for backward compatibility"""
     
     def process_item(self, item, spider):
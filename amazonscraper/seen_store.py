@@ -0,0 +1,350 @@
+"""
+Persistent seen-item store for the duplicates pipeline
+"""
+import hashlib
+import logging
+import math
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+
+
+def item_fingerprint(platform: str, external_id: str, title: str) -> int:
+    """
+    Stable 64-bit fingerprint of an item.
+
+    Unlike the built-in hash(), this is the same in every process and on every
+    run, so it can be stored and compared across crawls and worker nodes.
+    """
+    normalized_title = ' '.join((title or '').lower().split())
+    key = f"{(platform or '').lower()}\x1f{external_id or ''}\x1f{normalized_title}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _mix64(value: int) -> int:
+    """splitmix64 finaliser, used to derive a second independent hash"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class BloomSlice:
+    """A single fixed-size Bloom filter over 64-bit fingerprints"""
+
+    __slots__ = ('capacity', 'error_rate', 'num_bits', 'num_hashes', 'bits', 'count', 'window', 'step',
+                 'last_window')
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytes] = None, count: int = 0,
+                 window: int = 0, step: int = 0, last_window: Optional[int] = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+        # Time window the slice's items were added in, and its place among the window's slices
+        self.window = window
+        self.step = step
+        # Latest window the slice holds items from; it must live until that window expires
+        self.last_window = window if last_window is None else last_window
+
+    def _positions(self, fingerprint: int):
+        h1 = fingerprint
+        h2 = _mix64(fingerprint) | 1
+        for i in range(self.num_hashes):
+            yield ((h1 + i * h2) & _MASK64) % self.num_bits
+
+    def __contains__(self, fingerprint: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint))
+
+    def add(self, fingerprint: int):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def merge(self, other_bits: bytes):
+        """OR another copy of this slice into it"""
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other_bits, 'little')
+        self.bits = bytearray(merged.to_bytes(len(self.bits), 'little'))
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.window, self.step
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that adds progressively larger, tighter slices as it fills.
+
+    Each new slice has ``growth`` times the capacity of the previous one and
+    ``tightening`` times its error rate, keeping the compound false-positive
+    rate bounded. Once another slice would exceed ``max_bytes`` the last slice
+    keeps absorbing items and the false-positive rate rises instead of memory.
+
+    With a ``ttl`` (seconds), items are added to slices of the current time
+    window, ``ttl / windows`` long, and ``expire`` drops the slices whose
+    window ended more than ``ttl`` ago. A slice that absorbed items of later
+    windows past the memory budget is kept until the last of them expires,
+    so no item is forgotten before its ttl. Each of the ``windows + 1`` windows
+    that can be live at once gets an equal share of ``error_rate``. Windows
+    are aligned to the epoch, so every process rotates at the same moments
+    and builds slices of the same sizes.
+    """
+
+    def __init__(self, initial_capacity: int = 1_000_000, error_rate: float = 0.001,
+                 max_bytes: int = 64 * 1024 * 1024, growth: int = 2, tightening: float = 0.5,
+                 ttl: Optional[float] = None, windows: int = 7):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.max_bytes = max_bytes
+        self.growth = growth
+        self.tightening = tightening
+        self.ttl = ttl or None
+        self.window_seconds = self.ttl / windows if self.ttl else None
+        self.window_error_rate = error_rate / (windows + 1) if self.ttl else error_rate
+        self.slices: List[BloomSlice] = []
+        self.budget_exhausted = False
+
+    def window(self, now: float) -> int:
+        return int(now // self.window_seconds) if self.window_seconds else 0
+
+    def _next_slice(self, window: int) -> Optional[BloomSlice]:
+        last = self.slices[-1] if self.slices else None
+        step = last.step + 1 if last is not None and last.window == window else 0
+        candidate = BloomSlice(
+            self.initial_capacity * (self.growth ** step),
+            self.window_error_rate * (1 - self.tightening) * (self.tightening ** step),
+            window=window,
+            step=step,
+        )
+        if self.slices and self.size_bytes + candidate.size_bytes > self.max_bytes:
+            return None
+        return candidate
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return any(fingerprint in bloom_slice for bloom_slice in self.slices)
+
+    def add(self, fingerprint: int, now: Optional[float] = None):
+        window = self.window(time.time() if now is None else now)
+        last = self.slices[-1] if self.slices else None
+        if last is None or last.window != window or last.is_full:
+            new_slice = self._next_slice(window)
+            if new_slice is not None:
+                self.slices.append(new_slice)
+            elif not self.budget_exhausted:
+                self.budget_exhausted = True
+                logger.warning("Seen-item Bloom filter reached its memory budget; false-positive rate will rise")
+        last = self.slices[-1]
+        last.add(fingerprint)
+        last.last_window = max(last.last_window, window)
+
+    def live_window(self, now: float) -> int:
+        """Earliest window that can still hold items seen less than ttl ago"""
+        return self.window(now - self.ttl) if self.ttl else 0
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop the slices whose items were all added more than ttl ago; returns how many"""
+        if not self.ttl:
+            return 0
+        live_window = self.live_window(time.time() if now is None else now)
+        live = [bloom_slice for bloom_slice in self.slices if bloom_slice.last_window >= live_window]
+        expired = len(self.slices) - len(live)
+        if expired:
+            self.slices = live
+            self.budget_exhausted = False
+        return expired
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(bloom_slice.size_bytes for bloom_slice in self.slices)
+
+    @property
+    def count(self) -> int:
+        return sum(bloom_slice.count for bloom_slice in self.slices)
+
+
+class SeenStore:
+    """
+    Disk-backed set of item fingerprints shared by runs and worker processes.
+
+    A ScalableBloomFilter held in memory answers "definitely new" without
+    touching disk; a Bloom hit is confirmed against the exact fingerprint
+    table in SQLite. New fingerprints are buffered and written, together with
+    the Bloom bits, every ``flush_every`` items and on close. At flush time
+    the on-disk Bloom slices are merged both ways, so other processes' items
+    become visible. Two processes that see the same new item between flushes
+    may both pass it; across flushes and runs suppression is exact.
+
+    Items are only suppressed for ``ttl`` seconds after they last passed, so
+    recrawls reach the rest of the pipeline; None keeps them forever. Bloom
+    slices rotate in ``windows`` time windows per ttl and expired fingerprints
+    are pruned from the exact table at flush time.
+    """
+
+    def __init__(self, path: str, initial_capacity: int = 1_000_000, error_rate: float = 0.001,
+                 max_bytes: int = 64 * 1024 * 1024, flush_every: int = 1000, ttl: Optional[float] = None,
+                 windows: int = 7):
+        self.path = path
+        self.flush_every = flush_every
+        self.ttl = ttl or None
+        self.bloom = ScalableBloomFilter(initial_capacity, error_rate, max_bytes, ttl=self.ttl, windows=windows)
+        self.pending = {}
+        self.bloom_hits = 0
+        self.false_positives = 0
+        self.expired = 0
+
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS seen_items (
+                fingerprint INTEGER PRIMARY KEY,
+                first_seen REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_seen_items_first_seen ON seen_items (first_seen)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS bloom_filters (
+                time_window INTEGER NOT NULL,
+                step INTEGER NOT NULL,
+                last_window INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                error_rate REAL NOT NULL,
+                item_count INTEGER NOT NULL,
+                bits BLOB NOT NULL,
+                PRIMARY KEY (time_window, step)
+            )
+        """)
+        self._load_bloom()
+
+    @staticmethod
+    def _to_signed(fingerprint: int) -> int:
+        # SQLite integers are signed 64-bit
+        return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+    def _cutoff(self, now: float) -> float:
+        """Items that passed before this time are no longer suppressed"""
+        return now - self.ttl if self.ttl else float('-inf')
+
+    def _load_bloom(self):
+        rows = self.connection.execute(
+            "SELECT time_window, step, last_window, capacity, error_rate, item_count, bits FROM bloom_filters "
+            "WHERE last_window >= ? ORDER BY time_window, step", (self.bloom.live_window(time.time()),)
+        ).fetchall()
+        for window, step, last_window, capacity, error_rate, item_count, bits in rows:
+            self.bloom.slices.append(BloomSlice(capacity, error_rate, bits, item_count, window, step, last_window))
+        if rows:
+            logger.info(f"Loaded seen-item store {self.path}: {len(rows)} Bloom slice(s), "
+                        f"{self.bloom.count} fingerprints, {self.bloom.size_bytes} bytes")
+
+    def seen(self, fingerprint: int) -> bool:
+        """Return True if the fingerprint passed less than ttl ago, otherwise record it"""
+        if fingerprint in self.pending:
+            return True
+
+        now = time.time()
+        self.bloom.expire(now)
+        if fingerprint in self.bloom:
+            self.bloom_hits += 1
+            row = self.connection.execute(
+                "SELECT first_seen FROM seen_items WHERE fingerprint = ?", (self._to_signed(fingerprint),)
+            ).fetchone()
+            if row and row[0] >= self._cutoff(now):
+                return True
+            if row:
+                self.expired += 1
+            else:
+                self.false_positives += 1
+
+        self.bloom.add(fingerprint, now)
+        self.pending[fingerprint] = now
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+        return False
+
+    def flush(self):
+        """
+        Persist pending fingerprints, merge Bloom slices with the copy on disk
+        and prune what has expired
+        """
+        now = time.time()
+        self.bloom.expire(now)
+        live_window = self.bloom.live_window(now)
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # An item passing again after it expired starts a new ttl
+            cursor.executemany(
+                "INSERT OR REPLACE INTO seen_items (fingerprint, first_seen) VALUES (?, ?)",
+                [(self._to_signed(fingerprint), first_seen) for fingerprint, first_seen in self.pending.items()]
+            )
+            if self.ttl:
+                cursor.execute("DELETE FROM seen_items WHERE first_seen < ?", (self._cutoff(now),))
+                cursor.execute("DELETE FROM bloom_filters WHERE last_window < ?", (live_window,))
+
+            stored = {
+                (window, step): (last_window, item_count, bits)
+                for window, step, last_window, item_count, bits in cursor.execute(
+                    "SELECT time_window, step, last_window, item_count, bits FROM bloom_filters"
+                )
+            }
+            for bloom_slice in self.bloom.slices:
+                if bloom_slice.key in stored:
+                    last_window, item_count, bits = stored[bloom_slice.key]
+                    if len(bits) == bloom_slice.size_bytes:
+                        bloom_slice.merge(bits)
+                        bloom_slice.count = max(bloom_slice.count, item_count)
+                        bloom_slice.last_window = max(bloom_slice.last_window, last_window)
+                cursor.execute(
+                    "INSERT OR REPLACE INTO bloom_filters "
+                    "(time_window, step, last_window, capacity, error_rate, item_count, bits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (bloom_slice.window, bloom_slice.step, bloom_slice.last_window, bloom_slice.capacity,
+                     bloom_slice.error_rate, bloom_slice.count, bytes(bloom_slice.bits))
+                )
+
+            # Slices another process added that we do not have
+            ours = {bloom_slice.key for bloom_slice in self.bloom.slices}
+            added = False
+            for key in sorted(stored):
+                if key not in ours:
+                    row = cursor.execute(
+                        "SELECT last_window, capacity, error_rate, item_count, bits FROM bloom_filters "
+                        "WHERE time_window = ? AND step = ?", key
+                    ).fetchone()
+                    last_window, capacity, error_rate, item_count, bits = row
+                    self.bloom.slices.append(BloomSlice(capacity, error_rate, bits, item_count, *key, last_window))
+                    added = True
+            if added:
+                self.bloom.slices.sort(key=lambda bloom_slice: bloom_slice.key)
+
+            cursor.execute("COMMIT")
+            self.pending.clear()
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """Flush and close the store"""
+        if self.connection is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+            self.connection = None
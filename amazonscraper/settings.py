@@ -71,6 +71,13 @@ DOWNLOADER_MIDDLEWARES = {
 #EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 #}
+EXTENSIONS = {
+    'amazonscraper.instrumentation.PipelineMetricsExtension': 500,
+}
+
+# Per-stage pipeline metrics are written here when the spider closes;
+# {spider} and {timestamp} are filled in
+PIPELINE_METRICS_FILE = 'pipeline_metrics_{spider}_{timestamp}.json'
 
 # Configure item exporters
 # See https://docs.scrapy.org/en/latest/topics/exporters.html
@@ -119,6 +126,15 @@ USER_AGENT_LIST = [
 MONGO_URI = 'mongodb://localhost:27017'
 MONGO_DATABASE = 'ecommerce_cache'
 
+# Configure database write batching (0 writes every item on its own)
+DATABASE_BATCH_SIZE = 500
+DATABASE_FLUSH_INTERVAL = 5.0  # seconds
+
+# Configure the background database writer; at most DATABASE_WRITER_QUEUE_SIZE
+# writes are in flight before items wait, which throttles the crawl
+DATABASE_WRITER_THREADS = 1
+DATABASE_WRITER_QUEUE_SIZE = 32
+
 # Configure PostgreSQL settings
 DB_HOST = 'localhost'
 DB_PORT = '5432'
@@ -140,6 +156,31 @@ IMAGES_STORE = 'downloaded_images'
 IMAGES_MIN_HEIGHT = 110
 IMAGES_MIN_WIDTH = 110
 IMAGES_EXPIRES = 90
+IMAGES_PER_HOST_CONCURRENCY = 4
+IMAGES_THUMBNAIL_WORKERS = 2
+IMAGES_THUMBS = {
+    'small': (50, 50),
+    'big': (270, 270),
+}
+
+# Configure the persistent seen-item store used by DuplicatesPipeline
+SEEN_STORE_PATH = 'seen_items.sqlite3'
+SEEN_STORE_CAPACITY = 1000000  # items in the first Bloom slice of each time window
+SEEN_STORE_ERROR_RATE = 0.001
+SEEN_STORE_MAX_BYTES = 64 * 1024 * 1024  # Bloom filter memory budget
+SEEN_STORE_FLUSH_EVERY = 1000  # new fingerprints buffered between disk writes
+SEEN_STORE_TTL_HOURS = 168  # items pass again after a week so recrawls are written; 0 keeps them forever
+
+# Similarity index DatabasePipeline matches written products against, shared
+# with the deduplication job, e.g. 'similarity_index.sqlite3' ('' disables
+# matching on arrival)
+SIMILARITY_INDEX_PATH = ''
+
+# Configure the streaming JSON writer pipeline
+JSON_WRITER_FORMAT = 'json'  # 'json' array as before, or 'jsonl' for line-delimited output
+JSON_WRITER_COMPRESSION = None  # None, 'gzip' or 'zstd' (needs the zstandard package)
+JSON_WRITER_FSYNC_INTERVAL = 5.0  # seconds
+JSON_WRITER_MAX_BYTES = 0  # rotate to a new part file at this size, 0 disables
 
 # Configure feed settings
 FEEDS = {
@@ -40,7 +40,7 @@ class BaseEcommerceSpider(scrapy.Spider):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.db_manager = get_db_manager()
+        self._db_manager = None
         self.scraping_session_id = None
         self.start_time = datetime.now()
         self.products_scraped = 0
@@ -56,6 +56,13 @@ class BaseEcommerceSpider(scrapy.Spider):
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
         ]
     
+    @property
+    def db_manager(self):
+        """Database manager, looked up on first use so spiders load without a database"""
+        if self._db_manager is None:
+            self._db_manager = get_db_manager()
+        return self._db_manager
+    
     def start_requests(self):
         """Override in child classes to define starting URLs"""
         raise NotImplementedError("Child classes must implement start_requests method")
@@ -0,0 +1,130 @@
+"""
+Streaming, append-only item files for the JSON writer pipeline
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingItemWriter:
+    """
+    Writes items to disk as they arrive instead of holding them in memory.
+
+    Supports JSON Lines ('jsonl') and a JSON array ('json') per file, optional
+    gzip or zstd compression, an fsync every ``fsync_interval`` seconds and
+    rotation to a new part file once the current one reaches ``max_bytes`` on
+    disk (0 disables rotation). JSON Lines output is readable up to the last
+    synced item even if the process dies; a JSON array is only closed with
+    ``]`` when its part is finished.
+    """
+
+    FORMATS = ('jsonl', 'json')
+    COMPRESSIONS = (None, 'gzip', 'zstd')
+    EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, base_path: str, fmt: str = 'jsonl', compression: Optional[str] = None,
+                 fsync_interval: float = 5.0, max_bytes: int = 0):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported JSON writer format: {fmt}")
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f"Unsupported JSON writer compression: {compression}")
+
+        self.base_path = base_path
+        self.format = fmt
+        self.compression = compression
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+
+        self.raw = None
+        self.stream = None
+        self.part = 0
+        self.part_items = 0
+        self.item_count = 0
+        self.paths: List[str] = []
+        self.last_sync = time.monotonic()
+
+        self._open_part()
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the part currently being written"""
+        return self.paths[-1] if self.paths else None
+
+    def _part_path(self) -> str:
+        suffix = f"_part{self.part:04d}" if self.max_bytes > 0 else ''
+        return f"{self.base_path}{suffix}.{self.format}{self.EXTENSIONS[self.compression]}"
+
+    def _open_part(self):
+        self.part += 1
+        self.part_items = 0
+        path = self._part_path()
+        self.raw = open(path, 'wb')
+
+        if self.compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        elif self.compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError as e:
+                self.raw.close()
+                raise RuntimeError("zstd compression requires the 'zstandard' package") from e
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+        if self.format == 'json':
+            self.stream.write(b'[\n')
+
+        self.paths.append(path)
+        logger.info(f"Opened JSON file: {path}")
+
+    def _close_part(self):
+        if self.format == 'json':
+            self.stream.write(b'\n]\n')
+        self.sync()
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+        self.stream = None
+        self.raw = None
+
+    def write(self, item: Dict[str, Any]):
+        """Append one item, rotating and syncing as configured"""
+        if self.format == 'json':
+            separator = b',\n' if self.part_items else b''
+            data = separator + json.dumps(item, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+        else:
+            data = json.dumps(item, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+
+        self.stream.write(data)
+        self.part_items += 1
+        self.item_count += 1
+
+        if self.fsync_interval and time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+        # raw.tell() is the compressed size flushed so far, so rotation may
+        # overshoot by whatever the compressor still buffers
+        if self.max_bytes > 0 and self.raw.tell() >= self.max_bytes:
+            self._close_part()
+            self._open_part()
+
+    def sync(self):
+        """Flush buffered output through the compressor and fsync it to disk"""
+        if self.stream is None:
+            return
+        self.stream.flush()
+        if self.stream is not self.raw:
+            self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        """Finish the current part"""
+        if self.stream is not None:
+            self._close_part()
@@ -0,0 +1,220 @@
+"""
+Deduplication benchmark
+
+Builds a synthetic catalog from the sample JSON dumps in the repository
+root, runs ProductDeduplicator.find_duplicates over it and measures the
+recall of its candidate pairs against exhaustive comparison of a random
+sample of products with the whole catalog:
+
+    python benchmark_deduplication.py
+    python benchmark_deduplication.py --size 50000 --sample 100
+    python benchmark_deduplication.py --kernels sequence tfidf --kernel-pairs 50000
+
+Catalog products take their brand, price range and specifications from a
+dump product and a title of random words from the dumps' titles, so they
+are distinct; a share of them get near-duplicate listings on other
+platforms with reworded titles, recased brands and shifted prices.
+
+Every listing records the catalog product it was made from, which labels
+each candidate pair as duplicate or not. The similarity kernels are then
+compared on the same candidate pairs: scoring throughput in pairs per
+second, and agreement of their duplicate decisions with the labels and
+with the sequence kernel.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from data_processing.deduplication import ProductDeduplicator
+from data_processing.processor import DataProcessor
+from data_processing.reprocess import PLATFORMS, to_product_item
+from data_processing.similarity import KERNELS
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TITLE_EXTRAS = ['New', 'Renewed', '2024 Model', 'Pack of 2', 'with Warranty', 'International Version']
+
+
+def load_products(paths: List[str]) -> List[Dict[str, Any]]:
+    """Normalised products from the dumps, specifications in database row form"""
+    processor = DataProcessor()
+    products = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            records = json.load(f)
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            item = to_product_item(record, 'amazon')
+            if not isinstance(item.get('title'), str):
+                continue
+            product = processor.normalize_product_data(item)
+            product['specifications'] = [{'spec_name': name, 'spec_value': value}
+                                         for name, value in product['specifications'].items()]
+            products.append(product)
+    return products
+
+
+def reword(title: str, rnd: random.Random) -> str:
+    words = title.split()
+    change = rnd.random()
+    if change < 0.4 and len(words) > 3:
+        del words[rnd.randrange(len(words))]
+    elif change < 0.6:
+        words.append(rnd.choice(TITLE_EXTRAS))
+    elif change < 0.8 and words:
+        position = rnd.randrange(len(words))
+        words.insert(min(position + 1, len(words)), words.pop(position))
+    return ' '.join(words)
+
+
+def build_catalog(base: List[Dict[str, Any]], size: int, duplicate_rate: float, seed: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    vocabulary = sorted({word for product in base for word in product['title'].split()})
+    catalog = []
+    while len(catalog) < size:
+        product = dict(rnd.choice(base))
+        words = rnd.sample(vocabulary, rnd.randint(6, 14))
+        product['title'] = ' '.join([product.get('brand') or ''] + words).strip()
+        if rnd.random() < 0.005:
+            # and a few scraped products without a title
+            product['title'] = ''
+        if product.get('current_price'):
+            product['current_price'] = round(product['current_price'] * rnd.uniform(0.5, 2.0), 2)
+        product['platform'] = rnd.choice(PLATFORMS)
+        product['external_id'] = f"P{len(catalog):08d}"
+        product['listing_of'] = product['external_id']
+        catalog.append(product)
+
+        while rnd.random() < duplicate_rate and len(catalog) < size:
+            listing = dict(product)
+            listing['title'] = reword(product['title'], rnd)
+            if rnd.random() < 0.3:
+                listing['brand'] = (product.get('brand') or '').upper()
+            elif rnd.random() < 0.05:
+                # Marketplace listings often come without a brand
+                listing['brand'] = ''
+            if product.get('current_price'):
+                listing['current_price'] = round(product['current_price'] * rnd.uniform(0.9, 1.1), 2)
+            listing['platform'] = rnd.choice(PLATFORMS)
+            listing['external_id'] = f"P{len(catalog):08d}"
+            catalog.append(listing)
+    rnd.shuffle(catalog)
+    return catalog
+
+
+def labelled_blocks(catalog: List[Dict[str, Any]], max_pairs: int, seed: int) -> Dict[int, List[int]]:
+    """
+    Candidate pairs find_duplicates would score, as blocks of later indices
+    per product, taking whole blocks in random order up to max_pairs pairs
+    """
+    deduplicator = ProductDeduplicator()
+    features = deduplicator.featurize(catalog)
+    blocks = defaultdict(list)
+    for first, second in sorted(deduplicator.candidates.pairs(features)):
+        if deduplicator._could_be_duplicates(features[first], features[second]):
+            blocks[first].append(second)
+
+    order = sorted(blocks)
+    random.Random(seed).shuffle(order)
+    sample, pairs = {}, 0
+    for first in order:
+        if pairs >= max_pairs:
+            break
+        sample[first] = blocks[first]
+        pairs += len(blocks[first])
+    return sample
+
+
+def score_blocks(kernel: str, catalog: List[Dict[str, Any]],
+                 blocks: Dict[int, List[int]]) -> Tuple[Dict[Tuple[int, int], bool], float]:
+    """Duplicate decision for every pair in blocks under kernel, and the seconds taken"""
+    deduplicator = ProductDeduplicator(kernel=kernel)
+    decisions = {}
+    start = time.perf_counter()
+    featurizer = deduplicator.featurizer()
+    features = featurizer.featurize(catalog)
+    prepared = deduplicator._prepare(features, featurizer.tokens)
+    for first, others in blocks.items():
+        scores = deduplicator._block_similarity(features, prepared, first, others)
+        for second, score in zip(others, scores):
+            decisions[(first, second)] = (deduplicator._is_same_item(features[first], features[second]) or
+                                          score >= deduplicator.similarity_threshold)
+    return decisions, time.perf_counter() - start
+
+
+def compare_kernels(catalog: List[Dict[str, Any]], kernels: List[str], max_pairs: int, seed: int):
+    blocks = labelled_blocks(catalog, max_pairs, seed)
+    labels = {(first, second): catalog[first]['listing_of'] == catalog[second]['listing_of']
+              for first, others in blocks.items() for second in others}
+    duplicates = sum(labels.values())
+    print(f"\nlabelled sample: {len(labels):,} candidate pairs, {duplicates:,} of them duplicates")
+    print(f"{'kernel':<10} {'pairs/s':>10} {'speedup':>8} {'accuracy':>9} {'precision':>10} "
+          f"{'recall':>7} {'agrees with sequence':>22}")
+
+    results = {kernel: score_blocks(kernel, catalog, blocks) for kernel in kernels}
+    reference = results.get('sequence')
+    for kernel, (decisions, elapsed) in results.items():
+        found = sum(1 for pair, duplicate in decisions.items() if duplicate and labels[pair])
+        flagged = sum(decisions.values())
+        accuracy = sum(decisions[pair] == label for pair, label in labels.items()) / len(labels)
+        agreement = (sum(decisions[pair] == reference[0][pair] for pair in labels) / len(labels)
+                     if reference else float('nan'))
+        print(f"{kernel:<10} {len(labels) / elapsed:>10,.0f} "
+              f"{(reference[1] / elapsed if reference else float('nan')):>7.1f}x "
+              f"{accuracy:>9.4f} {(found / flagged if flagged else 0.0):>10.4f} "
+              f"{(found / duplicates if duplicates else 0.0):>7.4f} {agreement:>22.4f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark product deduplication')
+    parser.add_argument('dumps', nargs='*', help='JSON dumps to load (default: every *.json in the repo root)')
+    parser.add_argument('--size', type=int, default=20000, help='Products in the synthetic catalog')
+    parser.add_argument('--duplicate-rate', type=float, default=0.4,
+                        help='Chance of each further near-duplicate listing of a product')
+    parser.add_argument('--sample', type=int, default=50,
+                        help='Products compared with every other product to measure recall')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kernels', nargs='*', default=list(KERNELS), choices=list(KERNELS),
+                        help='Similarity kernels to compare (none to skip the comparison)')
+    parser.add_argument('--kernel-pairs', type=int, default=20000,
+                        help='Candidate pairs scored by each kernel in the comparison')
+    args = parser.parse_args()
+
+    paths = args.dumps or sorted(glob.glob(os.path.join(ROOT, '*.json')))
+    base = load_products(paths)
+    if not base:
+        print("❌ No products found in the dumps")
+        return 1
+    catalog = build_catalog(base, args.size, args.duplicate_rate, args.seed)
+
+    deduplicator = ProductDeduplicator()
+    start = time.perf_counter()
+    groups = deduplicator.find_duplicates(catalog)
+    elapsed = time.perf_counter() - start
+    stats = deduplicator.candidates.stats
+
+    print(f"{len(catalog)} products built from {len(base)} dump products")
+    print(f"find_duplicates: {elapsed:.2f}s, {len(groups)} duplicate groups")
+    print(f"candidate pairs: {stats['candidate_pairs']:,} of {stats['all_pairs']:,} "
+          f"(blocking {stats['block_pairs']:,}, LSH {stats['lsh_pairs']:,}, "
+          f"{stats['oversized_blocks']} oversized blocks skipped)")
+
+    start = time.perf_counter()
+    recall = deduplicator.candidate_recall(catalog, sample_size=args.sample, seed=args.seed)
+    print(f"recall of {recall['sample_size']} sampled products against all others: {recall['recall']:.4f} "
+          f"({recall['found_pairs']} of {recall['duplicate_pairs']} duplicate pairs, "
+          f"{time.perf_counter() - start:.1f}s)")
+
+    if args.kernels:
+        compare_kernels(catalog, args.kernels, args.kernel_pairs, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
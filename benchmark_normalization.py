@@ -0,0 +1,218 @@
+"""
+Normalisation microbenchmark
+
+Runs DataProcessor.normalize_product_data over the sample JSON dumps in the
+repository root, once with the original per-call implementation (kept
+below as LegacyDataProcessor) and once with the compiled
+NormalizationEngine, checks that both produce identical output and prints
+items/sec for each:
+
+    python benchmark_normalization.py
+    python benchmark_normalization.py --repeat 50 amazon-assembled.json
+
+The dumps carry no category or availability fields, so each record is given
+one from a fixed list of scraped-style strings to exercise those
+normalisers as well.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+from itertools import cycle
+from typing import Any, Dict, List, Optional
+
+from data_processing.processor import DataProcessor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_CATEGORIES = [
+    'Electronics', 'Computers & Electronics > Laptops', 'Cell Phones & Accessories',
+    'Electronics & Photo', 'Home & Kitchen', 'Clothing, Shoes & Jewelry', 'Sports & Outdoors',
+    'Beauty & Personal Care', 'Toys & Games', 'Automotive & Motorcycle', 'Video Games',
+]
+SAMPLE_AVAILABILITY = [
+    'In Stock.', 'Only 3 left in stock - order soon.', 'Currently unavailable.', 'Temporarily out of stock.',
+    'Pre-order now', 'Usually ships within 2 to 3 days.', 'Add to Cart',
+]
+
+
+class LegacyDataProcessor(DataProcessor):
+    """DataProcessor's normalisers as they were before the compiled engine"""
+
+    def normalize_price(self, price: Any) -> Optional[float]:
+        if price is None:
+            return None
+        if isinstance(price, (int, float)):
+            return float(price)
+        if isinstance(price, str):
+            cleaned = re.sub(r'[^\d.,]', '', price)
+            try:
+                return float(cleaned.replace(',', ''))
+            except (ValueError, TypeError):
+                pass
+        return None
+
+    def normalize_availability(self, availability: str) -> str:
+        if not availability:
+            return 'unknown'
+        availability_lower = availability.lower().strip()
+        if any(word in availability_lower for word in ['in stock', 'available', 'add to cart']):
+            return 'in_stock'
+        elif any(word in availability_lower for word in ['out of stock', 'unavailable', 'sold out']):
+            return 'out_of_stock'
+        elif any(word in availability_lower for word in ['pre-order', 'preorder', 'coming soon']):
+            return 'pre_order'
+        elif any(word in availability_lower for word in ['limited', 'few left', 'low stock']):
+            return 'limited_stock'
+        else:
+            return 'unknown'
+
+    def normalize_rating(self, rating: Any) -> Optional[float]:
+        if rating is None:
+            return None
+        if isinstance(rating, (int, float)):
+            rating = float(rating)
+            if rating > 5:
+                rating = rating / 2
+            return max(0, min(5, rating))
+        if isinstance(rating, str):
+            match = re.search(r'(\d+\.?\d*)', rating)
+            if match:
+                try:
+                    rating = float(match.group(1))
+                    if rating > 5:
+                        rating = rating / 2
+                    return max(0, min(5, rating))
+                except (ValueError, TypeError):
+                    pass
+        return None
+
+    def normalize_review_count(self, review_count: Any) -> Optional[int]:
+        if review_count is None:
+            return None
+        if isinstance(review_count, int):
+            return review_count
+        if isinstance(review_count, str):
+            match = re.search(r'([\d,]+)', review_count)
+            if match:
+                try:
+                    return int(match.group(1).replace(',', ''))
+                except (ValueError, TypeError):
+                    pass
+        return None
+
+    def normalize_category(self, category: str) -> str:
+        if not category:
+            return ''
+        category = self.clean_text(category)
+        category_mapping = {
+            'electronics': ['electronic', 'electronics & photo', 'computers & electronics'],
+            'clothing': ['clothes', 'apparel', 'fashion', 'clothing, shoes & jewelry'],
+            'home': ['home & kitchen', 'home improvement', 'home & garden'],
+            'books': ['book', 'books & media', 'books & magazines'],
+            'sports': ['sport', 'sports & outdoors', 'sports & recreation'],
+            'beauty': ['beauty & personal care', 'health & beauty', 'cosmetics'],
+            'toys': ['toy', 'toys & games', 'children\'s toys'],
+            'automotive': ['auto', 'automotive & motorcycle', 'car & motorbike']
+        }
+        category_lower = category.lower()
+        for standard, variations in category_mapping.items():
+            if any(var in category_lower for var in variations):
+                return standard
+        return category
+
+    def clean_text(self, text: str) -> str:
+        if not text:
+            return ''
+        text = ' '.join(text.split())
+        text = re.sub(r'[\r\n\t]+', ' ', text)
+        return text.strip()
+
+    def clean_label(self, text: str) -> str:
+        return self.clean_text(text)
+
+
+def _first(value: Any) -> Any:
+    # Scrapy exports wrap every field in a list
+    return value[0] if isinstance(value, list) and value else value
+
+
+def load_items(paths: List[str]) -> List[Dict[str, Any]]:
+    """Product dicts in DataProcessor's input format built from the raw dumps"""
+    categories = cycle(SAMPLE_CATEGORIES)
+    availability = cycle(SAMPLE_AVAILABILITY)
+    items = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            records = json.load(f)
+        for record in records:
+            title = _first(record.get('title'))
+            if not isinstance(title, str):
+                continue
+            items.append({
+                'external_id': str(_first(record.get('url')) or title)[-40:],
+                'platform': 'amazon',
+                'title': title,
+                'brand': _first(record.get('brand')) or '',
+                'model': _first(record.get('model_name')) or '',
+                'current_price': _first(record.get('price')),
+                'rating': _first(record.get('star_rating')),
+                'review_count': _first(record.get('no_rating')),
+                'product_url': _first(record.get('url')) or '',
+                'category': next(categories),
+                'availability_status': next(availability),
+                'images': [{'url': _first(record.get('img_url'))}] if record.get('img_url') else [],
+                'specifications': {'Colour': _first(record.get('colour')),
+                                   'Storage': _first(record.get('storage_cap'))},
+                'scraped_at': '2024-01-01T00:00:00',
+            })
+    return items
+
+
+def measure(processor: DataProcessor, items: List[Dict[str, Any]], repeat: int) -> float:
+    """Items per second over repeat passes"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            processor.normalize_product_data(item)
+    return len(items) * repeat / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark product normalisation')
+    parser.add_argument('dumps', nargs='*', help='JSON dumps to load (default: every *.json in the repo root)')
+    parser.add_argument('--repeat', type=int, default=20, help='Passes over the loaded items')
+    args = parser.parse_args()
+
+    paths = args.dumps or sorted(glob.glob(os.path.join(ROOT, '*.json')))
+    items = load_items(paths)
+    if not items:
+        print("❌ No products found in the dumps")
+        return 1
+
+    legacy = LegacyDataProcessor()
+    compiled = DataProcessor()
+    mismatches = [item['external_id'] for item in items
+                  if legacy.normalize_product_data(item) != compiled.normalize_product_data(item)]
+    if mismatches:
+        print(f"❌ {len(mismatches)} items normalise differently, e.g. {mismatches[:3]}")
+        return 1
+
+    # Warm up both, then measure
+    measure(legacy, items, 1)
+    measure(compiled, items, 1)
+    before = measure(legacy, items, args.repeat)
+    after = measure(compiled, items, args.repeat)
+
+    print(f"{len(items)} items from {len(paths)} dumps, {args.repeat} passes")
+    print(f"before: {before:,.0f} items/sec")
+    print(f"after:  {after:,.0f} items/sec ({after / before:.2f}x)")
+    print(f"caches: {compiled.normalizer.cache_info()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
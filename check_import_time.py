@@ -0,0 +1,93 @@
+"""
+Import-time budget check
+
+Imports each module in a fresh interpreter with ``-X importtime`` and with
+the database pointed at an unreachable address, then fails if a module
+takes longer than its budget, raises on import, or has created the global
+DatabaseManager. Run it in CI or before deploying:
+
+    python check_import_time.py
+    python check_import_time.py --budget-scale 2 amazonscraper.pipelines
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative import time budgets in milliseconds. Anything importing
+# amazonscraper.items pays for Scrapy itself (roughly 0.6s).
+IMPORT_BUDGETS_MS = {
+    'database.db_manager': 300,
+    'data_processing.processor': 1500,
+    'data_processing.deduplication': 300,
+    'data_processing.realtime_sync': 500,
+    'amazonscraper.settings': 50,
+    'amazonscraper.pipelines': 2000,
+    'amazonscraper.spiders.enhanced_amazon_spider': 2000,
+}
+
+CHECK_SNIPPET = """
+import sys
+import {module}
+manager_module = sys.modules.get('database.db_manager')
+if manager_module is not None and manager_module.__dict__.get('_db_manager') is not None:
+    sys.exit('DatabaseManager was created while importing {module}')
+"""
+
+
+def measure_import(module: str) -> float:
+    """Return the cumulative import time of module in milliseconds"""
+    env = dict(os.environ)
+    env.update({
+        'DB_HOST': '127.0.0.1',
+        'DB_PORT': '1',
+        'PGCONNECT_TIMEOUT': '1',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHECK_SNIPPET.format(module=module)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError('\n'.join(errors[-5:]) or f"exit code {result.returncode}")
+
+    # Lines look like "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000.0
+    raise RuntimeError(f"No import timing reported for {module}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Check module import times against their budgets')
+    parser.add_argument('modules', nargs='*', help='Modules to check (default: all budgeted modules)')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiply every budget, e.g. on slow CI machines')
+    args = parser.parse_args()
+
+    failures = 0
+    for module in args.modules or IMPORT_BUDGETS_MS:
+        budget = IMPORT_BUDGETS_MS.get(module, 500) * args.budget_scale
+        try:
+            elapsed = measure_import(module)
+        except Exception as e:
+            print(f"❌ {module}: {e}")
+            failures += 1
+            continue
+
+        if elapsed > budget:
+            print(f"❌ {module}: {elapsed:.0f}ms (budget {budget:.0f}ms)")
+            failures += 1
+        else:
+            print(f"✅ {module}: {elapsed:.0f}ms (budget {budget:.0f}ms)")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
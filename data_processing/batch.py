@@ -0,0 +1,263 @@
+"""
+Column-oriented batch processing for DataProcessor
+
+Validation, curation, normalisation of the scalar fields and the derived
+fields run as pandas column operations over a whole batch. Values that
+repeat across a catalog (brands, categories, availability strings) are
+normalised once per distinct value.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from data_processing.normalization import _PRICE_JUNK_RE, _RATING_RE, _REVIEW_COUNT_RE
+
+logger = logging.getLogger(__name__)
+
+# Drop reasons in the order the rules are checked; a row gets the first that applies
+DROP_REASONS = ('low_rating', 'few_reviews', 'excluded_category', 'price_out_of_range',
+                'blacklisted_brand', 'out_of_stock')
+
+# Columns of the processed batch, in normalize_product_data's order
+OUTPUT_COLUMNS = [
+    'external_id', 'platform', 'title', 'description', 'brand', 'model',
+    'current_price', 'original_price', 'currency', 'availability_status',
+    'rating', 'review_count', 'category', 'subcategory', 'product_url',
+    'images', 'specifications', 'variations', 'scraped_at', 'spider_name',
+    'discount_percentage', 'is_curated',
+]
+
+Batch = Union[pd.DataFrame, Mapping[str, Sequence[Any]], Sequence[Mapping[str, Any]]]
+
+
+class BatchResult:
+    """
+    Outcome of DataProcessor.process_products.
+
+    ``products`` holds the kept rows, normalised, in OUTPUT_COLUMNS and
+    indexed like the input batch. ``drop_reasons`` has one entry per input
+    row: None for kept rows, otherwise 'missing_<field>' or one of
+    DROP_REASONS.
+    """
+
+    def __init__(self, products: pd.DataFrame, drop_reasons: pd.Series):
+        self.products = products
+        self.drop_reasons = drop_reasons
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def summary(self) -> Dict[str, int]:
+        """Number of kept rows and of rows dropped for each reason"""
+        counts = {'kept': len(self.products)}
+        counts.update(self.drop_reasons.value_counts().to_dict())
+        return counts
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Kept rows as process_product-style dicts, ready for DatabaseManager.upsert_products"""
+        frame = self.products.astype(object).where(self.products.notna(), None)
+        records = frame.to_dict('records')
+        for record in records:
+            if record['review_count'] is not None:
+                record['review_count'] = int(record['review_count'])
+            record['is_curated'] = bool(record['is_curated'])
+        return records
+
+
+def to_frame(batch: Batch) -> pd.DataFrame:
+    """DataFrame for a DataFrame, a dict of columns or a list of product dicts"""
+    if isinstance(batch, pd.DataFrame):
+        return batch
+    if isinstance(batch, Mapping):
+        return pd.DataFrame(dict(batch))
+    return pd.DataFrame.from_records(list(batch))
+
+
+def _column(frame: pd.DataFrame, name: str) -> pd.Series:
+    if name in frame.columns:
+        return frame[name]
+    return pd.Series(None, index=frame.index, dtype=object)
+
+
+def _is_blank(values: pd.Series) -> pd.Series:
+    """Vectorised `not value` for the scalar types scraped fields hold"""
+    blank = values.isna()
+    if pd.api.types.is_numeric_dtype(values):
+        return blank | values.eq(0)
+    as_text = values.astype(object)
+    return blank | as_text.eq('') | as_text.eq(0)
+
+
+def _map_distinct(values: pd.Series, func: Callable[[Any], Any], missing: Any) -> np.ndarray:
+    """func applied once per distinct value of values; missing values map to missing"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(value) for value in uniques]
+    mapped[-1] = missing
+    # factorize codes missing values as -1, which picks the last slot
+    return mapped[codes]
+
+
+def _text_column(values: pd.Series, clean: Callable[[str], str]) -> pd.Series:
+    text = values.astype(object).where(values.notna(), '')
+    return text.map(lambda value: clean(value if isinstance(value, str) else str(value)))
+
+
+def _parse_numbers(values: pd.Series, text_parser: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    Numbers kept as they are, strings parsed by text_parser, anything else NaN.
+
+    Scraped values such as '4.5 out of 5 stars' repeat heavily, so strings
+    are parsed once per distinct value.
+    """
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(float)
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    # .str yields NaN for the non-string entries of an object column
+    text = uniques.str.slice(0)
+    is_text = text.notna()
+    parsed = pd.to_numeric(text_parser(text.where(is_text, '')), errors='coerce')
+    numeric = pd.to_numeric(uniques.where(~is_text), errors='coerce')
+    # A trailing NaN slot for the -1 codes of missing values
+    parsed = np.append(parsed.where(is_text, numeric).to_numpy(dtype=float), np.nan)
+    return pd.Series(parsed[codes], index=values.index)
+
+
+def normalize_prices(values: pd.Series) -> pd.Series:
+    """Vectorised NormalizationEngine.normalize_price"""
+    return _parse_numbers(
+        values, lambda text: text.str.replace(_PRICE_JUNK_RE.pattern, '', regex=True).str.replace(',', '', regex=False)
+    )
+
+
+def normalize_ratings(values: pd.Series) -> pd.Series:
+    """Vectorised NormalizationEngine.normalize_rating"""
+    ratings = _parse_numbers(values, lambda text: text.str.extract(_RATING_RE.pattern, expand=False))
+    # Ratings above 5 are on a 10-point scale
+    return ratings.where(ratings <= 5, ratings / 2).clip(0, 5)
+
+
+def normalize_review_counts(values: pd.Series) -> pd.Series:
+    """Vectorised NormalizationEngine.normalize_review_count"""
+    counts = _parse_numbers(
+        values,
+        lambda text: text.str.extract(_REVIEW_COUNT_RE.pattern, expand=False).str.replace(',', '', regex=False),
+    )
+    return counts.round().astype('Int64')
+
+
+def _contains_any(words: List[str]) -> Callable[[str], bool]:
+    pattern = re.compile('|'.join(re.escape(word) for word in words)) if words else None
+    return lambda text: bool(pattern and pattern.search(text.lower()))
+
+
+def process_frame(processor, frame: pd.DataFrame) -> BatchResult:
+    """
+    Run processor's validation, curation rules and normalisation over frame.
+
+    Rules are evaluated on normalised values, so text such as '4.3 out of
+    5 stars' or '$1,299.00' is judged by the number it holds, and price
+    ranges are looked up by the normalised category.
+    """
+    rules = processor.curation_rules
+    normalizer = processor.normalizer
+    index = frame.index
+    reasons = pd.Series(None, index=index, dtype=object)
+
+    def drop(mask, reason: str):
+        reasons[np.asarray(mask, dtype=bool) & reasons.isna().to_numpy()] = reason
+
+    for field in rules['required_fields']:
+        drop(_is_blank(_column(frame, field)), f'missing_{field}')
+
+    current_price = normalize_prices(_column(frame, 'current_price'))
+    original_price = normalize_prices(_column(frame, 'original_price'))
+    rating = normalize_ratings(_column(frame, 'rating'))
+    review_count = normalize_review_counts(_column(frame, 'review_count'))
+
+    raw_category = _column(frame, 'category')
+    category = pd.Series(_map_distinct(raw_category, lambda value: normalizer.normalize_category(str(value)), ''),
+                         index=index)
+    brand = pd.Series(_map_distinct(_column(frame, 'brand'), lambda value: normalizer.clean_label(str(value)), ''),
+                      index=index)
+    raw_availability = _column(frame, 'availability_status')
+    availability = pd.Series(
+        _map_distinct(raw_availability, lambda value: normalizer.normalize_availability(str(value)), 'unknown'),
+        index=index,
+    )
+
+    # Curation rules, in apply_curation_rules' order
+    drop(rating.gt(0) & rating.lt(rules['min_rating']), 'low_rating')
+    drop(review_count.fillna(0).lt(rules['min_review_count']), 'few_reviews')
+    drop(_map_distinct(raw_category, _contains_any(rules['excluded_categories']), False).astype(bool),
+         'excluded_category')
+
+    price_ranges = rules['price_ranges']
+    price_min = _map_distinct(category, lambda name: price_ranges.get(name, price_ranges['default'])['min'],
+                              price_ranges['default']['min']).astype(float)
+    price_max = _map_distinct(category, lambda name: price_ranges.get(name, price_ranges['default'])['max'],
+                              price_ranges['default']['max']).astype(float)
+    drop(current_price.gt(0) & (current_price.lt(price_min) | current_price.gt(price_max)), 'price_out_of_range')
+
+    drop(_map_distinct(brand, _contains_any(rules['brand_blacklist']), False).astype(bool), 'blacklisted_brand')
+    # Items that already carry the normalised status, which normalize_availability maps to 'unknown'
+    already_out = _map_distinct(raw_availability, lambda value: str(value).lower() == 'out_of_stock', False)
+    drop(availability.eq('out_of_stock') | already_out.astype(bool), 'out_of_stock')
+
+    kept = reasons.isna().to_numpy()
+    rows = frame[kept]
+    kept_index = rows.index
+
+    products = pd.DataFrame(index=kept_index)
+    products['external_id'] = _text_column(_column(rows, 'external_id'), normalizer.clean_text)
+    products['platform'] = _map_distinct(_column(rows, 'platform'), lambda value: str(value).lower(), '')
+    products['title'] = _text_column(_column(rows, 'title'), normalizer.clean_text)
+    products['description'] = _text_column(_column(rows, 'description'), normalizer.clean_text)
+    products['brand'] = brand[kept]
+    products['model'] = _text_column(_column(rows, 'model'), normalizer.clean_text)
+    products['current_price'] = current_price[kept]
+    products['original_price'] = original_price[kept]
+    products['currency'] = _map_distinct(_column(rows, 'currency'), lambda value: str(value).upper(), 'USD')
+    products['availability_status'] = availability[kept]
+    products['rating'] = rating[kept]
+    products['review_count'] = review_count[kept]
+    products['category'] = category[kept]
+    products['subcategory'] = _map_distinct(_column(rows, 'subcategory'),
+                                            lambda value: normalizer.normalize_category(str(value)), '')
+    products['product_url'] = _column(rows, 'product_url').astype(object).where(
+        _column(rows, 'product_url').notna(), '')
+
+    # Nested fields have no columnar form and go through the scalar normalisers
+    products['images'] = [processor.normalize_images(value) if isinstance(value, list) else []
+                          for value in _column(rows, 'images')]
+    products['specifications'] = [processor.normalize_specifications(value) if isinstance(value, dict) else {}
+                                  for value in _column(rows, 'specifications')]
+    products['variations'] = [processor.normalize_variations(value) if isinstance(value, list) else []
+                              for value in _column(rows, 'variations')]
+
+    scraped_at = _column(rows, 'scraped_at').astype(object)
+    products['scraped_at'] = scraped_at.where(scraped_at.notna(), datetime.now().isoformat())
+    spider_name = _column(rows, 'spider_name').astype(object)
+    products['spider_name'] = spider_name.where(spider_name.notna(), '')
+
+    # Derived fields, as in calculate_additional_fields
+    cur = products['current_price']
+    orig = products['original_price']
+    discounted = cur.gt(0) & orig.gt(cur)
+    products['discount_percentage'] = ((orig - cur) / orig * 100).round(2).where(discounted, 0.0)
+    products['is_curated'] = (
+        products['rating'].ge(rules['min_rating'])
+        & products['review_count'].fillna(0).ge(rules['min_review_count']).astype(bool)
+        & products['availability_status'].ne('out_of_stock')
+        & products['images'].map(bool)
+        & products['specifications'].map(bool)
+    ).astype(bool)
+
+    reasons = reasons.where(reasons.notna(), None)
+    logger.debug(f"Processed batch of {len(frame)} products: {len(products)} kept")
+    return BatchResult(products[OUTPUT_COLUMNS], reasons)
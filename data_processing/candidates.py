@@ -0,0 +1,185 @@
+"""
+Candidate pair generation for product deduplication
+
+Instead of scoring every pair of products, ProductDeduplicator scores only
+pairs that share a blocking key (same platform item, or same normalised
+brand in the same or a neighbouring price bucket) or collide in a
+MinHash-LSH band over their title shingles. Products are given as
+data_processing.features.ProductFeatures, so titles and brands are
+normalised already.
+"""
+import logging
+import math
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Largest prime below 2**32, so a * x + b stays within uint64 for 32-bit a, x and b
+_PRIME = np.uint64(4294967291)
+
+
+class MinHasher:
+    """
+    MinHash signatures of the character shingles of a text.
+
+    Shingles are hashed with CRC-32 rather than hash() so signatures are
+    stable across processes and can be stored.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        if len(text) <= self.shingle_size:
+            return {text} if text else set()
+        size = self.shingle_size
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """num_perm minimum hashes of text's shingles, or None for empty text"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        permuted = (self._a[:, None] * (hashes[None, :] % _PRIME) + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1)
+
+
+class LSHBands:
+    """
+    Splits MinHash signatures into ``bands`` bands of ``num_perm // bands``
+    rows. Two texts with shingle Jaccard similarity s share at least one
+    band with probability 1 - (1 - s**rows)**bands.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def keys(self, signature: np.ndarray) -> List[bytes]:
+        """One bucket key per band, prefixed with the band number"""
+        rows = self.rows
+        return [band.to_bytes(1, 'big') + signature[band * rows:(band + 1) * rows].tobytes()
+                for band in range(self.bands)]
+
+    def threshold(self) -> float:
+        """Similarity at which the chance of sharing a band is about one half"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+
+def price_bucket(price: Optional[float], ratio: float) -> Optional[int]:
+    """Logarithmic price bucket: prices within a factor of ratio are in the same or adjacent buckets"""
+    if price is None or price <= 0:
+        return None
+    return int(math.floor(math.log(price) / math.log(ratio)))
+
+
+class CandidateGenerator:
+    """
+    Generates the pairs of products worth scoring for deduplication.
+
+    Blocks larger than ``max_block_size`` are not expanded into pairs, so one very common
+    brand and price cannot make the work quadratic again; their members
+    still meet through the title LSH. The counters of the last call are
+    kept in ``stats``.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, shingle_size: int = 3,
+                 price_bucket_ratio: float = 1.5, max_block_size: int = 50):
+        self.minhasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.lsh = LSHBands(num_perm=num_perm, bands=bands)
+        self.price_bucket_ratio = price_bucket_ratio
+        self.max_block_size = max_block_size
+        self.stats: Dict[str, Any] = {}
+
+    def _blocks(self, products: List[Any]) -> Iterable[Tuple[List[int], List[int]]]:
+        """
+        Groups of product indices sharing a blocking key, each with the group
+        whose members it is also paired with (the next price bucket up)
+        """
+        by_item: Dict[Tuple[Any, Any], List[int]] = defaultdict(list)
+        by_brand: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for index, product in enumerate(products):
+            by_item[(product.platform, product.external_id)].append(index)
+            bucket = price_bucket(product.price, self.price_bucket_ratio)
+            if product.brand and bucket is not None:
+                by_brand[(product.brand_id, bucket)].append(index)
+
+        for members in by_item.values():
+            yield members, []
+        for (brand, bucket), members in by_brand.items():
+            # Pair each bucket with the next one up so neighbouring prices meet once
+            yield members, by_brand.get((brand, bucket + 1), [])
+
+    def _lsh_buckets(self, products: List[Any]) -> Iterable[List[int]]:
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        for index, product in enumerate(products):
+            signature = self.minhasher.signature(product.title or '')
+            if signature is None:
+                continue
+            for key in self.lsh.keys(signature):
+                buckets[key].append(index)
+        return (members for members in buckets.values() if len(members) > 1)
+
+    def pairs(self, products: List[Any]) -> Set[Tuple[int, int]]:
+        """Index pairs (i, j), i < j, of products that may be duplicates"""
+        candidates: Set[Tuple[int, int]] = set()
+        oversized = 0
+        for members, neighbours in self._blocks(products):
+            # Each block is capped on its own; an oversized neighbour only loses the cross pairs
+            if len(members) > self.max_block_size:
+                oversized += 1
+                continue
+            self._add_pairs(candidates, members)
+            if neighbours and len(neighbours) <= self.max_block_size:
+                self._add_cross_pairs(candidates, members, neighbours)
+        block_pairs = len(candidates)
+
+        for members in self._lsh_buckets(products):
+            self._add_pairs(candidates, members)
+
+        total = len(products) * (len(products) - 1) // 2
+        self.stats = {
+            'products': len(products),
+            'candidate_pairs': len(candidates),
+            'block_pairs': block_pairs,
+            'lsh_pairs': len(candidates) - block_pairs,
+            'oversized_blocks': oversized,
+            'all_pairs': total,
+            'pair_reduction': round(1 - len(candidates) / total, 6) if total else 0.0,
+        }
+        return candidates
+
+    @staticmethod
+    def _add_pairs(candidates: Set[Tuple[int, int]], members: List[int]):
+        members = sorted(set(members))
+        for position, first in enumerate(members):
+            for second in members[position + 1:]:
+                candidates.add((first, second))
+
+    @staticmethod
+    def _add_cross_pairs(candidates: Set[Tuple[int, int]], members: List[int], others: List[int]):
+        for first in members:
+            for second in others:
+                if first != second:
+                    candidates.add((min(first, second), max(first, second)))
+
+    def neighbours(self, products: List[Any]) -> List[List[int]]:
+        """For each product, the sorted indices of later products it forms a candidate pair with"""
+        neighbours: List[List[int]] = [[] for _ in products]
+        for first, second in self.pairs(products):
+            neighbours[first].append(second)
+        for later in neighbours:
+            later.sort()
+        return neighbours
@@ -3,48 +3,142 @@ Data Deduplication System for Unified E-commerce Product Data Aggregator
 """
 import hashlib
 import logging
+import os
+import random
 from typing import Dict, Any, List, Optional, Tuple
-from difflib import SequenceMatcher
 import re
 from datetime import datetime
 import json
 
 logger = logging.getLogger(__name__)
 
+# Words left out of normalised text
+COMMON_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+_SPECIAL_CHARACTERS = re.compile(r'[^\w\s]')
+
+# Product columns read from the database for deduplication
+DEDUPLICATION_COLUMNS = (
+    'id', 'external_id', 'platform', 'title', 'description', 'brand', 'category',
+    'current_price', 'rating', 'review_count'
+)
+
 class ProductDeduplicator:
     """
     Advanced product deduplication system that identifies and prevents duplicate products
     across different e-commerce platforms.
     """
     
-    def __init__(self):
+    def __init__(self, kernel: str = 'sequence'):
         self.similarity_threshold = 0.85  # 85% similarity threshold
         self.title_weight = 0.4
         self.brand_weight = 0.3
         self.price_weight = 0.2
         self.specs_weight = 0.1
-        
+        self.kernel_name = kernel
+        self._candidates = None
+        self._kernel = None
+    
+    @property
+    def candidates(self):
+        """CandidateGenerator used by find_duplicates, created on first use"""
+        if self._candidates is None:
+            # numpy is only imported once deduplication actually runs
+            from data_processing.candidates import CandidateGenerator
+            self._candidates = CandidateGenerator()
+        return self._candidates
+    
+    @property
+    def kernel(self):
+        """SimilarityKernel comparing titles, brands and specification values, created on first use"""
+        if self._kernel is None:
+            from data_processing.similarity import get_kernel
+            self._kernel = get_kernel(self.kernel_name, self._normalize_text)
+        return self._kernel
+    
+    def featurizer(self):
+        """A Featurizer normalising with this deduplicator; records are comparable within one Featurizer"""
+        from data_processing.features import Featurizer
+        return Featurizer(self._normalize_text)
+    
+    def featurize(self, products: List[Dict[str, Any]]) -> list:
+        """ProductFeatures of products, normalised once for all the comparisons they take part in"""
+        return self.featurizer().featurize(products)
+    
     def find_duplicates(self, products: List[Dict[str, Any]]) -> List[List[str]]:
         """
         Find duplicate products in a list of products.
         Returns a list of duplicate groups, where each group contains product IDs.
+        
+        Only candidate pairs from blocking and title LSH are scored, and pairs whose
+        price alone rules out reaching the threshold are skipped; the groups are built
+        the same way as by find_duplicates_exhaustive. Products are featurised once,
+        and each product is scored against its candidates as a block.
+        """
+        featurizer = self.featurizer()
+        features = featurizer.featurize(products)
+        neighbours = self.candidates.neighbours(features)
+        prepared = self._prepare(features, featurizer.tokens)
+        duplicate_groups = []
+        processed_products = set()
+        scored = 0
+        
+        for i, product1 in enumerate(features):
+            if product1.external_id in processed_products:
+                continue
+                
+            duplicate_group = [product1.external_id]
+            block = [
+                j for j in neighbours[i]
+                if features[j].external_id not in processed_products
+                and self._could_be_duplicates(product1, features[j])
+            ]
+            scored += len(block)
+            
+            for j, score in zip(block, self._block_similarity(features, prepared, i, block)):
+                product2 = features[j]
+                if product2.external_id in processed_products:
+                    continue
+                
+                if self._is_same_item(product1, product2) or score >= self.similarity_threshold:
+                    duplicate_group.append(product2.external_id)
+                    processed_products.add(product2.external_id)
+            
+            if len(duplicate_group) > 1:
+                duplicate_groups.append(duplicate_group)
+                for product_id in duplicate_group:
+                    processed_products.add(product_id)
+        
+        logger.info(f"Scored {scored} of {self.candidates.stats['candidate_pairs']} candidate pairs "
+                    f"({self.candidates.stats['all_pairs']} pairs in total) for {len(products)} products")
+        return duplicate_groups
+    
+    def find_duplicates_exhaustive(self, products: List[Dict[str, Any]]) -> List[List[str]]:
         """
+        find_duplicates comparing every pair of products.
+        Quadratic in the number of products; used to measure the candidate recall.
+        Pairs are scored from the same prepared titles and brands as find_duplicates.
+        """
+        featurizer = self.featurizer()
+        features = featurizer.featurize(products)
+        prepared = self._prepare(features, featurizer.tokens)
         duplicate_groups = []
         processed_products = set()
         
-        for i, product1 in enumerate(products):
-            if product1['external_id'] in processed_products:
+        for i, product1 in enumerate(features):
+            if product1.external_id in processed_products:
                 continue
                 
-            duplicate_group = [product1['external_id']]
+            duplicate_group = [product1.external_id]
+            block = [j for j in range(i + 1, len(features)) if features[j].external_id not in processed_products]
             
-            for j, product2 in enumerate(products[i+1:], i+1):
-                if product2['external_id'] in processed_products:
+            for j, score in zip(block, self._block_similarity(features, prepared, i, block)):
+                product2 = features[j]
+                if product2.external_id in processed_products:
                     continue
                     
-                if self._are_duplicates(product1, product2):
-                    duplicate_group.append(product2['external_id'])
-                    processed_products.add(product2['external_id'])
+                if self._is_same_item(product1, product2) or score >= self.similarity_threshold:
+                    duplicate_group.append(product2.external_id)
+                    processed_products.add(product2.external_id)
             
             if len(duplicate_group) > 1:
                 duplicate_groups.append(duplicate_group)
@@ -53,78 +147,137 @@ class ProductDeduplicator:
         
         return duplicate_groups
     
+    def _could_be_duplicates(self, product1, product2) -> bool:
+        """
+        Cheap upper bound on _are_duplicates for two ProductFeatures: False when the
+        pair cannot reach the threshold even with identical titles, brands and
+        specifications.
+        """
+        if self._is_same_item(product1, product2):
+            return True
+        
+        best_score = self.title_weight + self.brand_weight
+        if product1.specs and product2.specs:
+            best_score += self.specs_weight
+        best_score += self.price_weight * self._price_similarity(product1.price, product2.price)
+        return best_score >= self.similarity_threshold
+    
+    def candidate_recall(self, products: List[Dict[str, Any]], sample_size: int = 200,
+                         seed: int = 0) -> Dict[str, Any]:
+        """
+        Measure candidate generation against exhaustive comparison.
+        
+        Each of sample_size randomly chosen products is compared with every other
+        product, and recall is the share of the duplicate pairs found that way (pairs
+        scored as find_duplicates scores them) that are also candidate pairs. The
+        cost is linear in the catalog size for a fixed sample.
+        """
+        sampled = random.Random(seed).sample(range(len(products)), min(sample_size, len(products)))
+        featurizer = self.featurizer()
+        features = featurizer.featurize(products)
+        prepared = self._prepare(features, featurizer.tokens)
+        candidate_pairs = self.candidates.pairs(features)
+        
+        duplicate_pairs = set()
+        for i in sampled:
+            block = [j for j, other in enumerate(features) if i != j and self._could_be_duplicates(features[i], other)]
+            for j, score in zip(block, self._block_similarity(features, prepared, i, block)):
+                if self._is_same_item(features[i], features[j]) or score >= self.similarity_threshold:
+                    duplicate_pairs.add((min(i, j), max(i, j)))
+        found = len(duplicate_pairs & candidate_pairs)
+        
+        return {
+            'sample_size': len(sampled),
+            'duplicate_pairs': len(duplicate_pairs),
+            'found_pairs': found,
+            'recall': round(found / len(duplicate_pairs), 4) if duplicate_pairs else 1.0,
+            'candidate_pairs': len(candidate_pairs),
+            'pair_reduction': self.candidates.stats['pair_reduction'],
+        }
+    
     def _are_duplicates(self, product1: Dict[str, Any], product2: Dict[str, Any]) -> bool:
         """
         Determine if two products are duplicates based on multiple criteria.
+        A pair on its own has no corpus, so the tfidf kernel uses term-frequency
+        cosine here; batches of products are scored with find_duplicates.
         """
+        return self._features_are_duplicates(*self.featurize([product1, product2]))
+    
+    def _features_are_duplicates(self, product1, product2) -> bool:
+        """_are_duplicates for two ProductFeatures"""
         # Skip if same platform and external_id
-        if (product1['platform'] == product2['platform'] and 
-            product1['external_id'] == product2['external_id']):
+        if self._is_same_item(product1, product2):
             return True
         
         # Calculate similarity score
-        similarity_score = self._calculate_similarity(product1, product2)
+        similarity_score = self._features_similarity(product1, product2)
         
         return similarity_score >= self.similarity_threshold
     
-    def _calculate_similarity(self, product1: Dict[str, Any], product2: Dict[str, Any]) -> float:
+    @staticmethod
+    def _is_same_item(product1, product2) -> bool:
+        return (product1.platform == product2.platform and 
+                product1.external_id == product2.external_id)
+    
+    def _prepare(self, features: list, vocabulary: List[str], corpora: Optional[tuple] = None):
         """
-        Calculate similarity score between two products.
+        Kernel-prepared titles and brands of ProductFeatures, vocabulary being the
+        tokens of the Featurizer that made them. corpora is a (title, brand) pair of
+        Corpus for kernels that use one; by default the features are their own corpus.
         """
-        scores = []
-        
-        # Title similarity
-        title_sim = self._text_similarity(
-            product1.get('title', ''),
-            product2.get('title', '')
-        )
-        scores.append(title_sim * self.title_weight)
-        
-        # Brand similarity
-        brand_sim = self._text_similarity(
-            product1.get('brand', ''),
-            product2.get('brand', '')
-        )
-        scores.append(brand_sim * self.brand_weight)
-        
-        # Price similarity
-        price_sim = self._price_similarity(
-            product1.get('current_price'),
-            product2.get('current_price')
+        title_corpus, brand_corpus = corpora or (None, None)
+        return (
+            self.kernel.with_corpus(title_corpus).prepare([product.title for product in features],
+                                                          [product.tokens for product in features], vocabulary),
+            self.kernel.with_corpus(brand_corpus).prepare([product.brand for product in features])
         )
-        scores.append(price_sim * self.price_weight)
-        
-        # Specifications similarity
-        specs_sim = self._specifications_similarity(
-            product1.get('specifications', []),
-            product2.get('specifications', [])
-        )
-        scores.append(specs_sim * self.specs_weight)
+    
+    def _block_similarity(self, features: list, prepared, index: int, others: List[int]) -> List[float]:
+        """
+        Similarity of features[index] with each of features[others], the titles
+        and brands being scored by the kernel as one block.
+        """
+        if not others:
+            return []
+        titles, brands = prepared
+        partial = (titles.scores(index, others) * self.title_weight +
+                   brands.scores(index, others) * self.brand_weight)
         
-        return sum(scores)
+        product = features[index]
+        scores = []
+        for score, other in zip(partial.tolist(), (features[j] for j in others)):
+            score += self._price_similarity(product.price, other.price) * self.price_weight
+            score += self._specifications_similarity(product.specs, other.specs) * self.specs_weight
+            scores.append(score)
+        return scores
+    
+    def similarity_scores(self, product: Dict[str, Any], others: List[Dict[str, Any]]) -> List[float]:
+        """Similarity score of product with each of others, scored as one block"""
+        featurizer = self.featurizer()
+        features = featurizer.featurize([product] + list(others))
+        prepared = self._prepare(features, featurizer.tokens)
+        return self._block_similarity(features, prepared, 0, list(range(1, len(features))))
+    
+    def _calculate_similarity(self, product1: Dict[str, Any], product2: Dict[str, Any]) -> float:
+        """
+        Calculate similarity score between two products.
+        """
+        return self._features_similarity(*self.featurize([product1, product2]))
+    
+    def _features_similarity(self, product1, product2) -> float:
+        """_calculate_similarity for two ProductFeatures"""
+        kernel = self.kernel
+        score = kernel.compare(product1.title, product2.title) * self.title_weight
+        score += kernel.compare(product1.brand, product2.brand) * self.brand_weight
+        score += self._price_similarity(product1.price, product2.price) * self.price_weight
+        score += self._specifications_similarity(product1.specs, product2.specs) * self.specs_weight
+        return score
     
     def _text_similarity(self, text1: str, text2: str) -> float:
         """
-        Calculate text similarity using multiple methods.
+        Calculate text similarity with the configured kernel.
         """
-        if not text1 or not text2:
-            return 0.0
-        
-        # Normalize text
-        text1 = self._normalize_text(text1)
-        text2 = self._normalize_text(text2)
-        
-        if text1 == text2:
-            return 1.0
-        
-        # Use SequenceMatcher for fuzzy matching
-        similarity = SequenceMatcher(None, text1, text2).ratio()
-        
-        # Check for partial matches (e.g., "iPhone 13" vs "Apple iPhone 13")
-        if similarity < 0.8:
-            similarity = max(similarity, self._partial_text_match(text1, text2))
-        
-        return similarity
+        return self.kernel.similarity(text1, text2)
     
     def _normalize_text(self, text: str) -> str:
         """
@@ -133,34 +286,10 @@ class ProductDeduplicator:
         if not text:
             return ""
         
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove special characters and extra spaces
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove common words
-        common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        words = text.split()
-        words = [word for word in words if word not in common_words]
-        
-        return ' '.join(words).strip()
-    
-    def _partial_text_match(self, text1: str, text2: str) -> float:
-        """
-        Check for partial text matches.
-        """
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        # Lowercase, turn special characters into spaces and drop common words;
+        # split() also collapses the spaces
+        words = _SPECIAL_CHARACTERS.sub(' ', text.lower()).split()
+        return ' '.join([word for word in words if word not in COMMON_WORDS])
     
     def _price_similarity(self, price1: Optional[float], price2: Optional[float]) -> float:
         """
@@ -189,33 +318,25 @@ class ProductDeduplicator:
         else:
             return max(0.0, 0.6 - (price_ratio - 0.2) * 2)
     
-    def _specifications_similarity(self, specs1: List[Dict[str, Any]], specs2: List[Dict[str, Any]]) -> float:
+    def _specifications_similarity(self, specs1: Dict[str, Optional[str]], specs2: Dict[str, Optional[str]]) -> float:
         """
-        Calculate specifications similarity.
+        Calculate specifications similarity of two ProductFeatures.specs dicts
+        (lower-cased name -> normalised value).
         """
         if not specs1 or not specs2:
             return 0.0
         
-        # Convert specs to dictionaries for easier comparison
-        specs_dict1 = {spec.get('spec_name', '').lower(): spec.get('spec_value', '').lower() 
-                      for spec in specs1 if spec.get('spec_name')}
-        specs_dict2 = {spec.get('spec_name', '').lower(): spec.get('spec_value', '').lower() 
-                      for spec in specs2 if spec.get('spec_name')}
-        
-        if not specs_dict1 or not specs_dict2:
-            return 0.0
-        
         # Find common specifications
-        common_specs = set(specs_dict1.keys()).intersection(set(specs_dict2.keys()))
+        common_specs = set(specs1.keys()).intersection(set(specs2.keys()))
         
         if not common_specs:
             return 0.0
         
         # Calculate similarity for common specs
+        compare = self.kernel.compare
         total_similarity = 0.0
         for spec_name in common_specs:
-            spec_similarity = self._text_similarity(specs_dict1[spec_name], specs_dict2[spec_name])
-            total_similarity += spec_similarity
+            total_similarity += compare(specs1[spec_name], specs2[spec_name])
         
         return total_similarity / len(common_specs)
     
@@ -223,12 +344,16 @@ class ProductDeduplicator:
         """
         Generate a unique fingerprint for a product to aid in deduplication.
         """
+        return self.fingerprint(self.featurize([product])[0])
+    
+    def fingerprint(self, features) -> str:
+        """generate_fingerprint from a product's ProductFeatures"""
         fingerprint_data = {
-            'title': self._normalize_text(product.get('title', '')),
-            'brand': self._normalize_text(product.get('brand', '')),
-            'category': self._normalize_text(product.get('category', '')),
-            'price_range': self._get_price_range(product.get('current_price')),
-            'key_specs': self._extract_key_specs(product.get('specifications', []))
+            'title': features.title or '',
+            'brand': features.brand or '',
+            'category': features.category,
+            'price_range': self._get_price_range(features.price),
+            'key_specs': features.key_specs
         }
         
         fingerprint_string = json.dumps(fingerprint_data, sort_keys=True)
@@ -258,19 +383,8 @@ class ProductDeduplicator:
         """
         Extract key specifications for fingerprinting.
         """
-        key_specs = {}
-        important_specs = ['color', 'size', 'model', 'capacity', 'storage', 'memory', 'screen size', 'weight']
-        
-        for spec in specifications:
-            spec_name = spec.get('spec_name', '').lower()
-            spec_value = spec.get('spec_value', '').lower()
-            
-            for important_spec in important_specs:
-                if important_spec in spec_name:
-                    key_specs[important_spec] = spec_value
-                    break
-        
-        return key_specs
+        from data_processing.features import extract_key_specs
+        return extract_key_specs(specifications)
     
     def resolve_duplicates(self, duplicate_groups: List[List[str]], products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -348,29 +462,32 @@ class ProductDeduplicator:
     def deduplicate_database(self, db_manager) -> Dict[str, Any]:
         """
         Perform deduplication on the entire database.
+        
+        Products are kept in a persistent SimilarityIndex at the database
+        config's similarity_index_path: the first run indexes the whole
+        catalog, later runs only the products changed since the previous one
+        (scrapers with the index enabled have usually matched those already),
+        and the duplicate groups are read from the index.
         """
         logger.info("Starting database deduplication process...")
         
-        # Get all products from database
-        products = db_manager.get_all_products()
+        index = self.similarity_index(db_manager.config.similarity_index_path)
+        try:
+            synced = index.sync(db_manager)
+            duplicate_groups = index.duplicate_groups()
+            stats = index.stats()
+        finally:
+            index.close()
         
-        if not products:
+        if not stats['products']:
             logger.info("No products found in database for deduplication.")
             return {'duplicates_found': 0, 'products_removed': 0}
         
-        logger.info(f"Found {len(products)} products for deduplication analysis.")
-        
-        # Find duplicates
-        duplicate_groups = self.find_duplicates(products)
-        
-        logger.info(f"Found {len(duplicate_groups)} duplicate groups.")
+        logger.info(f"Similarity index holds {stats['products']} products, {len(duplicate_groups)} duplicate groups.")
         
-        # Resolve duplicates
-        resolved_products = self.resolve_duplicates(duplicate_groups, products)
-        
-        # Calculate statistics
+        # Resolution keeps one product per group
         duplicates_found = sum(len(group) - 1 for group in duplicate_groups)
-        products_removed = len(products) - len(resolved_products)
+        products_removed = duplicates_found
         
         logger.info(f"Deduplication complete: {duplicates_found} duplicates found, {products_removed} products removed.")
         
@@ -378,10 +495,18 @@ class ProductDeduplicator:
             'duplicates_found': duplicates_found,
             'products_removed': products_removed,
             'duplicate_groups': duplicate_groups,
-            'final_count': len(resolved_products)
+            'final_count': stats['products'] - products_removed,
+            'indexed': synced['indexed'],
+            'unindexed': synced['removed']
         }
+    
+    def similarity_index(self, path: str):
+        """Open the on-disk SimilarityIndex at path, scoring with this deduplicator"""
+        # Imported here: similarity_index imports this module
+        from data_processing.similarity_index import SimilarityIndex
+        return SimilarityIndex(path, deduplicator=self)
 
 # Global deduplicator instance
-deduplicator = ProductDeduplicator()
+deduplicator = ProductDeduplicator(kernel=os.getenv('DEDUP_SIMILARITY_KERNEL', 'sequence'))
 
 
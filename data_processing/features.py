@@ -0,0 +1,141 @@
+"""
+Product feature records for deduplication
+
+Deduplication compares each product with many others. Featurizer does the
+string work once per product: normalised title with its token ids,
+normalised brand with a brand id, price, normalised specification values
+and the key specifications used in fingerprints. Similarity scoring,
+candidate generation and fingerprinting then read these records only.
+"""
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Specifications that identify a product variant, used in fingerprints
+KEY_SPECIFICATIONS = ['color', 'size', 'model', 'capacity', 'storage', 'memory', 'screen size', 'weight']
+
+
+def specification_rows(specifications: Any) -> List[Dict[str, Any]]:
+    """
+    Specifications in database row form. Scraped items carry a name -> value
+    dict, with nested category -> {name: value} dicts; they are flattened and
+    their values turned into text the way DatabaseManager stores them.
+    """
+    if not isinstance(specifications, dict):
+        return specifications or []
+    rows = []
+    for spec_name, spec_value in specifications.items():
+        if isinstance(spec_value, dict):
+            for specs in spec_value.values():
+                rows.extend({'spec_name': name, 'spec_value': str(value)} for name, value in specs.items())
+        else:
+            rows.append({'spec_name': spec_name, 'spec_value': str(spec_value)})
+    return rows
+
+
+def extract_key_specs(specifications: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Lower-cased values of the key specifications, the last one of each kind winning"""
+    key_specs = {}
+    for spec in specifications:
+        spec_name = (spec.get('spec_name') or '').lower()
+        spec_value = (spec.get('spec_value') or '').lower()
+        for important_spec in KEY_SPECIFICATIONS:
+            if important_spec in spec_name:
+                key_specs[important_spec] = spec_value
+                break
+    return key_specs
+
+
+class ProductFeatures:
+    """
+    What deduplication compares of one product.
+
+    title, brand and specification values are normalised, or None where the
+    product had no such text, which scores 0 against anything; tokens are
+    the title's token ids and brand_id the brand's id in the Featurizer that
+    made the record, -1 for no brand.
+    """
+
+    __slots__ = ('platform', 'external_id', 'title', 'tokens', 'brand', 'brand_id', 'category', 'price',
+                 'specs', 'key_specs')
+
+    def __init__(self, platform: Any, external_id: Any, title: Optional[str], tokens: Tuple[int, ...],
+                 brand: Optional[str], brand_id: int, category: str, price: Any,
+                 specs: Dict[str, Optional[str]], key_specs: Dict[str, str]):
+        self.platform = platform
+        self.external_id = external_id
+        self.title = title
+        self.tokens = tokens
+        self.brand = brand
+        self.brand_id = brand_id
+        self.category = category
+        self.price = price
+        self.specs = specs
+        self.key_specs = key_specs
+
+
+class Featurizer:
+    """
+    Builds ProductFeatures with shared token and brand vocabularies, so
+    records from the same Featurizer can be compared by id. Short texts
+    that repeat across products (brands, categories, specification values)
+    are normalised once.
+    """
+
+    def __init__(self, normalize: Callable[[str], str]):
+        self.normalize = normalize
+        self.vocabulary: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.brands: Dict[str, int] = {}
+        self._labels: Dict[str, str] = {}
+
+    def _label(self, text: Any) -> Optional[str]:
+        """Normalised short text, None if empty"""
+        if not text:
+            return None
+        normalized = self._labels.get(text)
+        if normalized is None:
+            normalized = self._labels[text] = self.normalize(text)
+        return normalized
+
+    def _token_ids(self, text: Optional[str]) -> Tuple[int, ...]:
+        if not text:
+            return ()
+        vocabulary = self.vocabulary
+        ids = []
+        for token in text.split():
+            token_id = vocabulary.get(token)
+            if token_id is None:
+                token_id = vocabulary[token] = len(self.tokens)
+                self.tokens.append(token)
+            ids.append(token_id)
+        return tuple(ids)
+
+    def features(self, product: Dict[str, Any]) -> ProductFeatures:
+        raw_title = product.get('title', '')
+        title = self.normalize(raw_title) if raw_title else None
+        brand = self._label(product.get('brand', ''))
+        brand_id = self.brands.setdefault(brand, len(self.brands)) if brand else -1
+
+        specifications = specification_rows(product.get('specifications', []))
+        specs = {}
+        for spec in specifications:
+            if spec.get('spec_name'):
+                specs[spec['spec_name'].lower()] = self._label((spec.get('spec_value') or '').lower())
+
+        return ProductFeatures(
+            platform=product.get('platform'),
+            external_id=product.get('external_id'),
+            title=title,
+            tokens=self._token_ids(title),
+            brand=brand,
+            brand_id=brand_id,
+            category=self._label(product.get('category', '')) or '',
+            price=product.get('current_price'),
+            specs=specs,
+            key_specs=extract_key_specs(specifications),
+        )
+
+    def featurize(self, products: List[Dict[str, Any]]) -> List[ProductFeatures]:
+        return [self.features(product) for product in products]
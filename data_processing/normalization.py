@@ -0,0 +1,201 @@
+"""
+Compiled normalisation engine for DataProcessor
+
+Keyword rules are compiled once into an Aho-Corasick automaton, the value
+parsers use precompiled regexes, and results for repeated strings such as
+brands and category names are memoised.
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Standard category -> substrings of scraped category names that map to it.
+# Earlier entries win when a name matches several categories.
+CATEGORY_MAPPING: Dict[str, List[str]] = {
+    'electronics': ['electronic', 'electronics & photo', 'computers & electronics'],
+    'clothing': ['clothes', 'apparel', 'fashion', 'clothing, shoes & jewelry'],
+    'home': ['home & kitchen', 'home improvement', 'home & garden'],
+    'books': ['book', 'books & media', 'books & magazines'],
+    'sports': ['sport', 'sports & outdoors', 'sports & recreation'],
+    'beauty': ['beauty & personal care', 'health & beauty', 'cosmetics'],
+    'toys': ['toy', 'toys & games', 'children\'s toys'],
+    'automotive': ['auto', 'automotive & motorcycle', 'car & motorbike'],
+}
+
+# Availability status -> phrases that indicate it, checked in this order
+AVAILABILITY_KEYWORDS: Dict[str, List[str]] = {
+    'in_stock': ['in stock', 'available', 'add to cart'],
+    'out_of_stock': ['out of stock', 'unavailable', 'sold out'],
+    'pre_order': ['pre-order', 'preorder', 'coming soon'],
+    'limited_stock': ['limited', 'few left', 'low stock'],
+}
+
+_PRICE_JUNK_RE = re.compile(r'[^\d.,]')
+_RATING_RE = re.compile(r'(\d+\.?\d*)')
+_REVIEW_COUNT_RE = re.compile(r'([\d,]+)')
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a set of keywords, each tagged with a label.
+
+    ``match`` scans the text once, whatever the number of keywords, and
+    returns the label of the highest-priority rule with a keyword anywhere
+    in the text, where priority is the order of the rules passed in.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, Sequence[str]]]):
+        self._labels: List[str] = []
+        # goto[state] maps a character to the next state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Best (lowest) rule priority of any keyword ending at each state
+        self._output: List[Optional[int]] = [None]
+
+        for priority, (label, keywords) in enumerate(rules):
+            self._labels.append(label)
+            for keyword in keywords:
+                self._add(keyword.lower(), priority)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, priority: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        current = self._output[state]
+        self._output[state] = priority if current is None else min(current, priority)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # A state also ends every keyword its failure state ends
+                inherited = self._output[self._fail[next_state]]
+                if inherited is not None:
+                    current = self._output[next_state]
+                    self._output[next_state] = inherited if current is None else min(current, inherited)
+
+    def match(self, text: str) -> Optional[str]:
+        """Label of the highest-priority rule matching the lower-cased text, or None"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = output[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return None if best is None else self._labels[best]
+
+
+class NormalizationEngine:
+    """
+    Field normalisers for scraped product data, built once from the rules.
+
+    Category and availability results and ``clean_label`` (text cleaning for
+    short fields such as brands) are memoised in LRU caches of ``cache_size``
+    entries, since the same strings recur across a catalog. ``clean_text``
+    is not memoised so titles and descriptions do not crowd the caches.
+    """
+
+    def __init__(self, category_mapping: Optional[Dict[str, List[str]]] = None,
+                 availability_keywords: Optional[Dict[str, List[str]]] = None, cache_size: int = 4096):
+        self.category_matcher = KeywordMatcher((category_mapping or CATEGORY_MAPPING).items())
+        self.availability_matcher = KeywordMatcher((availability_keywords or AVAILABILITY_KEYWORDS).items())
+
+        self.clean_label = lru_cache(maxsize=cache_size)(self.clean_text)
+        self.normalize_category = lru_cache(maxsize=cache_size)(self._normalize_category)
+        self.normalize_availability = lru_cache(maxsize=cache_size)(self._normalize_availability)
+
+    @staticmethod
+    def clean_text(text: str) -> str:
+        if not text:
+            return ''
+        # split() drops \r, \n and \t along with every other whitespace run
+        return ' '.join(text.split())
+
+    def _normalize_category(self, category: str) -> str:
+        if not category:
+            return ''
+        category = self.clean_label(category)
+        return self.category_matcher.match(category.lower()) or category
+
+    def _normalize_availability(self, availability: str) -> str:
+        if not availability:
+            return 'unknown'
+        return self.availability_matcher.match(availability.lower().strip()) or 'unknown'
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Hit and miss counts of the memoised normalisers"""
+        return {
+            name: getattr(self, name).cache_info()._asdict()
+            for name in ('clean_label', 'normalize_category', 'normalize_availability')
+        }
+
+    @staticmethod
+    def normalize_price(price: Any) -> Optional[float]:
+        if price is None:
+            return None
+        if isinstance(price, (int, float)):
+            return float(price)
+        if isinstance(price, str):
+            # Remove currency symbols and clean
+            cleaned = _PRICE_JUNK_RE.sub('', price)
+            try:
+                return float(cleaned.replace(',', ''))
+            except (ValueError, TypeError):
+                pass
+        return None
+
+    @staticmethod
+    def normalize_rating(rating: Any) -> Optional[float]:
+        if rating is None:
+            return None
+        if isinstance(rating, (int, float)):
+            rating = float(rating)
+        elif isinstance(rating, str):
+            match = _RATING_RE.search(rating)
+            if not match:
+                return None
+            rating = float(match.group(1))
+        else:
+            return None
+        if rating > 5:
+            rating = rating / 2  # Convert from 10-point scale
+        return max(0, min(5, rating))
+
+    @staticmethod
+    def normalize_review_count(review_count: Any) -> Optional[int]:
+        if review_count is None:
+            return None
+        if isinstance(review_count, int):
+            return review_count
+        if isinstance(review_count, str):
+            match = _REVIEW_COUNT_RE.search(review_count)
+            if match:
+                try:
+                    return int(match.group(1).replace(',', ''))
+                except (ValueError, TypeError):
+                    pass
+        return None
@@ -5,9 +5,10 @@ import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
-import re
+import threading
 
 from amazonscraper.items import ProductItem, AmazonProductItem, ImageItem, SpecificationItem, VariationItem
+from data_processing.normalization import NormalizationEngine
 from database.db_manager import get_db_manager
 
 logger = logging.getLogger(__name__)
@@ -17,8 +18,16 @@ class DataProcessor:
     """Process and normalize scraped data"""
     
     def __init__(self):
-        self.db_manager = get_db_manager()
+        self._db_manager = None
         self.curation_rules = self.load_curation_rules()
+        self.normalizer = NormalizationEngine()
+    
+    @property
+    def db_manager(self):
+        """Database manager, looked up on first use"""
+        if self._db_manager is None:
+            self._db_manager = get_db_manager()
+        return self._db_manager
     
     def load_curation_rules(self) -> Dict[str, Any]:
         """Load curation and filtering rules"""
@@ -66,6 +75,23 @@ class DataProcessor:
             logger.error(f"Error processing product: {e}")
             return None
     
+    def process_products(self, batch):
+        """
+        Process a batch of products as column operations.
+
+        batch is a pandas DataFrame, a dict of columns or a list of product
+        dicts. Returns a data_processing.batch.BatchResult with the kept
+        rows normalised as process_product would and the drop reason of
+        every input row.
+        """
+        # pandas is only imported by callers that process batches
+        from data_processing.batch import process_frame, to_frame
+
+        frame = to_frame(batch)
+        result = process_frame(self, frame)
+        logger.info(f"Processed {len(frame)} products in batch: {result.summary()}")
+        return result
+
     def validate_required_fields(self, product_data: Dict[str, Any]) -> bool:
         """Validate that product has required fields"""
         required_fields = self.curation_rules['required_fields']
@@ -130,7 +156,7 @@ class DataProcessor:
         normalized['platform'] = product_data.get('platform', '').lower()
         normalized['title'] = self.clean_text(product_data.get('title', ''))
         normalized['description'] = self.clean_text(product_data.get('description', ''))
-        normalized['brand'] = self.clean_text(product_data.get('brand', ''))
+        normalized['brand'] = self.clean_label(product_data.get('brand', ''))
         normalized['model'] = self.clean_text(product_data.get('model', ''))
         
         # Pricing
@@ -169,110 +195,23 @@ class DataProcessor:
     
     def normalize_price(self, price: Any) -> Optional[float]:
         """Normalize price to float"""
-        if price is None:
-            return None
-        
-        if isinstance(price, (int, float)):
-            return float(price)
-        
-        if isinstance(price, str):
-            # Remove currency symbols and clean
-            cleaned = re.sub(r'[^\d.,]', '', price)
-            try:
-                return float(cleaned.replace(',', ''))
-            except (ValueError, TypeError):
-                pass
-        
-        return None
+        return self.normalizer.normalize_price(price)
     
     def normalize_availability(self, availability: str) -> str:
         """Normalize availability status"""
-        if not availability:
-            return 'unknown'
-        
-        availability_lower = availability.lower().strip()
-        
-        if any(word in availability_lower for word in ['in stock', 'available', 'add to cart']):
-            return 'in_stock'
-        elif any(word in availability_lower for word in ['out of stock', 'unavailable', 'sold out']):
-            return 'out_of_stock'
-        elif any(word in availability_lower for word in ['pre-order', 'preorder', 'coming soon']):
-            return 'pre_order'
-        elif any(word in availability_lower for word in ['limited', 'few left', 'low stock']):
-            return 'limited_stock'
-        else:
-            return 'unknown'
+        return self.normalizer.normalize_availability(availability)
     
     def normalize_rating(self, rating: Any) -> Optional[float]:
         """Normalize rating to 1-5 scale"""
-        if rating is None:
-            return None
-        
-        if isinstance(rating, (int, float)):
-            rating = float(rating)
-            if rating > 5:
-                rating = rating / 2  # Convert from 10-point scale
-            return max(0, min(5, rating))
-        
-        if isinstance(rating, str):
-            # Extract numeric rating
-            match = re.search(r'(\d+\.?\d*)', rating)
-            if match:
-                try:
-                    rating = float(match.group(1))
-                    if rating > 5:
-                        rating = rating / 2
-                    return max(0, min(5, rating))
-                except (ValueError, TypeError):
-                    pass
-        
-        return None
+        return self.normalizer.normalize_rating(rating)
     
     def normalize_review_count(self, review_count: Any) -> Optional[int]:
         """Normalize review count to integer"""
-        if review_count is None:
-            return None
-        
-        if isinstance(review_count, int):
-            return review_count
-        
-        if isinstance(review_count, str):
-            # Extract number from text
-            match = re.search(r'([\d,]+)', review_count)
-            if match:
-                try:
-                    return int(match.group(1).replace(',', ''))
-                except (ValueError, TypeError):
-                    pass
-        
-        return None
+        return self.normalizer.normalize_review_count(review_count)
     
     def normalize_category(self, category: str) -> str:
-        """Normalize category name"""
-        if not category:
-            return ''
-        
-        # Clean and standardize category names
-        category = self.clean_text(category)
-        
-        # Map common variations to standard categories
-        category_mapping = {
-            'electronics': ['electronic', 'electronics & photo', 'computers & electronics'],
-            'clothing': ['clothes', 'apparel', 'fashion', 'clothing, shoes & jewelry'],
-            'home': ['home & kitchen', 'home improvement', 'home & garden'],
-            'books': ['book', 'books & media', 'books & magazines'],
-            'sports': ['sport', 'sports & outdoors', 'sports & recreation'],
-            'beauty': ['beauty & personal care', 'health & beauty', 'cosmetics'],
-            'toys': ['toy', 'toys & games', 'children\'s toys'],
-            'automotive': ['auto', 'automotive & motorcycle', 'car & motorbike']
-        }
-        
-        category_lower = category.lower()
-        for standard, variations in category_mapping.items():
-            if any(var in category_lower for var in variations):
-                return standard
-        
-        return category
+        """Normalize category name using data_processing.normalization.CATEGORY_MAPPING"""
+        return self.normalizer.normalize_category(category)
     
     def normalize_images(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Normalize image data"""
@@ -375,36 +314,20 @@ class DataProcessor:
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
-        if not text:
-            return ''
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        # Remove common unwanted characters
-        text = re.sub(r'[\r\n\t]+', ' ', text)
-        
-        return text.strip()
+        return self.normalizer.clean_text(text)
+    
+    def clean_label(self, text: str) -> str:
+        """clean_text for short, often repeated values such as brands, memoised"""
+        return self.normalizer.clean_label(text)
     
     def save_to_database(self, product_data: Dict[str, Any]) -> Optional[str]:
         """Save processed product to database"""
         try:
-            # Insert main product data
-            product_id = self.db_manager.insert_product(product_data)
+            # Insert or update the product; specifications, images and variations
+            # are rewritten only when their content changed
+            product_id = self.db_manager.upsert_product(product_data)
             
             if product_id:
-                # Insert specifications
-                if product_data.get('specifications'):
-                    self.db_manager.insert_product_specifications(product_id, product_data['specifications'])
-                
-                # Insert images
-                if product_data.get('images'):
-                    self.db_manager.insert_product_images(product_id, product_data['images'])
-                
-                # Insert variations
-                if product_data.get('variations'):
-                    self.db_manager.insert_product_variations(product_id, product_data['variations'])
-                
                 logger.info(f"Product saved to database: {product_id}")
                 return product_id
             
@@ -430,7 +353,25 @@ class DataProcessor:
         return None
 
 
-# Global processor instance
-data_processor = DataProcessor()
+# Global processor instance, created on first use
+_data_processor: Optional[DataProcessor] = None
+_data_processor_lock = threading.Lock()
+
+
+def get_data_processor() -> DataProcessor:
+    """Get the shared data processor instance"""
+    global _data_processor
+    if _data_processor is None:
+        with _data_processor_lock:
+            if _data_processor is None:
+                _data_processor = DataProcessor()
+    return _data_processor
+
+
+def __getattr__(name: str):
+    # Keeps `from data_processing.processor import data_processor` working
+    if name == 'data_processor':
+        return get_data_processor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
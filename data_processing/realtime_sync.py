@@ -10,6 +10,8 @@ import threading
 from dataclasses import dataclass
 import json
 
+from database.query_stats import query_source
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -127,16 +129,17 @@ class RealTimeSyncManager:
             
             logger.info(f"Executing sync task: {task.task_id}")
             
-            if task.task_type == 'product':
-                result = self._sync_product(task.target_id)
-            elif task.task_type == 'category':
-                result = self._sync_category(task.target_id)
-            elif task.task_type == 'platform':
-                result = self._sync_platform(task.target_id)
-            else:
-                logger.error(f"Unknown task type: {task.task_type}")
-                task.status = 'failed'
-                return
+            with query_source(f"sync:{task.task_id}"):
+                if task.task_type == 'product':
+                    result = self._sync_product(task.target_id)
+                elif task.task_type == 'category':
+                    result = self._sync_category(task.target_id)
+                elif task.task_type == 'platform':
+                    result = self._sync_platform(task.target_id)
+                else:
+                    logger.error(f"Unknown task type: {task.task_type}")
+                    task.status = 'failed'
+                    return
             
             if result['success']:
                 task.status = 'completed'
@@ -208,26 +211,32 @@ class RealTimeSyncManager:
     def _sync_category(self, category: str) -> Dict[str, Any]:
         """Sync all products in a category"""
         try:
-            products = self.db_manager.get_products_by_category(category)
-            if not products:
-                return {'success': False, 'error': 'No products found in category'}
-            
             results = {
                 'success': True,
-                'products_checked': len(products),
+                'products_checked': 0,
                 'products_updated': 0,
                 'errors': 0
             }
             
-            for product in products:
+            # Read just the ids, and finish reading before scraping so the read
+            # transaction does not stay open (and pin a connection) while each product is fetched
+            product_ids = [
+                product_id for (product_id,) in
+                self.db_manager.iter_products(category=category, columns=('id',), row_format='tuple')
+            ]
+            for product_id in product_ids:
+                results['products_checked'] += 1
                 try:
-                    result = self._sync_product(product['product_id'])
+                    result = self._sync_product(product_id)
                     if result['success'] and result.get('updated'):
                         results['products_updated'] += 1
                 except Exception as e:
-                    logger.error(f"Error syncing product {product['product_id']}: {e}")
+                    logger.error(f"Error syncing product {product_id}: {e}")
                     results['errors'] += 1
             
+            if not results['products_checked']:
+                return {'success': False, 'error': 'No products found in category'}
+            
             return results
             
         except Exception as e:
@@ -237,26 +246,32 @@ class RealTimeSyncManager:
     def _sync_platform(self, platform: str) -> Dict[str, Any]:
         """Sync all products from a platform"""
         try:
-            products = self.db_manager.get_products_by_platform(platform)
-            if not products:
-                return {'success': False, 'error': 'No products found for platform'}
-            
             results = {
                 'success': True,
-                'products_checked': len(products),
+                'products_checked': 0,
                 'products_updated': 0,
                 'errors': 0
             }
             
-            for product in products:
+            # Read just the ids, and finish reading before scraping so the read
+            # transaction does not stay open (and pin a connection) while each product is fetched
+            product_ids = [
+                product_id for (product_id,) in
+                self.db_manager.iter_products(platform=platform, columns=('id',), row_format='tuple')
+            ]
+            for product_id in product_ids:
+                results['products_checked'] += 1
                 try:
-                    result = self._sync_product(product['product_id'])
+                    result = self._sync_product(product_id)
                     if result['success'] and result.get('updated'):
                         results['products_updated'] += 1
                 except Exception as e:
-                    logger.error(f"Error syncing product {product['product_id']}: {e}")
+                    logger.error(f"Error syncing product {product_id}: {e}")
                     results['errors'] += 1
             
+            if not results['products_checked']:
+                return {'success': False, 'error': 'No products found for platform'}
+            
             return results
             
         except Exception as e:
@@ -273,7 +288,7 @@ class RealTimeSyncManager:
             
             # Simulate fresh scraping
             fresh_data = {
-                'current_price': product['current_price'] + (0.01 if platform == 'amazon' else -0.01),
+                'current_price': float(product['current_price']) + (0.01 if platform == 'amazon' else -0.01),
                 'availability_status': product['availability_status'],
                 'last_updated': datetime.now().isoformat()
             }
@@ -293,6 +308,8 @@ class RealTimeSyncManager:
         fresh_price = fresh.get('current_price')
         
         if current_price and fresh_price:
+            # Database rows carry Decimal prices
+            current_price, fresh_price = float(current_price), float(fresh_price)
             price_change = abs(fresh_price - current_price) / current_price
             if price_change >= self.price_change_threshold:
                 changes['price_changed'] = {
@@ -0,0 +1,377 @@
+"""
+Reprocess scraped JSON dumps through DataProcessor in a process pool
+
+Items are streamed from one or more dumps, sharded into chunks across
+worker processes, validated, normalised and curated with
+DataProcessor.process_products and written with
+DatabaseManager.upsert_products:
+
+    python -m data_processing.reprocess test_amazon_output.json data.json
+    python -m data_processing.reprocess scraped_data_*.jsonl.gz --workers 8 --dry-run
+
+Accepts JSON arrays (Scrapy feed exports, the legacy dumps) and JSON Lines
+(the JSON writer pipeline's output), optionally gzip or zstd compressed.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+# Platforms the products table accepts
+PLATFORMS = ('amazon', 'walmart', 'target', 'bestbuy')
+BASE_URLS = {
+    'amazon': 'https://www.amazon.com',
+    'walmart': 'https://www.walmart.com',
+    'target': 'https://www.target.com',
+    'bestbuy': 'https://www.bestbuy.com',
+}
+
+_HOST_RE = re.compile(r'^[a-z][a-z0-9+.-]*://([^/?#]*)', re.IGNORECASE)
+_EXTERNAL_ID_RE = re.compile(r'/dp/([A-Z0-9]{10})|/ip/(?:[^/]+/)?(\d+)|/A-(\d+)|skuId=(\d+)')
+_WHITESPACE_AND_COMMAS = ' \t\r\n,'
+_READ_SIZE = 1 << 20
+
+RawItem = Union[str, Dict[str, Any]]
+
+
+def open_dump(path: str) -> io.TextIOBase:
+    """Text stream over a dump, decompressing .gz and .zst files"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Reading .zst dumps requires the 'zstandard' package") from e
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True),
+                                encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _skip_separators(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in _WHITESPACE_AND_COMMAS:
+        pos += 1
+    return pos
+
+
+def _iter_json_array(stream: io.TextIOBase, buffer: str) -> Iterator[Dict[str, Any]]:
+    """Elements of a JSON array, decoded one at a time from the stream"""
+    decoder = json.JSONDecoder()
+    pos = buffer.index('[') + 1
+    eof = False
+    while True:
+        pos = _skip_separators(buffer, pos)
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            end = None
+        # An element ending at the end of the buffer may have been cut short
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError(f"Truncated JSON array at offset {pos} of the last chunk")
+            chunk = stream.read(_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_dump(path: str) -> Iterator[RawItem]:
+    """
+    Items of a dump, in file order.
+
+    JSON Lines are yielded as undecoded lines so the workers do the
+    decoding; elements of a JSON array are yielded as dicts.
+    """
+    with open_dump(path) as stream:
+        head = stream.read(_READ_SIZE)
+        if head.lstrip().startswith('['):
+            yield from _iter_json_array(stream, head)
+            return
+        # Finish the line the head was cut in, then read line by line
+        head += stream.readline()
+        for line in itertools.chain(head.splitlines(keepends=True), stream):
+            if line.strip():
+                yield line
+
+
+def iter_chunks(paths: List[str], chunk_size: int) -> Iterator[Tuple[str, List[RawItem]]]:
+    """(path, items) chunks of at most chunk_size items from each dump"""
+    for path in paths:
+        chunk = []
+        for item in iter_dump(path):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield path, chunk
+                chunk = []
+        if chunk:
+            yield path, chunk
+
+
+def platform_hint(path: str) -> Optional[str]:
+    """Platform named in a dump's file name, such as walmart_products.json"""
+    name = os.path.basename(path).lower()
+    return next((platform for platform in PLATFORMS if platform in name), None)
+
+
+def _first(value: Any) -> Any:
+    # Scrapy exports wrap every field in a list
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _joined(value: Any, separator: str) -> Optional[str]:
+    # A list field such as storage_cap may itself come wrapped in a list
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], list):
+        value = value[0]
+    if isinstance(value, list):
+        return separator.join(str(part) for part in value if part) or None
+    return value
+
+
+def to_product_item(record: Dict[str, Any], default_platform: Optional[str] = None) -> Dict[str, Any]:
+    """
+    DataProcessor input for a dump record.
+
+    ProductItem-shaped records pass through. Legacy mobileDetails-shaped
+    records (url, price, star_rating, no_rating, ...) are mapped onto the
+    ProductItem fields, taking the platform from the product URL and the
+    external id from the platform's item id in it.
+    """
+    if 'product_url' in record or 'current_price' in record:
+        item = dict(record)
+        item['platform'] = (item.get('platform') or default_platform or '').lower()
+        return item
+
+    platform = (_first(record.get('platform')) or '').lower()
+    url = _first(record.get('url')) or ''
+    host_match = _HOST_RE.match(url)
+    host = host_match.group(1).lower() if host_match else ''
+    if not platform:
+        platform = next((name for name in PLATFORMS if name in host), None) or default_platform or host
+    if url.startswith('/') and platform in BASE_URLS:
+        url = urljoin(BASE_URLS[platform], url)
+
+    id_match = _EXTERNAL_ID_RE.search(url)
+    if id_match:
+        external_id = next(group for group in id_match.groups() if group)
+    else:
+        external_id = hashlib.md5(url.encode('utf-8')).hexdigest() if url else ''
+
+    image_url = _first(record.get('img_url'))
+    specifications = {
+        'Colour': _first(record.get('colour')),
+        'Storage': _joined(record.get('storage_cap'), ', '),
+    }
+    return {
+        'external_id': external_id,
+        'platform': platform,
+        'title': _first(record.get('title')),
+        'description': _joined(record.get('about_item'), ' '),
+        'brand': _first(record.get('brand')) or '',
+        'model': _joined(record.get('model_name'), ' ') or '',
+        'current_price': _first(record.get('price')),
+        'rating': _first(record.get('star_rating')),
+        'review_count': _first(record.get('no_rating')),
+        'product_url': url,
+        'images': [{'url': image_url, 'type': 'primary'}] if image_url else [],
+        'specifications': {key: value for key, value in specifications.items() if value},
+    }
+
+
+# Per-worker state, set up by _init_worker in each pool process
+_processor = None
+_save = False
+
+
+def _init_worker(save: bool, log_level: int):
+    global _processor, _save
+    logging.basicConfig(level=log_level, format='%(processName)s %(levelname)s %(name)s: %(message)s')
+    from data_processing.processor import DataProcessor
+    _processor = DataProcessor()
+    _save = save
+
+
+def _process_chunk(path: str, raw_items: List[RawItem]) -> Dict[str, Any]:
+    """Process and write one chunk, returning its counters"""
+    started = time.perf_counter()
+    stats = {
+        'pid': os.getpid(),
+        'chunks': 1,
+        'items': len(raw_items),
+        'kept': 0,
+        'dropped': Counter(),
+        'actions': Counter(),
+        'write_errors': 0,
+        'process_seconds': 0.0,
+        'write_seconds': 0.0,
+    }
+
+    default_platform = platform_hint(path)
+    items = []
+    for raw in raw_items:
+        try:
+            record = json.loads(raw) if isinstance(raw, str) else raw
+        except ValueError:
+            stats['dropped']['invalid_json'] += 1
+            continue
+        if not isinstance(record, dict):
+            stats['dropped']['invalid_json'] += 1
+            continue
+        item = to_product_item(record, default_platform)
+        if item['platform'] not in PLATFORMS:
+            stats['dropped']['unsupported_platform'] += 1
+            continue
+        items.append(item)
+
+    result = _processor.process_products(items)
+    stats['dropped'].update(result.drop_reasons.dropna().value_counts().to_dict())
+    records = result.records()
+    for record in records:
+        # The products table has no 'unknown' availability; store it as NULL
+        if record['availability_status'] == 'unknown':
+            record['availability_status'] = None
+    stats['kept'] = len(records)
+    stats['process_seconds'] = time.perf_counter() - started
+
+    if _save and records:
+        write_started = time.perf_counter()
+        try:
+            outcome = _processor.db_manager.upsert_products(records)
+            stats['actions'].update(entry['action'] for entry in outcome.values())
+        except Exception as e:
+            logger.error(f"Error writing {len(records)} products from {path}: {e}")
+            stats['write_errors'] += len(records)
+        stats['write_seconds'] = time.perf_counter() - write_started
+    return stats
+
+
+class ReprocessStats:
+    """Totals and per-worker counters of a reprocessing run"""
+
+    COUNTERS = ('chunks', 'items', 'kept', 'write_errors', 'process_seconds', 'write_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals: Dict[str, Any] = {name: 0 for name in self.COUNTERS}
+        self.dropped: Counter = Counter()
+        self.actions: Counter = Counter()
+        self.workers: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, chunk: Dict[str, Any]):
+        worker = self.workers.setdefault(chunk['pid'], {name: 0 for name in self.COUNTERS})
+        for name in self.COUNTERS:
+            self.totals[name] += chunk[name]
+            worker[name] += chunk[name]
+        self.dropped.update(chunk['dropped'])
+        self.actions.update(chunk['actions'])
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def items_per_second(self) -> float:
+        return self.totals['items'] / self.elapsed if self.elapsed else 0.0
+
+    def worker_rows(self) -> List[Dict[str, Any]]:
+        """Per-worker counters with each worker's items/sec over its busy time"""
+        rows = []
+        for pid, worker in sorted(self.workers.items()):
+            busy = worker['process_seconds'] + worker['write_seconds']
+            rows.append({'pid': pid, **worker, 'items_per_second': worker['items'] / busy if busy else 0.0})
+        return rows
+
+
+def reprocess(paths: List[str], workers: Optional[int] = None, chunk_size: int = 1000, save: bool = True,
+              progress_interval: float = 5.0) -> ReprocessStats:
+    """Stream paths through a pool of worker processes, printing progress every progress_interval seconds"""
+    workers = workers or os.cpu_count() or 1
+    stats = ReprocessStats()
+    last_report = time.monotonic()
+
+    # spawn rather than fork, so workers do not inherit the parent's pool or threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker,
+                             initargs=(save, logging.getLogger().getEffectiveLevel())) as executor:
+        pending = set()
+        chunks = iter_chunks(paths, chunk_size)
+        while True:
+            # Keep two chunks queued per worker so reading stays ahead without buffering whole dumps
+            for path, chunk in chunks:
+                pending.add(executor.submit(_process_chunk, path, chunk))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stats.add(future.result())
+
+            if time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                print(f"⏳ {stats.totals['items']:,} items, {stats.totals['kept']:,} kept, "
+                      f"{stats.items_per_second():,.0f} items/sec")
+    return stats
+
+
+def print_report(stats: ReprocessStats):
+    totals = stats.totals
+    print(f"\n✅ Reprocessed {totals['items']:,} items in {stats.elapsed:.1f}s "
+          f"({stats.items_per_second():,.0f} items/sec)")
+    print(f"   kept: {totals['kept']:,}")
+    for reason, count in stats.dropped.most_common():
+        print(f"   dropped ({reason}): {count:,}")
+    for action, count in stats.actions.most_common():
+        print(f"   {action}: {count:,}")
+    if totals['write_errors']:
+        print(f"❌ {totals['write_errors']:,} products failed to write")
+
+    print(f"\n{'pid':>8} {'chunks':>7} {'items':>9} {'kept':>8} {'process s':>10} {'write s':>9} {'items/sec':>10}")
+    for row in stats.worker_rows():
+        print(f"{row['pid']:>8} {row['chunks']:>7,} {row['items']:>9,} {row['kept']:>8,} "
+              f"{row['process_seconds']:>10.2f} {row['write_seconds']:>9.2f} {row['items_per_second']:>10,.0f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Reprocess scraped JSON dumps through the data processor')
+    parser.add_argument('dumps', nargs='+', help='JSON or JSON Lines dumps, optionally .gz or .zst')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Items per chunk sent to a worker')
+    parser.add_argument('--dry-run', action='store_true', help='Process without writing to the database')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='Seconds between progress lines')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    missing = [path for path in args.dumps if not os.path.exists(path)]
+    if missing:
+        print(f"❌ Dumps not found: {', '.join(missing)}")
+        return 1
+
+    stats = reprocess(args.dumps, workers=args.workers, chunk_size=args.chunk_size, save=not args.dry_run,
+                      progress_interval=args.progress_interval)
+    print_report(stats)
+    return 1 if stats.totals['write_errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Text similarity kernels for product deduplication
+
+A kernel prepares a batch of normalised texts once (token sets, TF-IDF
+vectors) and then scores one text against a block of others at a time, so
+ProductDeduplicator pays the per-text work once per product rather than
+once per candidate pair. Scores are in [0, 1]; texts that normalise to the
+same string score 1 and missing texts (None) score 0 under every kernel.
+"""
+import logging
+import math
+from abc import ABC, abstractmethod
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Type
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def set_jaccard(words1: Set, words2: Set) -> float:
+    if not words1 or not words2:
+        return 0.0
+    return len(words1 & words2) / len(words1 | words2)
+
+
+def token_jaccard(text1: str, text2: str) -> float:
+    """Jaccard similarity of the whitespace tokens of two normalised texts"""
+    return set_jaccard(set(text1.split()), set(text2.split()))
+
+
+def _token_weight(token: str) -> int:
+    # A token and the space that separates it from the next one
+    return len(token) + 1
+
+
+def token_set_ratio(tokens1: Set[str], tokens2: Set[str]) -> float:
+    """
+    Token-set ratio from the lengths of the shared and differing tokens.
+
+    Like fuzzy matching's token_set_ratio, a text whose tokens are all found
+    in the other scores 1. With the sorted shared tokens being a common
+    prefix of both sorted token strings, their SequenceMatcher ratio is
+    2 * shared / (shared + length), so no string matching is needed.
+    """
+    shared = sum(_token_weight(token) for token in tokens1 & tokens2)
+    if not shared:
+        return 0.0
+    shorter = min(sum(map(_token_weight, tokens1)), sum(map(_token_weight, tokens2)))
+    return 2 * shared / (shared + shorter)
+
+
+def tokenize(texts: Sequence[Optional[str]]) -> Tuple[List[Tuple[int, ...]], List[str]]:
+    """Token ids of the whitespace tokens of texts, and the tokens by id"""
+    vocabulary: Dict[str, int] = {}
+    tokens = [
+        tuple(vocabulary.setdefault(token, len(vocabulary)) for token in text.split()) if text else ()
+        for text in texts
+    ]
+    return tokens, list(vocabulary)
+
+
+class Corpus:
+    """
+    Document frequencies of tokens over a catalog of texts, which the TF-IDF
+    kernel weights tokens with; ``documents`` is the number of texts.
+    """
+
+    __slots__ = ('documents', 'frequency')
+
+    def __init__(self, documents: int, frequency: Dict[str, int]):
+        self.documents = documents
+        self.frequency = frequency
+
+    def idf(self, tokens: Sequence[str]) -> np.ndarray:
+        """Smoothed inverse document frequency of each of tokens"""
+        frequency = np.array([self.frequency.get(token, 0) for token in tokens], dtype=np.float64)
+        return np.log((1 + self.documents) / (1 + frequency)) + 1
+
+
+class PreparedTexts(ABC):
+    """
+    Normalised texts prepared by a kernel for scoring one against a block of
+    others. tokens are their token ids and vocabulary the tokens by id, as
+    kept in ProductFeatures; without them the texts are tokenised here.
+    """
+
+    def __init__(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                 vocabulary: Optional[Sequence[str]] = None):
+        if tokens is None:
+            tokens, vocabulary = tokenize(texts)
+        self.normalized = texts
+        self.tokens = tokens
+        self.vocabulary = vocabulary
+        self.present = np.array([text is not None for text in texts], dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.normalized)
+
+    def scores(self, index: int, others: Sequence[int]) -> np.ndarray:
+        """Similarity of text ``index`` with each of the texts ``others``"""
+        others = np.asarray(others, dtype=np.intp)
+        if not len(others) or not self.present[index]:
+            return np.zeros(len(others))
+        text = self.normalized[index]
+        same = np.fromiter((self.normalized[other] == text for other in others), dtype=bool, count=len(others))
+        present = self.present[others]
+        scores = np.where(present, 1.0, 0.0)
+        # Missing texts score 0 and never reach the kernels
+        compare = ~same & present
+        if compare.any():
+            scores[compare] = self._scores(index, others[compare])
+        return scores
+
+    @abstractmethod
+    def _scores(self, index: int, others: np.ndarray) -> np.ndarray:
+        """Similarity of text ``index`` with each of the present, different texts ``others``"""
+
+
+class SimilarityKernel(ABC):
+    """
+    Base class of the kernels. ``normalize`` is the deduplicator's text
+    normaliser, used by ``similarity`` for raw texts; ``compare`` takes
+    texts normalised already.
+    """
+
+    name = ''
+    prepared_class: Type[PreparedTexts]
+    # Whether scores depend on a Corpus of the catalog's texts
+    uses_corpus = False
+
+    def __init__(self, normalize: Callable[[str], str]):
+        self.normalize = normalize
+
+    def with_corpus(self, corpus: Optional[Corpus]) -> 'SimilarityKernel':
+        """This kernel scoring against corpus, for kernels that use one"""
+        return self
+
+    def prepare(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                vocabulary: Optional[Sequence[str]] = None) -> PreparedTexts:
+        return self.prepared_class(texts, tokens, vocabulary)
+
+    def similarity(self, text1: str, text2: str) -> float:
+        if not text1 or not text2:
+            return 0.0
+        return self.compare(self.normalize(text1), self.normalize(text2))
+
+    def compare(self, text1: Optional[str], text2: Optional[str]) -> float:
+        """Similarity of two normalised texts, None standing for a missing one"""
+        if text1 is None or text2 is None:
+            return 0.0
+        if text1 == text2:
+            return 1.0
+        return self._similarity(text1, text2)
+
+    @abstractmethod
+    def _similarity(self, text1: str, text2: str) -> float:
+        """Similarity of two different, non-empty normalised texts"""
+
+
+class SequencePrepared(PreparedTexts):
+
+    def __init__(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                 vocabulary: Optional[Sequence[str]] = None):
+        super().__init__(texts, tokens, vocabulary)
+        self.token_sets = [set(ids) for ids in self.tokens]
+
+    def _scores(self, index: int, others: np.ndarray) -> np.ndarray:
+        text = self.normalized[index]
+        words = self.token_sets[index]
+        scores = []
+        for other in others.tolist():
+            similarity = SequenceMatcher(None, text, self.normalized[other]).ratio()
+            if similarity < 0.8:
+                similarity = max(similarity, set_jaccard(words, self.token_sets[other]))
+            scores.append(similarity)
+        return np.array(scores)
+
+
+class SequenceKernel(SimilarityKernel):
+    """
+    difflib.SequenceMatcher ratio, with token Jaccard similarity for texts
+    below 0.8 (e.g. "iPhone 13" vs "Apple iPhone 13"). Quadratic in the
+    text length; the reference the other kernels are measured against.
+    """
+
+    name = 'sequence'
+    prepared_class = SequencePrepared
+
+    @staticmethod
+    def ratio(text1: str, text2: str) -> float:
+        similarity = SequenceMatcher(None, text1, text2).ratio()
+        if similarity < 0.8:
+            similarity = max(similarity, token_jaccard(text1, text2))
+        return similarity
+
+    def _similarity(self, text1: str, text2: str) -> float:
+        return self.ratio(text1, text2)
+
+
+class _SparsePrepared(PreparedTexts):
+    """
+    Prepared texts with a sparse text-by-token matrix.
+
+    Blocks are scored on the CSR arrays directly: a block holds a handful of
+    candidates, for which indexing scipy matrices costs far more than the
+    arithmetic.
+    """
+
+    def __init__(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                 vocabulary: Optional[Sequence[str]] = None):
+        super().__init__(texts, tokens, vocabulary)
+        # scipy is only needed by the vectorised kernels
+        from scipy.sparse import csr_matrix
+
+        indptr = [0]
+        indices: List[int] = []
+        counts: List[float] = []
+        for ids in self.tokens:
+            for token_id, count in self._token_counts(ids).items():
+                indices.append(token_id)
+                counts.append(count)
+            indptr.append(len(indices))
+        self.matrix = csr_matrix(
+            (np.array(counts, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(self.normalized), max(len(self.vocabulary), 1))
+        )
+        self.matrix.sort_indices()
+
+    @staticmethod
+    def _row_dots(rows, row, others: np.ndarray) -> np.ndarray:
+        """Dot products of the CSR row vector row with rows[others]"""
+        columns, values = row.indices, row.data
+        starts = rows.indptr[others]
+        lengths = rows.indptr[others + 1] - starts
+        total = int(lengths.sum())
+        if not total or not len(columns):
+            return np.zeros(len(others))
+        # Positions of the others' entries in the CSR arrays, row after row
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = offsets + np.arange(total)
+        found = np.searchsorted(columns, rows.indices[positions]).clip(max=len(columns) - 1)
+        products = np.where(columns[found] == rows.indices[positions], rows.data[positions] * values[found], 0.0)
+        return np.bincount(np.repeat(np.arange(len(others)), lengths), weights=products, minlength=len(others))
+
+    @staticmethod
+    def _token_counts(ids: Tuple[int, ...]) -> Dict[int, float]:
+        return dict.fromkeys(ids, 1.0)
+
+
+class TokenSetPrepared(_SparsePrepared):
+
+    def __init__(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                 vocabulary: Optional[Sequence[str]] = None):
+        super().__init__(texts, tokens, vocabulary)
+        weights = np.zeros(self.matrix.shape[1])
+        weights[:len(self.vocabulary)] = [_token_weight(token) for token in self.vocabulary]
+        self.weighted = self.matrix.multiply(weights).tocsr()
+        self.weighted.sort_indices()
+        self.lengths = np.asarray(self.weighted.sum(axis=1)).ravel()
+
+    def _scores(self, index: int, others: np.ndarray) -> np.ndarray:
+        shared = self._row_dots(self.matrix, self.weighted[index], others)
+        shorter = np.minimum(self.lengths[others], self.lengths[index])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = 2 * shared / (shared + shorter)
+        return np.nan_to_num(scores)
+
+
+class TokenSetKernel(SimilarityKernel):
+    """token_set_ratio over whitespace tokens, computed with sparse matrix products"""
+
+    name = 'token_set'
+    prepared_class = TokenSetPrepared
+
+    def _similarity(self, text1: str, text2: str) -> float:
+        return token_set_ratio(set(text1.split()), set(text2.split()))
+
+
+class TfidfPrepared(_SparsePrepared):
+
+    def __init__(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                 vocabulary: Optional[Sequence[str]] = None, corpus: Optional[Corpus] = None):
+        super().__init__(texts, tokens, vocabulary)
+        if corpus is None:
+            # The prepared texts are their own corpus
+            documents = len(self.normalized)
+            frequency = np.bincount(self.matrix.indices, minlength=self.matrix.shape[1])
+            idf = np.log((1 + documents) / (1 + frequency)) + 1
+        else:
+            idf = np.ones(self.matrix.shape[1])
+            idf[:len(self.vocabulary)] = corpus.idf(self.vocabulary)
+        vectors = self.matrix.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        self.vectors = vectors.multiply(1 / norms[:, None]).tocsr()
+        self.vectors.sort_indices()
+
+    @staticmethod
+    def _token_counts(ids: Tuple[int, ...]) -> Dict[int, float]:
+        return Counter(ids)
+
+    def _scores(self, index: int, others: np.ndarray) -> np.ndarray:
+        return self._row_dots(self.vectors, self.vectors[index], others)
+
+
+class TfidfKernel(SimilarityKernel):
+    """
+    Cosine similarity of TF-IDF token vectors, the IDF coming from the
+    kernel's Corpus (with_corpus). Without one, prepared texts are their own
+    corpus and pairs compared on their own, such as specification values,
+    use term-frequency cosine.
+    """
+
+    name = 'tfidf'
+    prepared_class = TfidfPrepared
+    uses_corpus = True
+
+    def __init__(self, normalize: Callable[[str], str], corpus: Optional[Corpus] = None):
+        super().__init__(normalize)
+        self.corpus = corpus
+
+    def with_corpus(self, corpus: Optional[Corpus]) -> 'TfidfKernel':
+        return TfidfKernel(self.normalize, corpus)
+
+    def prepare(self, texts: Sequence[Optional[str]], tokens: Optional[Sequence[Tuple[int, ...]]] = None,
+                vocabulary: Optional[Sequence[str]] = None) -> TfidfPrepared:
+        return TfidfPrepared(texts, tokens, vocabulary, self.corpus)
+
+    def _similarity(self, text1: str, text2: str) -> float:
+        counts1 = Counter(text1.split())
+        counts2 = Counter(text2.split())
+        if counts1.keys().isdisjoint(counts2):
+            return 0.0
+        tokens = list(counts1.keys() | counts2.keys())
+        idf = dict(zip(tokens, self.corpus.idf(tokens).tolist())) if self.corpus else dict.fromkeys(tokens, 1.0)
+        vector1 = {token: count * idf[token] for token, count in counts1.items()}
+        vector2 = {token: count * idf[token] for token, count in counts2.items()}
+        dot = sum(weight * vector2.get(token, 0.0) for token, weight in vector1.items())
+        norm1 = math.sqrt(sum(weight * weight for weight in vector1.values()))
+        norm2 = math.sqrt(sum(weight * weight for weight in vector2.values()))
+        return dot / (norm1 * norm2)
+
+
+KERNELS: Dict[str, Type[SimilarityKernel]] = {
+    kernel.name: kernel for kernel in (SequenceKernel, TokenSetKernel, TfidfKernel)
+}
+
+
+def get_kernel(name: str, normalize: Callable[[str], str]) -> SimilarityKernel:
+    """Kernel registered under name"""
+    try:
+        return KERNELS[name](normalize)
+    except KeyError:
+        raise ValueError(f"Unknown similarity kernel {name!r}; choose from {', '.join(KERNELS)}") from None
@@ -0,0 +1,526 @@
+"""
+Persistent similarity index for incremental product deduplication
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from data_processing.candidates import LSHBands, MinHasher, price_bucket
+from data_processing.deduplication import DEDUPLICATION_COLUMNS, ProductDeduplicator
+from data_processing.features import specification_rows
+from data_processing.similarity import Corpus
+
+logger = logging.getLogger(__name__)
+
+# SQLite's default limit on host parameters per statement is 999
+_MAX_PARAMS = 500
+
+
+class SimilarityIndex:
+    """
+    On-disk index that matches products against the catalog as they arrive.
+
+    Every indexed product is stored with the fields ProductDeduplicator
+    scores, its MinHash-LSH band keys over the title and its brand and price
+    bucket blocking key. ``insert`` looks up only the buckets the product
+    falls in, scores those products and puts the product in the duplicate
+    group (canonical id) of the best match, or in a group of its own, so
+    matching cost depends on bucket sizes rather than on the catalog size.
+    Fingerprints (ProductDeduplicator.generate_fingerprint) map to the
+    canonical id of the group that first had them, which resolves repeats of
+    a known product with a single comparison.
+
+    Of the products sharing LSH bands with a query, at most
+    ``max_candidates`` per band are read and only the ``max_candidates``
+    sharing the most bands (an estimate of title similarity) are scored, so
+    catalogs with thousands of near-identical titles do not make each
+    lookup linear again.
+
+    Kernels that weight tokens by the catalog (tfidf) score against the
+    document frequencies of the indexed titles and brands, which the index
+    keeps up to date, so a pair scores the same whichever other products are
+    candidates.
+
+    The index is safe to share between threads; other processes may open
+    the same file, each write being one SQLite transaction.
+    """
+
+    def __init__(self, path: str, deduplicator: Optional[ProductDeduplicator] = None, num_perm: int = 128,
+                 bands: int = 32, shingle_size: int = 3, price_bucket_ratio: float = 1.5,
+                 max_block_size: int = 50, max_candidates: int = 100):
+        self.path = path
+        self.deduplicator = deduplicator or ProductDeduplicator()
+        self.minhasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self.lsh = LSHBands(num_perm=num_perm, bands=bands)
+        self.price_bucket_ratio = price_bucket_ratio
+        self.max_block_size = max_block_size
+        self.max_candidates = max_candidates
+        self._lock = threading.RLock()
+
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                product_id TEXT PRIMARY KEY,
+                canonical_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                platform TEXT,
+                external_id TEXT,
+                title TEXT,
+                brand TEXT,
+                category TEXT,
+                current_price REAL,
+                specifications TEXT,
+                signature BLOB,
+                block_key TEXT,
+                indexed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_products_canonical ON products (canonical_id);
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band_key BLOB NOT NULL,
+                product_id TEXT NOT NULL,
+                PRIMARY KEY (band_key, product_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS blocks (
+                block_key TEXT NOT NULL,
+                product_id TEXT NOT NULL,
+                PRIMARY KEY (block_key, product_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                fingerprint TEXT PRIMARY KEY,
+                canonical_id TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_canonical ON fingerprints (canonical_id);
+            -- Products whose normalised title or brand has each token; token '' counts all products
+            CREATE TABLE IF NOT EXISTS corpus (
+                field TEXT NOT NULL,
+                token TEXT NOT NULL,
+                documents INTEGER NOT NULL,
+                PRIMARY KEY (field, token)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._check_parameters({'num_perm': num_perm, 'bands': bands, 'shingle_size': shingle_size,
+                                'price_bucket_ratio': price_bucket_ratio})
+        if self._get_meta('corpus') is None:
+            self._build_corpus()
+
+    def _check_parameters(self, parameters: Dict[str, Any]):
+        """Band keys of an existing index are only comparable under the parameters it was built with"""
+        stored = self._get_meta('parameters')
+        if stored is None:
+            self._set_meta('parameters', json.dumps(parameters, sort_keys=True))
+        elif json.loads(stored) != parameters:
+            raise ValueError(f"Similarity index {self.path} was built with {stored}; "
+                             f"delete it to rebuild with {parameters}")
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _build_corpus(self):
+        """Count the corpus of an index built before it kept one"""
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                documents = Counter()
+                for title, brand in cursor.execute("SELECT title, brand FROM products").fetchall():
+                    documents.update(self._corpus_tokens(title, brand))
+                cursor.executemany("INSERT OR REPLACE INTO corpus (field, token, documents) VALUES (?, ?, ?)",
+                                   [(field, token, count) for (field, token), count in documents.items()])
+                self._set_meta('corpus', '1')
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _corpus_tokens(self, title: Optional[str], brand: Optional[str]) -> List[Tuple[str, str]]:
+        """(field, token) corpus entries of a product's raw title and brand"""
+        normalize = self.deduplicator._normalize_text
+        entries = []
+        for field, text in (('title', title), ('brand', brand)):
+            entries.append((field, ''))
+            entries.extend((field, token) for token in set(normalize(text or '').split()))
+        return entries
+
+    def _corpus(self, field: str, texts: Iterable[Optional[str]]) -> Corpus:
+        """Document frequencies of the tokens of normalised texts over the indexed products"""
+        tokens = [''] + sorted({token for text in texts if text for token in text.split()})
+        frequency = {}
+        with self._lock:
+            for start in range(0, len(tokens), _MAX_PARAMS):
+                chunk = tokens[start:start + _MAX_PARAMS]
+                frequency.update(self.connection.execute(
+                    f"SELECT token, documents FROM corpus WHERE field = ? AND token IN ({', '.join('?' * len(chunk))})",
+                    [field] + chunk
+                ))
+        return Corpus(frequency.pop('', 0), frequency)
+
+    # Features
+
+    @staticmethod
+    def _features(product: Dict[str, Any], product_id: str) -> Dict[str, Any]:
+        """
+        The fields the deduplicator compares, with specifications in database
+        row form and sorted, so a scraped item and its database row compare equal
+        """
+        specifications = [
+            {'spec_name': name, 'spec_value': value}
+            for name, value in sorted((spec.get('spec_name') or '', spec.get('spec_value') or '')
+                                      for spec in specification_rows(product.get('specifications')))
+        ]
+        price = product.get('current_price')
+        return {
+            'id': product_id,
+            'platform': product.get('platform') or '',
+            'external_id': product.get('external_id') or '',
+            'title': product.get('title') or '',
+            'brand': product.get('brand') or '',
+            'category': product.get('category') or '',
+            'current_price': float(price) if price is not None else None,
+            'specifications': specifications,
+        }
+
+    def _block_key(self, brand: str, bucket: int) -> str:
+        return f"{brand}\x1f{bucket}"
+
+    def _row_product(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['product_id'],
+            'platform': row['platform'],
+            'external_id': row['external_id'],
+            'title': row['title'],
+            'brand': row['brand'],
+            'category': row['category'],
+            'current_price': row['current_price'],
+            'specifications': json.loads(row['specifications']) if row['specifications'] else [],
+        }
+
+    def _signature(self, record) -> Optional[np.ndarray]:
+        return self.minhasher.signature(record.title or '')
+
+    # Lookups
+
+    def _candidate_ids(self, features: Dict[str, Any], record, signature: Optional[np.ndarray]) -> Set[str]:
+        """Ids of indexed products sharing an LSH band, a blocking key or the platform item"""
+        candidates: Set[str] = set()
+        cursor = self.connection.cursor()
+
+        if signature is not None:
+            # Each band contributes at most max_candidates members, so huge
+            # buckets of near-identical titles cost no more than small ones
+            keys = self.lsh.keys(signature)
+            bands = ' UNION ALL '.join(
+                ['SELECT product_id FROM (SELECT product_id FROM lsh_buckets WHERE band_key = ? LIMIT ?)'] * len(keys)
+            )
+            params = [value for key in keys for value in (key, self.max_candidates)]
+            candidates.update(product_id for (product_id,) in cursor.execute(
+                f"SELECT product_id FROM ({bands}) GROUP BY product_id ORDER BY COUNT(*) DESC LIMIT ?",
+                params + [self.max_candidates + 1]
+            ))
+
+        brand = record.brand
+        bucket = price_bucket(record.price, self.price_bucket_ratio)
+        if brand and bucket is not None:
+            for neighbour in (bucket - 1, bucket, bucket + 1):
+                members = [product_id for (product_id,) in cursor.execute(
+                    "SELECT product_id FROM blocks WHERE block_key = ? LIMIT ?",
+                    (self._block_key(brand, neighbour), self.max_block_size + 1)
+                )]
+                # Oversized blocks are left to the LSH, as in CandidateGenerator
+                if len(members) <= self.max_block_size:
+                    candidates.update(members)
+
+        candidates.update(product_id for (product_id,) in cursor.execute(
+            "SELECT product_id FROM products WHERE platform = ? AND external_id = ?",
+            (features['platform'], features['external_id'])
+        ))
+        candidates.discard(features['id'])
+        return candidates
+
+    def _load(self, product_ids: Iterable[str]) -> List[sqlite3.Row]:
+        product_ids = list(product_ids)
+        rows = []
+        cursor = self.connection.cursor()
+        cursor.row_factory = sqlite3.Row
+        for start in range(0, len(product_ids), _MAX_PARAMS):
+            chunk = product_ids[start:start + _MAX_PARAMS]
+            rows.extend(cursor.execute(
+                f"SELECT * FROM products WHERE product_id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return rows
+
+    def _score(self, features: Dict[str, Any], rows: Iterable[sqlite3.Row]) -> List[Dict[str, Any]]:
+        deduplicator = self.deduplicator
+        rows = list(rows)
+        featurizer = deduplicator.featurizer()
+        records = featurizer.featurize([features] + [self._row_product(row) for row in rows])
+        block = [index for index in range(1, len(records))
+                 if deduplicator._could_be_duplicates(records[0], records[index])]
+        corpora = None
+        if deduplicator.kernel.uses_corpus:
+            corpora = (self._corpus('title', [record.title for record in records]),
+                       self._corpus('brand', [record.brand for record in records]))
+        prepared = deduplicator._prepare(records, featurizer.tokens, corpora)
+        scores = deduplicator._block_similarity(records, prepared, 0, block)
+
+        matches = []
+        for index, score in zip(block, scores):
+            row = rows[index - 1]
+            same_item = deduplicator._is_same_item(records[0], records[index])
+            score = 1.0 if same_item else score
+            matches.append({
+                'product_id': row['product_id'],
+                'canonical_id': row['canonical_id'],
+                'platform': row['platform'],
+                'external_id': row['external_id'],
+                'score': round(score, 4),
+                'duplicate': same_item or score >= deduplicator.similarity_threshold,
+            })
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches
+
+    def query_nearest(self, product: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Indexed products that could be duplicates of product, best first, with
+        their similarity score and whether it reaches the duplicate threshold.
+        """
+        features = self._features(product, str(product.get('id') or ''))
+        record = self.deduplicator.featurize([features])[0]
+        with self._lock:
+            rows = self._load(self._candidate_ids(features, record, self._signature(record)))
+        return self._score(features, rows)[:limit]
+
+    def _match(self, features: Dict[str, Any], record, fingerprint: str,
+               signature: Optional[np.ndarray]) -> Optional[str]:
+        """Canonical id of the group features belongs to, or None for a new product"""
+        row = self.connection.execute(
+            "SELECT canonical_id FROM fingerprints WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row:
+            canonical = self._load([row[0]])
+            if canonical and any(match['duplicate'] for match in self._score(features, canonical)):
+                return row[0]
+
+        for match in self._score(features, self._load(self._candidate_ids(features, record, signature))):
+            if match['duplicate']:
+                return match['canonical_id']
+        return None
+
+    # Writes
+
+    def insert(self, product: Dict[str, Any], product_id: Optional[str] = None) -> str:
+        """
+        Index product (or re-index it if its fields changed) and return the
+        canonical id of its duplicate group. product_id defaults to the
+        product's 'id', then to 'platform:external_id'.
+        """
+        product_id = str(product_id or product.get('id') or f"{product.get('platform')}:{product.get('external_id')}")
+        features = self._features(product, product_id)
+        record = self.deduplicator.featurize([features])[0]
+        fingerprint = self.deduplicator.fingerprint(record)
+        signature = self._signature(record)
+        specifications = json.dumps(features['specifications'], sort_keys=True) if features['specifications'] else None
+
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                existing = cursor.execute(
+                    "SELECT canonical_id, title, brand, current_price, specifications FROM products "
+                    "WHERE product_id = ?", (product_id,)
+                ).fetchone()
+                if existing and existing[1:] == (features['title'], features['brand'], features['current_price'],
+                                                 specifications):
+                    cursor.execute("COMMIT")
+                    return existing[0]
+
+                # A changed canonical product keeps its group; anything else is matched afresh
+                keep_group = existing is not None and existing[0] == product_id and cursor.execute(
+                    "SELECT 1 FROM products WHERE canonical_id = ? AND product_id != ? LIMIT 1",
+                    (product_id, product_id)
+                ).fetchone() is not None
+                if existing:
+                    self._remove(cursor, product_id, reassign=not keep_group)
+
+                canonical_id = product_id if keep_group else (self._match(features, record, fingerprint, signature)
+                                                              or product_id)
+                self._add(cursor, features, record, canonical_id, fingerprint, signature, specifications)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+        if canonical_id != product_id:
+            logger.debug(f"Product {product_id} is a duplicate of {canonical_id}")
+        return canonical_id
+
+    def _add(self, cursor: sqlite3.Cursor, features: Dict[str, Any], record, canonical_id: str, fingerprint: str,
+             signature: Optional[np.ndarray], specifications: Optional[str]):
+        product_id = features['id']
+        brand = record.brand
+        bucket = price_bucket(record.price, self.price_bucket_ratio)
+        block_key = self._block_key(brand, bucket) if brand and bucket is not None else None
+
+        cursor.execute(
+            "INSERT INTO products (product_id, canonical_id, fingerprint, platform, external_id, title, brand, "
+            "category, current_price, specifications, signature, block_key, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (product_id, canonical_id, fingerprint, features['platform'], features['external_id'],
+             features['title'], features['brand'], features['category'], features['current_price'],
+             specifications, signature.tobytes() if signature is not None else None, block_key, time.time())
+        )
+        if signature is not None:
+            cursor.executemany("INSERT OR IGNORE INTO lsh_buckets (band_key, product_id) VALUES (?, ?)",
+                               [(key, product_id) for key in self.lsh.keys(signature)])
+        if block_key is not None:
+            cursor.execute("INSERT OR IGNORE INTO blocks (block_key, product_id) VALUES (?, ?)",
+                           (block_key, product_id))
+        cursor.execute("INSERT OR IGNORE INTO fingerprints (fingerprint, canonical_id) VALUES (?, ?)",
+                       (fingerprint, canonical_id))
+        cursor.executemany(
+            "INSERT INTO corpus (field, token, documents) VALUES (?, ?, 1) "
+            "ON CONFLICT (field, token) DO UPDATE SET documents = documents + 1",
+            self._corpus_tokens(features['title'], features['brand'])
+        )
+
+    def delete(self, product_id: str) -> bool:
+        """
+        Remove a product from the index. If it was the canonical product of a
+        group, the earliest indexed remaining member becomes canonical.
+        """
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._remove(cursor, str(product_id), reassign=True)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return removed
+
+    def _remove(self, cursor: sqlite3.Cursor, product_id: str, reassign: bool) -> bool:
+        row = cursor.execute(
+            "SELECT canonical_id, signature, block_key, title, brand FROM products WHERE product_id = ?", (product_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        canonical_id, signature, block_key, title, brand = row
+
+        cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+        cursor.executemany("UPDATE corpus SET documents = documents - 1 WHERE field = ? AND token = ?",
+                           self._corpus_tokens(title, brand))
+        if signature is not None:
+            keys = self.lsh.keys(np.frombuffer(signature, dtype=np.uint64))
+            cursor.executemany("DELETE FROM lsh_buckets WHERE band_key = ? AND product_id = ?",
+                               [(key, product_id) for key in keys])
+        if block_key is not None:
+            cursor.execute("DELETE FROM blocks WHERE block_key = ? AND product_id = ?", (block_key, product_id))
+
+        if reassign and canonical_id == product_id:
+            successor = cursor.execute(
+                "SELECT product_id FROM products WHERE canonical_id = ? ORDER BY indexed_at, product_id LIMIT 1",
+                (product_id,)
+            ).fetchone()
+            if successor:
+                cursor.execute("UPDATE products SET canonical_id = ? WHERE canonical_id = ?", (successor[0], product_id))
+                cursor.execute("UPDATE fingerprints SET canonical_id = ? WHERE canonical_id = ?",
+                               (successor[0], product_id))
+            else:
+                cursor.execute("DELETE FROM fingerprints WHERE canonical_id = ?", (product_id,))
+        return True
+
+    # Groups and maintenance
+
+    def canonical_id(self, product_id: str) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT canonical_id FROM products WHERE product_id = ?", (str(product_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def duplicate_groups(self, field: str = 'external_id') -> List[List[str]]:
+        """Groups of two or more duplicates, canonical product first, identified by field"""
+        if field not in ('product_id', 'external_id'):
+            raise ValueError(f"Unsupported group field: {field}")
+        with self._lock:
+            rows = self.connection.execute(f"""
+                SELECT p.canonical_id, p.{field}
+                FROM products p
+                JOIN (SELECT canonical_id FROM products GROUP BY canonical_id HAVING COUNT(*) > 1) g
+                  ON g.canonical_id = p.canonical_id
+                ORDER BY p.canonical_id, p.product_id != p.canonical_id, p.indexed_at
+            """).fetchall()
+        groups: Dict[str, List[str]] = {}
+        for canonical_id, value in rows:
+            groups.setdefault(canonical_id, []).append(value)
+        return list(groups.values())
+
+    def sync(self, db_manager, overlap: timedelta = timedelta(minutes=5)) -> Dict[str, int]:
+        """
+        Bring the index up to date with products changed in the database since
+        the last sync: active products are (re)indexed with their specifications,
+        as the scraper pipeline indexes them, and deactivated ones removed. The
+        first sync indexes the whole catalog. Each sync re-reads ``overlap``
+        before the last one so rows committed late are not missed.
+        """
+        synced_until = self._get_meta('synced_until')
+        since = datetime.fromisoformat(synced_until) - overlap if synced_until else None
+        started = time.perf_counter()
+        counts = {'indexed': 0, 'removed': 0}
+        latest = None
+
+        columns = DEDUPLICATION_COLUMNS + ('is_active', 'updated_at')
+        # Each batch is read in full before it is indexed, so no database connection
+        # is held while the batch is scored and written to SQLite
+        for batch in db_manager.iter_product_batches(active_only=False, columns=columns, updated_since=since):
+            specifications = db_manager.get_product_specifications([row.id for row in batch if row.is_active])
+            for row in batch:
+                if row.is_active:
+                    product = row._asdict()
+                    product['specifications'] = specifications.get(str(row.id), [])
+                    self.insert(product, product_id=str(row.id))
+                    counts['indexed'] += 1
+                elif self.delete(str(row.id)):
+                    counts['removed'] += 1
+                if row.updated_at is not None and (latest is None or row.updated_at > latest):
+                    latest = row.updated_at
+
+        if latest is not None:
+            with self._lock:
+                self._set_meta('synced_until', latest.isoformat())
+        logger.info(f"Similarity index sync: {counts['indexed']} products indexed, {counts['removed']} removed "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            products, groups = self.connection.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT canonical_id) FROM products"
+            ).fetchone()
+        return {
+            'products': products,
+            'groups': groups,
+            'duplicates': products - groups,
+            'synced_until': self._get_meta('synced_until'),
+        }
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
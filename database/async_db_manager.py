@@ -0,0 +1,435 @@
+"""
+Asyncio database manager for Unified E-commerce Product Data Aggregator
+
+The asyncio counterpart to DatabaseManager for scrapers that run in an event
+loop, built on asyncpg. It offers the same insert, bulk insert and upsert
+methods so persisting one page of results can overlap with scraping the
+next. Multi-row writes send the whole batch as one jsonb parameter and
+expand it with jsonb_to_recordset; child rows go through executemany, which
+asyncpg pipelines instead of waiting for each row's round trip.
+"""
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from database.db_manager import (
+    CHILD_TABLES, PRODUCT_COLUMNS, PRODUCT_COLUMN_TYPES, DatabaseConfig, DatabaseManager, db_config
+)
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - optional dependency
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of each child table, in the order DatabaseManager's row builders produce them
+CHILD_COLUMNS = {
+    'specifications': ('product_id', 'spec_name', 'spec_value', 'spec_category'),
+    'images': ('product_id', 'image_url', 'image_type', 'alt_text', 'is_downloaded', 'local_path',
+               'file_size', 'width', 'height'),
+    'variations': ('product_id', 'variation_type', 'variation_value', 'variation_price', 'availability_status'),
+}
+
+PRICE_HISTORY_TYPES = {
+    'product_id': 'uuid', 'price': 'numeric', 'currency': 'varchar', 'platform': 'varchar',
+    'price_change_type': 'varchar',
+}
+
+
+def _recordset(columns: Dict[str, str]) -> str:
+    """jsonb_to_recordset column definition list for {column: type}"""
+    return ', '.join(f"{column} {column_type}" for column, column_type in columns.items())
+
+
+def _json_records(records: List[Dict[str, Any]]) -> str:
+    # Decimals and UUIDs travel as strings and are cast back by jsonb_to_recordset
+    return json.dumps(records, default=str)
+
+
+class AsyncDatabaseManager:
+    """Asyncio database connection and operation manager"""
+
+    # Row building, hashing and diffing are shared with DatabaseManager
+    _specification_rows = staticmethod(DatabaseManager._specification_rows)
+    _image_rows = staticmethod(DatabaseManager._image_rows)
+    _variation_rows = staticmethod(DatabaseManager._variation_rows)
+    _child_hashes = DatabaseManager._child_hashes
+    _product_key = staticmethod(DatabaseManager._product_key)
+    _values_equal = staticmethod(DatabaseManager._values_equal)
+    _price_change_type = staticmethod(DatabaseManager._price_change_type)
+    # Writes invalidate the product cache the same way, so the shared tier that
+    # DatabaseManager.get_product_by_id reads from in other processes stays current
+    _initialize_cache = DatabaseManager._initialize_cache
+    _invalidate_products = DatabaseManager._invalidate_products
+
+    def __init__(self, config: DatabaseConfig):
+        if asyncpg is None:
+            raise ImportError("AsyncDatabaseManager requires asyncpg (pip install asyncpg)")
+        self.config = config
+        self.pool = None
+        self.product_cache = None
+        self._initialize_cache()
+
+    async def connect(self):
+        """Create the connection pool"""
+        if self.pool is not None:
+            return
+        try:
+            self.pool = await asyncpg.create_pool(
+                host=self.config.host,
+                port=int(self.config.port),
+                database=self.config.database,
+                user=self.config.user,
+                password=self.config.password,
+                min_size=self.config.min_connections,
+                max_size=self.config.max_connections,
+                max_inactive_connection_lifetime=self.config.pool_max_lifetime,
+            )
+            logger.info("Async database connection pool initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize async database connection pool: {e}")
+            raise
+
+    async def close(self):
+        """Close the connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Async database connection pool closed")
+
+    async def __aenter__(self) -> 'AsyncDatabaseManager':
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator[Any]:
+        """Get a connection from the pool, waiting at most pool_timeout seconds"""
+        if self.pool is None:
+            await self.connect()
+        async with self.pool.acquire(timeout=self.config.pool_timeout) as connection:
+            yield connection
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool size metrics"""
+        if self.pool is None:
+            return {}
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            'size': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'max_connections': self.pool.get_max_size(),
+        }
+
+    async def execute_query(self, query: str, *args, fetch: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Execute a query with asyncpg ($1, $2, ...) placeholders"""
+        async with self.get_connection() as conn:
+            try:
+                if fetch:
+                    return [dict(row) for row in await conn.fetch(query, *args)]
+                await conn.execute(query, *args)
+                return None
+            except Exception as e:
+                logger.error(f"Query execution error: {e}")
+                raise
+
+    async def insert_product(self, product_data: Dict[str, Any]) -> Optional[str]:
+        """Insert a new product into the database"""
+        ids = await self.bulk_insert_products([{**product_data, 'specifications': {}, 'images': [],
+                                                'variations': []}])
+        return ids.get(self._product_key(product_data))
+
+    async def insert_product_specifications(self, product_id: Union[str, Dict[str, Dict[str, Any]]],
+                                            specifications: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Insert product specifications.
+
+        Takes a single product as (product_id, specifications) or many products as a
+        {product_id: specifications} mapping. Returns the number of rows written.
+        """
+        return await self._insert_children('specifications', product_id, specifications)
+
+    async def insert_product_images(self, product_id: Union[str, Dict[str, List[Dict[str, Any]]]],
+                                    images: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Insert product images.
+
+        Takes a single product as (product_id, images) or many products as a
+        {product_id: images} mapping. Returns the number of rows written.
+        """
+        return await self._insert_children('images', product_id, images)
+
+    async def insert_product_variations(self, product_id: Union[str, Dict[str, List[Dict[str, Any]]]],
+                                        variations: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Insert product variations.
+
+        Takes a single product as (product_id, variations) or many products as a
+        {product_id: variations} mapping. Returns the number of rows written.
+        """
+        return await self._insert_children('variations', product_id, variations)
+
+    async def _insert_children(self, kind: str, product_id, values) -> int:
+        if isinstance(product_id, dict):
+            targets = {pid: {kind: pid_values} for pid, pid_values in product_id.items()}
+        else:
+            targets = {product_id: {kind: values}}
+
+        async with self.get_connection() as conn:
+            try:
+                async with conn.transaction():
+                    counts = await self._insert_child_rows(conn, {kind: targets})
+            except Exception as e:
+                logger.error(f"Failed to insert product {kind}: {e}")
+                raise
+        logger.info(f"Inserted {counts[kind]} {kind} rows for {len(targets)} products")
+        return counts[kind]
+
+    async def bulk_insert_products(self, products: List[Dict[str, Any]]) -> Dict[tuple, str]:
+        """
+        Insert a batch of products with their specifications, images and variations.
+
+        Products go in with one statement and each child table with one pipelined
+        executemany, all in a single transaction. Products whose (platform,
+        external_id) already exists are skipped. Returns a mapping of
+        (platform, external_id) -> id for the inserted products.
+        """
+        if not products:
+            return {}
+
+        async with self.get_connection() as conn:
+            try:
+                async with conn.transaction():
+                    inserted = await self._insert_product_rows(conn, products, PRODUCT_COLUMNS)
+                    product_ids = {(row['platform'], row['external_id']): str(row['id']) for row in inserted}
+
+                    children = {}
+                    for product in products:
+                        product_id = product_ids.get(self._product_key(product))
+                        # Only the first occurrence of a repeated key owns the new row
+                        if product_id and product_id not in children:
+                            children[product_id] = product
+
+                    row_counts = await self._insert_child_rows(
+                        conn, {kind: children for kind, _, _, _ in CHILD_TABLES}
+                    )
+            except Exception as e:
+                logger.error(f"Failed to bulk insert products: {e}")
+                raise
+
+        logger.info(f"Bulk inserted {len(product_ids)} of {len(products)} products "
+                    f"({', '.join(f'{count} {kind}' for kind, count in row_counts.items())})")
+        return product_ids
+
+    async def upsert_product(self, product_data: Dict[str, Any]) -> Optional[str]:
+        """Insert or update one product; see upsert_products"""
+        results = await self.upsert_products([product_data])
+        outcome = results.get(self._product_key(product_data))
+        return str(outcome['id']) if outcome else None
+
+    async def upsert_products(self, products: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Insert or update a batch of products keyed on (platform, external_id).
+
+        Behaves like DatabaseManager.upsert_products: only changed columns are
+        written, price history records change points, child rows are replaced only
+        when their content hash differs, and a product another writer inserts
+        between the lookup and the insert is diffed like any existing one. Returns
+        a mapping of (platform, external_id) -> {'id', 'action', 'changed'}.
+        """
+        # The last occurrence of a key in the batch wins
+        batch = {}
+        for product in products:
+            batch[self._product_key(product)] = product
+        if not batch:
+            return {}
+
+        compare_columns = [column for column in PRODUCT_COLUMNS if column not in ('platform', 'external_id')]
+        hash_columns = [hash_column for _, _, hash_column, _ in CHILD_TABLES]
+        child_hashes = {key: self._child_hashes(product) for key, product in batch.items()}
+
+        async with self.get_connection() as conn:
+            try:
+                async with conn.transaction():
+                    existing = await self._lock_products(conn, list(batch.keys()), compare_columns + hash_columns)
+
+                    results = {}
+
+                    # New products
+                    new_keys = [key for key in batch if key not in existing]
+                    if new_keys:
+                        insert_columns = list(PRODUCT_COLUMNS) + hash_columns
+                        inserted = await self._insert_product_rows(
+                            conn, [{**batch[key], **child_hashes[key]} for key in new_keys], insert_columns
+                        )
+                        for row in inserted:
+                            results[(row['platform'], row['external_id'])] = {
+                                'id': str(row['id']), 'action': 'inserted', 'changed': list(insert_columns)
+                            }
+
+                        # Keys another writer inserted since the lookup: lock and diff them instead
+                        raced = [key for key in new_keys if key not in results]
+                        if raced:
+                            existing.update(await self._lock_products(conn, raced, compare_columns + hash_columns))
+
+                    # Existing products: diff column by column
+                    updates_by_columns = {}
+                    for key, current in existing.items():
+                        product = batch[key]
+                        changed = [
+                            column for column in compare_columns
+                            if column in product and not self._values_equal(product[column], current[column])
+                        ]
+                        changed += [
+                            hash_column for hash_column, content_hash in child_hashes[key].items()
+                            if content_hash != current[hash_column]
+                        ]
+                        results[key] = {
+                            'id': str(current['id']),
+                            'action': 'updated' if changed else 'unchanged',
+                            'changed': changed,
+                        }
+                        if changed:
+                            values = {**product, **child_hashes[key]}
+                            updates_by_columns.setdefault(tuple(changed), []).append(
+                                {'id': str(current['id']), **{column: values[column] for column in changed}}
+                            )
+
+                    # One UPDATE ... FROM jsonb_to_recordset per distinct set of changed columns
+                    for columns, records in updates_by_columns.items():
+                        assignments = [f"{column} = v.{column}" for column in columns]
+                        if 'current_price' in columns:
+                            assignments.append("last_price_update = NOW()")
+                        recordset = _recordset({'id': 'uuid', **{column: PRODUCT_COLUMN_TYPES[column]
+                                                                 for column in columns}})
+                        await conn.execute(f"""
+                            UPDATE products AS p
+                            SET {', '.join(assignments)}, updated_at = NOW()
+                            FROM jsonb_to_recordset($1::jsonb) AS v({recordset})
+                            WHERE p.id = v.id
+                        """, _json_records(records))
+
+                    # Price history only when the price actually moved
+                    price_records = []
+                    for key, outcome in results.items():
+                        product = batch[key]
+                        if 'current_price' not in outcome['changed'] or product.get('current_price') is None:
+                            continue
+                        old_price = existing[key]['current_price'] if key in existing else None
+                        price_records.append({
+                            'product_id': outcome['id'],
+                            'price': product['current_price'],
+                            'currency': product.get('currency') or 'USD',
+                            'platform': key[0],
+                            'price_change_type': self._price_change_type(old_price, product['current_price']),
+                        })
+                    await self._record_price_changes(conn, price_records)
+
+                    # Child rows only for products whose content hash changed
+                    replace = {kind: {} for kind, _, _, _ in CHILD_TABLES}
+                    for key, outcome in results.items():
+                        for kind, _, hash_column, _ in CHILD_TABLES:
+                            if hash_column in outcome['changed']:
+                                replace[kind][outcome['id']] = batch[key]
+
+                    existing_ids = {str(row['id']) for row in existing.values()}
+                    for kind, table, _, _ in CHILD_TABLES:
+                        stale_ids = [product_id for product_id in replace[kind] if product_id in existing_ids]
+                        if stale_ids:
+                            await conn.execute(f"DELETE FROM {table} WHERE product_id = ANY($1::uuid[])", stale_ids)
+                    row_counts = await self._insert_child_rows(conn, replace)
+            except Exception as e:
+                logger.error(f"Failed to upsert products: {e}")
+                raise
+
+        updated = [outcome['id'] for outcome in results.values() if outcome['action'] == 'updated']
+        if updated and self.product_cache is not None:
+            # The shared tier is a blocking Redis client
+            await asyncio.to_thread(self._invalidate_products, updated)
+
+        actions = [outcome['action'] for outcome in results.values()]
+        logger.info(
+            f"Upserted {len(batch)} products: {actions.count('inserted')} inserted, "
+            f"{actions.count('updated')} updated, {actions.count('unchanged')} unchanged, "
+            f"{len(price_records)} price changes, "
+            f"{', '.join(f'{count} {kind} rows' for kind, count in row_counts.items())}"
+        )
+        return results
+
+    @staticmethod
+    async def _lock_products(conn, keys: List[tuple], columns: List[str]) -> Dict[tuple, Any]:
+        """Lock the products with the given (platform, external_id) keys; returns their rows by key"""
+        rows = await conn.fetch(f"""
+            SELECT id, platform, external_id, {', '.join(columns)}
+            FROM products
+            WHERE (platform, external_id) IN (
+                SELECT * FROM unnest($1::varchar[], $2::varchar[])
+            )
+            FOR UPDATE
+        """, [key[0] for key in keys], [key[1] for key in keys])
+        return {(row['platform'], row['external_id']): row for row in rows}
+
+    async def _insert_product_rows(self, conn, products: List[Dict[str, Any]], columns) -> List[Any]:
+        """Insert products with one statement, skipping existing keys; returns the new rows' keys and ids"""
+        records = [{column: product.get(column) for column in columns} for product in products]
+        recordset = _recordset({column: PRODUCT_COLUMN_TYPES[column] for column in columns})
+        return await conn.fetch(f"""
+            INSERT INTO products ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM jsonb_to_recordset($1::jsonb) AS v({recordset})
+            ON CONFLICT (platform, external_id) DO NOTHING
+            RETURNING id, platform, external_id
+        """, _json_records(records))
+
+    async def _insert_child_rows(self, conn, targets: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Write specification, image and variation rows with one executemany per table.
+
+        targets maps each child kind to a {product_id: product dict} mapping, as for
+        DatabaseManager._insert_child_rows. Returns the number of rows written per kind.
+        """
+        builders = {
+            'specifications': self._specification_rows,
+            'images': self._image_rows,
+            'variations': self._variation_rows,
+        }
+        counts = {}
+        for kind, table, _, _ in CHILD_TABLES:
+            empty = {} if kind == 'specifications' else []
+            rows = []
+            for product_id, product in targets.get(kind, {}).items():
+                rows.extend(builders[kind](str(product_id), product.get(kind) or empty))
+            if rows:
+                columns = CHILD_COLUMNS[kind]
+                placeholders = ', '.join(f"${position}" for position in range(1, len(columns) + 1))
+                await conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+                )
+            counts[kind] = len(rows)
+        return counts
+
+    @staticmethod
+    async def _record_price_changes(conn, records: List[Dict[str, Any]]):
+        """Close each product's open price_history row and open one at the new price"""
+        if not records:
+            return
+        await conn.execute("""
+            UPDATE price_history SET valid_until = NOW()
+            WHERE valid_until IS NULL AND product_id = ANY($1::uuid[])
+        """, [record['product_id'] for record in records])
+        await conn.execute(f"""
+            INSERT INTO price_history (product_id, price, currency, platform, price_change_type)
+            SELECT product_id, price, currency, platform, price_change_type
+            FROM jsonb_to_recordset($1::jsonb) AS v({_recordset(PRICE_HISTORY_TYPES)})
+        """, _json_records(records))
+
+
+def get_async_db_manager(config: Optional[DatabaseConfig] = None) -> AsyncDatabaseManager:
+    """New AsyncDatabaseManager; its pool opens on first use or with `async with`"""
+    return AsyncDatabaseManager(config or db_config)
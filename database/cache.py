@@ -0,0 +1,227 @@
+"""
+Read-through product cache for DatabaseManager
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalSharedStore:
+    """
+    In-process stand-in for the Redis tier.
+
+    Implements the part of the redis.Redis API that ProductCache uses
+    (``get``, ``setex``, ``delete``) with expiring bytes values, so the
+    shared tier can be exercised without a Redis server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, tuple] = {}  # key -> (value, expires_at)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def setex(self, key: str, ttl: float, value: bytes):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+def connect_shared_store(url: str):
+    """Redis client for url, or None if redis is not installed or unreachable"""
+    if url == 'local':
+        return LocalSharedStore()
+    try:
+        import redis
+    except ImportError:
+        logger.warning("redis is not installed; product cache runs without the shared tier")
+        return None
+    try:
+        client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        client.ping()
+        return client
+    except Exception as e:
+        logger.warning(f"Product cache shared tier unavailable at {url}: {e}")
+        return None
+
+
+class ProductCache:
+    """
+    Two-tier read-through cache of product rows keyed by product id.
+
+    The local tier is an LRU of at most ``max_size`` entries that expire
+    ``ttl`` seconds after they were loaded. The optional ``shared`` tier is a
+    Redis client (or LocalSharedStore) shared between processes, holding
+    pickled rows for ``shared_ttl`` seconds. ``get_or_load`` checks the local
+    tier, then the shared one, then calls the loader and fills both.
+
+    ``invalidate`` drops an id from both tiers. A load that was in flight
+    when its id was invalidated returns its row but does not cache it, so a
+    write cannot be overwritten by a read that started before it. Other
+    processes' local tiers are not told about invalidations and may serve a
+    row for up to ``ttl`` seconds after it changed.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0, shared=None, shared_ttl: float = 300.0,
+                 key_prefix: str = 'product:'):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.key_prefix = key_prefix
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # id -> (row, expires_at)
+        self._loading: Dict[str, List[int]] = {}  # id -> [generation, loaders]
+
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.shared_errors = 0
+
+    def get_or_load(self, product_id: Any, loader: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Cached row for product_id, calling loader() on a miss; None results are not cached"""
+        key = str(product_id)
+        row = self._get_local(key)
+        if row is not _MISSING:
+            return row
+
+        row = self._get_shared(key)
+        if row is not _MISSING:
+            self._set_local(key, row)
+            return row
+
+        with self._lock:
+            self.misses += 1
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+        try:
+            row = loader()
+        finally:
+            with self._lock:
+                loading = self._loading[key]
+                loading[1] -= 1
+                current = loading[0] == generation
+                if not loading[1]:
+                    del self._loading[key]
+                self.loads += 1
+
+        if row is not None and current:
+            self._set_shared(key, row)
+            self._set_local(key, row)
+        return row
+
+    def invalidate(self, product_ids: Iterable[Any]):
+        """Drop product_ids from both tiers"""
+        keys = [str(product_id) for product_id in product_ids]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                if key in self._loading:
+                    self._loading[key][0] += 1
+            self.invalidations += len(keys)
+        if self.shared is not None:
+            try:
+                self.shared.delete(*(self.key_prefix + key for key in keys))
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Failed to invalidate shared product cache: {e}")
+
+    def clear(self):
+        """Empty the local tier"""
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.local_hits += 1
+            return entry[0]
+
+    def _set_local(self, key: str, row: Dict[str, Any]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (row, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_shared(self, key: str):
+        if self.shared is None:
+            return _MISSING
+        try:
+            payload = self.shared.get(self.key_prefix + key)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared product cache read failed: {e}")
+            return _MISSING
+        if payload is None:
+            return _MISSING
+        with self._lock:
+            self.shared_hits += 1
+        return pickle.loads(payload)
+
+    def _set_shared(self, key: str, row: Dict[str, Any]):
+        if self.shared is None:
+            return
+        try:
+            self.shared.setex(self.key_prefix + key, max(int(self.shared_ttl), 1),
+                              pickle.dumps(dict(row), protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared product cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rates and entry counts for both tiers"""
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'lookups': lookups,
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+                'local_hit_rate': round(self.local_hits / lookups, 3) if lookups else 0.0,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'shared_tier': type(self.shared).__name__ if self.shared is not None else None,
+                'shared_errors': self.shared_errors,
+            }
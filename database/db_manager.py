@@ -3,18 +3,74 @@ Database configuration and connection management for Unified E-commerce Product
 """
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, NamedTupleCursor, execute_values
+from database.cache import ProductCache, connect_shared_store
+from database.pool import HealthCheckedConnectionPool
+from database.query_stats import InstrumentedConnection, QueryStats
 import logging
 from contextlib import contextmanager
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Union
 import json
-from datetime import datetime
+import hashlib
+import threading
+import time
+import uuid
+from decimal import Decimal
+from datetime import datetime, timedelta
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Column order shared by the single-row and multi-row product inserts
+# Lower bound on recorded_at for rows in effect at %s: no row recorded before the
+# latest month carried by PriceHistoryPartitionManager.carry_open_prices is in effect
+# after that month began, so the partitions before it are pruned
+CARRIED_MONTH_BOUND = """
+    COALESCE((SELECT MAX(month)::timestamp FROM price_history_carried_months WHERE month <= %s),
+             '-infinity'::timestamp)
+"""
+
+PRODUCT_COLUMNS = (
+    'external_id', 'platform', 'title', 'description', 'bullet_points', 'brand', 'model',
+    'current_price', 'original_price', 'currency', 'discount_percentage', 'availability_status',
+    'rating', 'review_count', 'category', 'subcategory', 'product_url'
+)
+
+# SQL types of the product columns, used to cast untyped VALUES lists
+PRODUCT_COLUMN_TYPES = {
+    'external_id': 'varchar', 'platform': 'varchar', 'title': 'text', 'description': 'text',
+    'bullet_points': 'text[]', 'brand': 'varchar', 'model': 'varchar', 'current_price': 'numeric',
+    'original_price': 'numeric', 'currency': 'varchar', 'discount_percentage': 'numeric',
+    'availability_status': 'varchar', 'rating': 'numeric', 'review_count': 'integer',
+    'category': 'varchar', 'subcategory': 'varchar', 'product_url': 'text',
+    'specs_hash': 'text', 'images_hash': 'text', 'variations_hash': 'text'
+}
+
+# Child tables: (product data key, table, hash column, multi-row insert)
+CHILD_TABLES = (
+    ('specifications', 'product_specifications', 'specs_hash', """
+        INSERT INTO product_specifications (product_id, spec_name, spec_value, spec_category)
+        VALUES %s
+    """),
+    ('images', 'product_images', 'images_hash', """
+        INSERT INTO product_images (product_id, image_url, image_type, alt_text, is_downloaded, local_path, file_size, width, height)
+        VALUES %s
+    """),
+    ('variations', 'product_variations', 'variations_hash', """
+        INSERT INTO product_variations (product_id, variation_type, variation_value, variation_price, availability_status)
+        VALUES %s
+    """),
+)
+
+# Cursor factories for the row formats streamed by iter_query
+ROW_CURSOR_FACTORIES = {
+    'tuple': None,
+    'namedtuple': NamedTupleCursor,
+    'dict': RealDictCursor,
+}
+
 class DatabaseConfig:
     """Database configuration class"""
     
@@ -28,6 +84,32 @@ class DatabaseConfig:
         # Connection pool settings
         self.min_connections = int(os.getenv('DB_MIN_CONNECTIONS', '1'))
         self.max_connections = int(os.getenv('DB_MAX_CONNECTIONS', '10'))
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.pool_max_lifetime = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))
+        self.pool_validate_idle = float(os.getenv('DB_POOL_VALIDATE_IDLE', '30'))
+        
+        # Rows per round trip for server-side cursors
+        self.fetch_size = int(os.getenv('DB_FETCH_SIZE', '2000'))
+        
+        # Price history partition maintenance
+        self.price_history_retention_months = int(os.getenv('PRICE_HISTORY_RETENTION_MONTHS', '13'))
+        self.price_history_premake_months = int(os.getenv('PRICE_HISTORY_PREMAKE_MONTHS', '3'))
+        self.price_history_archive_dir = os.getenv('PRICE_HISTORY_ARCHIVE_DIR', 'archive/price_history')
+        
+        # Statements slower than this are logged with their parameters;
+        # a negative value turns the slow-query log off
+        self.slow_query_ms = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+        self.slow_query_log_size = int(os.getenv('DB_SLOW_QUERY_LOG_SIZE', '100'))
+        
+        # Product read cache; size 0 disables it. The shared tier is a Redis URL,
+        # or 'local' for an in-process stand-in
+        self.product_cache_size = int(os.getenv('DB_PRODUCT_CACHE_SIZE', '10000'))
+        self.product_cache_ttl = float(os.getenv('DB_PRODUCT_CACHE_TTL', '60'))
+        self.product_cache_redis_url = os.getenv('DB_PRODUCT_CACHE_REDIS_URL', '')
+        self.product_cache_shared_ttl = float(os.getenv('DB_PRODUCT_CACHE_SHARED_TTL', '300'))
+        
+        # On-disk similarity index kept in sync with products for deduplication
+        self.similarity_index_path = os.getenv('SIMILARITY_INDEX_PATH', 'similarity_index.sqlite3')
         
         # MongoDB settings
         self.mongo_host = os.getenv('MONGO_HOST', 'localhost')
@@ -44,30 +126,59 @@ class DatabaseManager:
     def __init__(self, config: DatabaseConfig):
         self.config = config
         self.connection_pool = None
+        self.product_cache: Optional[ProductCache] = None
+        self.query_stats = QueryStats(
+            slow_threshold=config.slow_query_ms / 1000 if config.slow_query_ms >= 0 else None,
+            slow_log_size=config.slow_query_log_size
+        )
         self._initialize_pool()
+        self._initialize_cache()
     
     def _initialize_pool(self):
         """Initialize connection pool"""
         try:
-            self.connection_pool = SimpleConnectionPool(
+            self.connection_pool = HealthCheckedConnectionPool(
                 self.config.min_connections,
                 self.config.max_connections,
-                self.config.get_connection_string()
+                self.config.get_connection_string(),
+                timeout=self.config.pool_timeout,
+                max_lifetime=self.config.pool_max_lifetime,
+                validate_idle=self.config.pool_validate_idle,
+                # Every statement on a pooled connection is recorded in query_stats
+                connection_factory=type('InstrumentedConnection', (InstrumentedConnection,),
+                                        {'query_stats': self.query_stats})
             )
             logger.info("Database connection pool initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize database connection pool: {e}")
             raise
     
+    def _initialize_cache(self):
+        """Set up the product read cache"""
+        if self.config.product_cache_size <= 0:
+            return
+        shared = None
+        if self.config.product_cache_redis_url:
+            shared = connect_shared_store(self.config.product_cache_redis_url)
+        self.product_cache = ProductCache(
+            max_size=self.config.product_cache_size,
+            ttl=self.config.product_cache_ttl,
+            shared=shared,
+            shared_ttl=self.config.product_cache_shared_ttl
+        )
+    
     @contextmanager
     def get_connection(self):
         """Get database connection from pool"""
         connection = None
         try:
+            requested = time.perf_counter()
             connection = self.connection_pool.getconn()
+            if isinstance(connection, InstrumentedConnection):
+                connection.pool_wait = time.perf_counter() - requested
             yield connection
         except Exception as e:
-            if connection:
+            if connection and not connection.closed:
                 connection.rollback()
             logger.error(f"Database connection error: {e}")
             raise
@@ -75,8 +186,27 @@ class DatabaseManager:
             if connection:
                 self.connection_pool.putconn(connection)
     
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool utilisation and wait-time metrics"""
+        return self.connection_pool.stats() if self.connection_pool else {}
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get product cache hit-rate metrics"""
+        return self.product_cache.stats() if self.product_cache else {}
+    
+    def get_query_stats(self, top_n: int = 10, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """
+        Get the top_n statement templates run on pooled connections by order_by
+        ('total_ms', 'calls', 'rows', 'errors' or an execution percentile such as 'p95')
+        """
+        return self.query_stats.top(top_n, order_by)
+    
+    def get_slow_queries(self) -> List[Dict[str, Any]]:
+        """Get the most recent slow queries with their parameters and callers"""
+        return self.query_stats.slow_queries()
+    
     def execute_query(self, query: str, params: tuple = None, fetch: bool = False) -> Optional[List[Dict[str, Any]]]:
-        """Execute a database query"""
+        """Execute a database query; like every statement, it is recorded in query_stats"""
         with self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 try:
@@ -90,32 +220,117 @@ class DatabaseManager:
                     logger.error(f"Query execution error: {e}")
                     raise
     
-    def insert_product(self, product_data: Dict[str, Any]) -> str:
-        """Insert a new product into the database"""
-        query = """
-        INSERT INTO products (
-            external_id, platform, title, description, bullet_points, brand, model,
-            current_price, original_price, currency, discount_percentage, availability_status,
-            rating, review_count, category, subcategory, product_url
-        ) VALUES (
-            %(external_id)s, %(platform)s, %(title)s, %(description)s, %(bullet_points)s,
-            %(brand)s, %(model)s, %(current_price)s, %(original_price)s, %(currency)s,
-            %(discount_percentage)s, %(availability_status)s, %(rating)s, %(review_count)s,
-            %(category)s, %(subcategory)s, %(product_url)s
-        ) RETURNING id
-        """
-        
-        result = self.execute_query(query, product_data, fetch=True)
-        return result[0]['id'] if result else None
+    def insert_product(self, product_data: Dict[str, Any]) -> Optional[str]:
+        """Insert a product, or update it if (platform, external_id) already exists; see upsert_product"""
+        return self.upsert_product(product_data)
+    
+    def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Get a product row by id, served from the product cache when possible"""
+        def load():
+            rows = self.execute_query("SELECT * FROM products WHERE id = %s", (str(product_id),), fetch=True)
+            return rows[0] if rows else None
+        
+        if self.product_cache is None:
+            row = load()
+        else:
+            row = self.product_cache.get_or_load(product_id, load)
+        # Callers get their own copy so they cannot change the cached row
+        return dict(row) if row is not None else None
+    
+    def get_product_specifications(self, product_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Specification rows of many products with one query, as {product_id: rows}"""
+        if not product_ids:
+            return {}
+        rows = self.execute_query("""
+            SELECT product_id, spec_name, spec_value, spec_category
+            FROM product_specifications
+            WHERE product_id = ANY(%s::uuid[])
+        """, ([str(product_id) for product_id in product_ids],), fetch=True)
+        
+        specifications = {}
+        for row in rows:
+            product_id = str(row.pop('product_id'))
+            specifications.setdefault(product_id, []).append(dict(row))
+        return specifications
+    
+    def update_product(self, product_id: str, product_data: Dict[str, Any]) -> bool:
+        """
+        Update a product's columns from product_data, ignoring keys that are not
+        product columns.
+        
+        Only columns whose value changed are written, a price change is recorded in
+        price history, and the product's cache entry is invalidated. Returns whether
+        anything changed.
+        """
+        columns = [column for column in PRODUCT_COLUMNS
+                   if column in product_data and column not in ('platform', 'external_id')]
+        if not columns:
+            return False
+        
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                try:
+                    cursor.execute(
+                        f"SELECT platform, {', '.join(columns)} FROM products WHERE id = %s FOR UPDATE",
+                        (product_id,)
+                    )
+                    current = cursor.fetchone()
+                    if current is None:
+                        raise ValueError(f"Product {product_id} not found")
+                    
+                    changed = [column for column in columns
+                               if not self._values_equal(product_data[column], current[column])]
+                    if changed:
+                        assignments = [sql.SQL("{} = %s").format(sql.Identifier(column)) for column in changed]
+                        if 'current_price' in changed:
+                            assignments.append(sql.SQL("last_price_update = NOW()"))
+                        cursor.execute(
+                            sql.SQL("UPDATE products SET {}, updated_at = NOW() WHERE id = %s").format(
+                                sql.SQL(', ').join(assignments)
+                            ),
+                            tuple(product_data[column] for column in changed) + (product_id,)
+                        )
+                        if 'current_price' in changed and product_data['current_price'] is not None:
+                            self._record_price_changes(cursor, [(
+                                product_id,
+                                product_data['current_price'],
+                                product_data.get('currency') or current.get('currency') or 'USD',
+                                current['platform'],
+                                self._price_change_type(current['current_price'], product_data['current_price'])
+                            )])
+                    
+                    conn.commit()
+                    
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Failed to update product {product_id}: {e}")
+                    raise
+        
+        if changed:
+            self._invalidate_products([product_id])
+            logger.info(f"Updated product {product_id}: {', '.join(changed)}")
+        return bool(changed)
+    
+    def _invalidate_products(self, product_ids: Iterable[Any]):
+        """Drop committed product changes from the product cache"""
+        if self.product_cache is not None:
+            self.product_cache.invalidate(product_ids)
     
     def update_product_price(self, product_id: str, new_price: float, currency: str = 'USD'):
-        """Update product price and record in price history"""
+        """
+        Update product price and record it in price history if it changed.
+        
+        price_history stores change points, so an unchanged price only moves
+        last_price_update forward.
+        """
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
                 try:
                     # Get current price for comparison
-                    cursor.execute("SELECT current_price FROM products WHERE id = %s", (product_id,))
-                    current_price = cursor.fetchone()[0]
+                    cursor.execute(
+                        "SELECT current_price, platform FROM products WHERE id = %s FOR UPDATE", (product_id,)
+                    )
+                    current_price, platform = cursor.fetchone()
                     
                     # Update product price
                     cursor.execute("""
@@ -125,73 +340,484 @@ class DatabaseManager:
                     """, (new_price, product_id))
                     
                     # Record price change
-                    price_change_type = 'new' if current_price is None else (
-                        'increase' if new_price > current_price else (
-                            'decrease' if new_price < current_price else 'stable'
-                        )
-                    )
-                    
-                    cursor.execute("""
-                        INSERT INTO price_history (product_id, price, currency, platform, price_change_type)
-                        SELECT %s, %s, %s, platform, %s FROM products WHERE id = %s
-                    """, (product_id, new_price, currency, price_change_type, product_id))
+                    changed = not self._values_equal(new_price, current_price)
+                    if changed:
+                        self._record_price_changes(cursor, [(
+                            product_id, new_price, currency, platform,
+                            self._price_change_type(current_price, new_price)
+                        )])
                     
                     conn.commit()
-                    logger.info(f"Updated price for product {product_id}: {current_price} -> {new_price}")
+                    self._invalidate_products([product_id])
+                    if changed:
+                        logger.info(f"Updated price for product {product_id}: {current_price} -> {new_price}")
+                    else:
+                        logger.debug(f"Price unchanged for product {product_id}: {new_price}")
                     
                 except Exception as e:
                     conn.rollback()
                     logger.error(f"Failed to update product price: {e}")
                     raise
     
-    def insert_product_specifications(self, product_id: str, specifications: Dict[str, Any]):
-        """Insert product specifications"""
-        query = """
-        INSERT INTO product_specifications (product_id, spec_name, spec_value, spec_category)
-        VALUES (%s, %s, %s, %s)
+    def insert_product_specifications(self, product_id: Union[str, Dict[str, Dict[str, Any]]],
+                                      specifications: Optional[Dict[str, Any]] = None) -> int:
         """
+        Insert product specifications with one multi-row statement.
         
+        Takes a single product as (product_id, specifications) or many products as a
+        {product_id: specifications} mapping. Returns the number of rows written.
+        """
+        return self._insert_children('specifications', product_id, specifications)
+    
+    def insert_product_images(self, product_id: Union[str, Dict[str, List[Dict[str, Any]]]],
+                              images: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Insert product images with one multi-row statement.
+        
+        Takes a single product as (product_id, images) or many products as a
+        {product_id: images} mapping. Returns the number of rows written.
+        """
+        return self._insert_children('images', product_id, images)
+    
+    def insert_product_variations(self, product_id: Union[str, Dict[str, List[Dict[str, Any]]]],
+                                  variations: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Insert product variations with one multi-row statement.
+        
+        Takes a single product as (product_id, variations) or many products as a
+        {product_id: variations} mapping. Returns the number of rows written.
+        """
+        return self._insert_children('variations', product_id, variations)
+    
+    def _insert_children(self, kind: str, product_id, values) -> int:
+        """Write one kind of child rows for one or many products in a single transaction"""
+        by_product = product_id if isinstance(product_id, dict) else {product_id: values}
+        targets = {kind: {pid: {kind: children} for pid, children in by_product.items()}}
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    counts = self._insert_child_rows(cursor, targets)
+                    conn.commit()
+                    return counts[kind]
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Failed to insert product {kind}: {e}")
+                    raise
+    
+    def upsert_product(self, product_data: Dict[str, Any]) -> Optional[str]:
+        """Insert or update a single product keyed on (platform, external_id)"""
+        result = self.upsert_products([product_data])
+        outcome = result.get(self._product_key(product_data))
+        return outcome['id'] if outcome else None
+    
+    def upsert_products(self, products: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Insert or update a batch of products keyed on (platform, external_id).
+        
+        Existing rows are locked and compared in Python: only columns whose value changed
+        are written, price_history gets a row only when the price moved, and specifications,
+        images and variations are replaced only when the hash of their content differs.
+        Columns missing from a product dict are left untouched. A product another writer
+        inserts between the lookup and the insert is diffed like any existing one.
+        Returns a mapping of
+        (platform, external_id) -> {'id', 'action', 'changed'} where action is
+        'inserted', 'updated' or 'unchanged'.
+        """
+        # The last occurrence of a key in the batch wins
+        batch = {}
+        for product in products:
+            batch[self._product_key(product)] = product
+        if not batch:
+            return {}
+        
+        compare_columns = [column for column in PRODUCT_COLUMNS if column not in ('platform', 'external_id')]
+        hash_columns = [hash_column for _, _, hash_column, _ in CHILD_TABLES]
+        
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                try:
+                    existing = self._lock_products(cursor, list(batch.keys()), compare_columns + hash_columns)
+                    
+                    results = {}
+                    child_hashes = {key: self._child_hashes(product) for key, product in batch.items()}
+                    
+                    # New products
+                    new_keys = [key for key in batch if key not in existing]
+                    if new_keys:
+                        insert_columns = list(PRODUCT_COLUMNS) + hash_columns
+                        rows = [
+                            tuple(batch[key].get(column) for column in PRODUCT_COLUMNS)
+                            + tuple(child_hashes[key].get(hash_column) for hash_column in hash_columns)
+                            for key in new_keys
+                        ]
+                        inserted = execute_values(cursor, f"""
+                            INSERT INTO products ({', '.join(insert_columns)})
+                            VALUES %s
+                            ON CONFLICT (platform, external_id) DO NOTHING
+                            RETURNING id, platform, external_id
+                        """, rows, page_size=len(rows), fetch=True)
+                        for row in inserted:
+                            results[(row['platform'], row['external_id'])] = {
+                                'id': row['id'], 'action': 'inserted', 'changed': list(insert_columns)
+                            }
+                        
+                        # Keys another writer inserted since the lookup: lock and diff them instead
+                        raced = [key for key in new_keys if key not in results]
+                        if raced:
+                            existing.update(self._lock_products(cursor, raced, compare_columns + hash_columns))
+                    
+                    # Existing products: diff column by column
+                    updates_by_columns = {}
+                    for key, current in existing.items():
+                        product = batch[key]
+                        changed = [
+                            column for column in compare_columns
+                            if column in product and not self._values_equal(product[column], current[column])
+                        ]
+                        changed += [
+                            hash_column for hash_column, content_hash in child_hashes[key].items()
+                            if content_hash != current[hash_column]
+                        ]
+                        results[key] = {
+                            'id': current['id'],
+                            'action': 'updated' if changed else 'unchanged',
+                            'changed': changed,
+                        }
+                        if changed:
+                            values = {**product, **child_hashes[key]}
+                            updates_by_columns.setdefault(tuple(changed), []).append(
+                                (current['id'],) + tuple(values[column] for column in changed)
+                            )
+                    
+                    # One UPDATE ... FROM (VALUES ...) per distinct set of changed columns
+                    for columns, rows in updates_by_columns.items():
+                        assignments = [f"{column} = v.{column}" for column in columns]
+                        if 'current_price' in columns:
+                            assignments.append("last_price_update = NOW()")
+                        template = '(%s::uuid, ' + ', '.join(
+                            f"%s::{PRODUCT_COLUMN_TYPES[column]}" for column in columns
+                        ) + ')'
+                        execute_values(cursor, f"""
+                            UPDATE products AS p
+                            SET {', '.join(assignments)}, updated_at = NOW()
+                            FROM (VALUES %s) AS v(id, {', '.join(columns)})
+                            WHERE p.id = v.id
+                        """, rows, template=template, page_size=len(rows))
+                    
+                    # Price history only when the price actually moved
+                    price_rows = []
+                    for key, outcome in results.items():
+                        product = batch[key]
+                        if 'current_price' not in outcome['changed'] or product.get('current_price') is None:
+                            continue
+                        old_price = existing[key]['current_price'] if key in existing else None
+                        price_rows.append((
+                            outcome['id'],
+                            product['current_price'],
+                            product.get('currency') or 'USD',
+                            key[0],
+                            self._price_change_type(old_price, product['current_price'])
+                        ))
+                    self._record_price_changes(cursor, price_rows)
+                    
+                    # Child rows only for products whose content hash changed
+                    replace = {kind: {} for kind, _, _, _ in CHILD_TABLES}
+                    for key, outcome in results.items():
+                        for kind, _, hash_column, _ in CHILD_TABLES:
+                            if hash_column in outcome['changed']:
+                                replace[kind][outcome['id']] = batch[key]
+                    
+                    existing_ids = {row['id'] for row in existing.values()}
+                    for kind, table, _, _ in CHILD_TABLES:
+                        stale_ids = [product_id for product_id in replace[kind] if product_id in existing_ids]
+                        if stale_ids:
+                            cursor.execute(f"DELETE FROM {table} WHERE product_id = ANY(%s::uuid[])", (stale_ids,))
+                    row_counts = self._insert_child_rows(cursor, replace)
+                    
+                    conn.commit()
+                    self._invalidate_products(
+                        outcome['id'] for outcome in results.values() if outcome['action'] == 'updated'
+                    )
+                    
+                    actions = [outcome['action'] for outcome in results.values()]
+                    logger.info(
+                        f"Upserted {len(batch)} products: {actions.count('inserted')} inserted, "
+                        f"{actions.count('updated')} updated, {actions.count('unchanged')} unchanged, "
+                        f"{len(price_rows)} price changes "
+                        f"({', '.join(f'{count} {kind}' for kind, count in row_counts.items())})"
+                    )
+                    return results
+                    
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Failed to upsert products: {e}")
+                    raise
+    
+    @staticmethod
+    def _lock_products(cursor, keys: List[tuple], columns: List[str]) -> Dict[tuple, Dict[str, Any]]:
+        """Lock the products with the given (platform, external_id) keys; returns their rows by key"""
+        rows = execute_values(cursor, f"""
+            SELECT id, platform, external_id, {', '.join(columns)}
+            FROM products
+            WHERE (platform, external_id) IN (VALUES %s)
+            FOR UPDATE
+        """, keys, page_size=len(keys), fetch=True)
+        return {(row['platform'], row['external_id']): row for row in rows}
+    
+    def _insert_child_rows(self, cursor, targets: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Write specification, image and variation rows with one statement per table.
+        
+        targets maps each child kind ('specifications', 'images', 'variations') to a
+        {product_id: product dict} mapping of the products whose rows should be written.
+        Returns the number of rows written per kind.
+        """
+        builders = {
+            'specifications': self._specification_rows,
+            'images': self._image_rows,
+            'variations': self._variation_rows,
+        }
+        counts = {}
+        for kind, table, _, query in CHILD_TABLES:
+            empty = {} if kind == 'specifications' else []
+            rows = []
+            for product_id, product in targets.get(kind, {}).items():
+                rows.extend(builders[kind](product_id, product.get(kind) or empty))
+            if rows:
+                execute_values(cursor, query, rows, page_size=len(rows))
+            counts[kind] = len(rows)
+        return counts
+    
+    @staticmethod
+    def _product_key(product: Dict[str, Any]) -> tuple:
+        return (product.get('platform'), product.get('external_id'))
+    
+    def _child_hashes(self, product: Dict[str, Any]) -> Dict[str, str]:
+        """Content hashes of the child collections present in the product dict"""
+        builders = {
+            'specifications': self._specification_rows,
+            'images': self._image_rows,
+            'variations': self._variation_rows,
+        }
+        hashes = {}
+        for kind, _, hash_column, _ in CHILD_TABLES:
+            if kind not in product:
+                continue
+            rows = builders[kind](None, product.get(kind) or ({} if kind == 'specifications' else []))
+            payload = json.dumps([list(row[1:]) for row in rows], sort_keys=True, default=str)
+            hashes[hash_column] = hashlib.md5(payload.encode('utf-8')).hexdigest()
+        return hashes
+    
+    @staticmethod
+    def _values_equal(new_value: Any, old_value: Any) -> bool:
+        """Compare a scraped value with the stored one, ignoring numeric representation"""
+        if new_value is None or old_value is None:
+            return new_value is None and old_value is None
+        if isinstance(new_value, (int, float, Decimal)) and isinstance(old_value, (int, float, Decimal)):
+            return round(float(new_value), 2) == round(float(old_value), 2)
+        if isinstance(new_value, (list, tuple)) and isinstance(old_value, (list, tuple)):
+            return list(new_value) == list(old_value)
+        return new_value == old_value
+    
+    @staticmethod
+    def _record_price_changes(cursor, rows: List[tuple]):
+        """
+        Close each product's open price_history row and open one at the new price.
+        
+        rows are (product_id, price, currency, platform, price_change_type). Both
+        statements use the transaction's NOW(), so consecutive intervals meet exactly.
+        """
+        if not rows:
+            return
+        cursor.execute("""
+            UPDATE price_history SET valid_until = NOW()
+            WHERE valid_until IS NULL AND product_id = ANY(%s::uuid[])
+        """, ([str(row[0]) for row in rows],))
+        execute_values(cursor, """
+            INSERT INTO price_history (product_id, price, currency, platform, price_change_type)
+            VALUES %s
+        """, rows, page_size=len(rows))
+    
+    @staticmethod
+    def _price_change_type(old_price: Any, new_price: Any) -> str:
+        if old_price is None:
+            return 'new'
+        if new_price > old_price:
+            return 'increase'
+        if new_price < old_price:
+            return 'decrease'
+        return 'stable'
+    
+    @staticmethod
+    def _specification_rows(product_id: str, specifications: Dict[str, Any]) -> List[tuple]:
+        """Flatten a specifications dict into product_specifications rows"""
+        rows = []
         for spec_name, spec_value in specifications.items():
             if isinstance(spec_value, dict):
                 for category, specs in spec_value.items():
                     for name, value in specs.items():
-                        self.execute_query(query, (product_id, name, str(value), category))
+                        rows.append((product_id, name, str(value), category))
             else:
-                self.execute_query(query, (product_id, spec_name, str(spec_value), 'general'))
+                rows.append((product_id, spec_name, str(spec_value), 'general'))
+        return rows
     
-    def insert_product_images(self, product_id: str, images: List[Dict[str, Any]]):
-        """Insert product images"""
-        query = """
-        INSERT INTO product_images (product_id, image_url, image_type, alt_text)
-        VALUES (%s, %s, %s, %s)
-        """
-        
-        for image in images:
-            self.execute_query(query, (
+    @staticmethod
+    def _image_rows(product_id: str, images: List[Dict[str, Any]]) -> List[tuple]:
+        """Build product_images rows"""
+        return [
+            (
                 product_id,
                 image.get('url'),
                 image.get('type', 'gallery'),
-                image.get('alt_text', '')
-            ))
+                image.get('alt_text', ''),
+                bool(image.get('downloaded', False)),
+                image.get('local_path'),
+                image.get('file_size'),
+                image.get('width'),
+                image.get('height')
+            )
+            for image in images
+        ]
     
-    def insert_product_variations(self, product_id: str, variations: List[Dict[str, Any]]):
-        """Insert product variations"""
-        query = """
-        INSERT INTO product_variations (product_id, variation_type, variation_value, variation_price, availability_status)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        
-        for variation in variations:
-            self.execute_query(query, (
+    @staticmethod
+    def _variation_rows(product_id: str, variations: List[Dict[str, Any]]) -> List[tuple]:
+        """Build product_variations rows"""
+        return [
+            (
                 product_id,
                 variation.get('type'),
                 variation.get('value'),
                 variation.get('price'),
                 variation.get('availability', 'in_stock')
-            ))
+            )
+            for variation in variations
+        ]
     
-    def get_products_for_price_update(self, platform: str = None, limit: int = 1000) -> List[Dict[str, Any]]:
-        """Get products that need price updates"""
+    def iter_query(self, query, params: tuple = None, fetch_size: Optional[int] = None,
+                   row_format: str = 'namedtuple') -> Iterator[Any]:
+        """
+        Stream query results through a named server-side cursor.
+        
+        Rows are fetched from the server fetch_size at a time (DB_FETCH_SIZE by default),
+        so memory stays constant however large the result is. row_format selects plain
+        tuples, namedtuples (slotted, attribute access) or dicts. The connection and its
+        read transaction are held until the generator is exhausted or closed.
+        """
+        if row_format not in ROW_CURSOR_FACTORIES:
+            raise ValueError(f"Unsupported row format: {row_format}")
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}",
+                                 cursor_factory=ROW_CURSOR_FACTORIES[row_format])
+            cursor.itersize = fetch_size or self.config.fetch_size
+            try:
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield row
+            finally:
+                try:
+                    cursor.close()
+                finally:
+                    conn.rollback()
+    
+    def iter_products(self, platform: str = None, category: str = None, active_only: bool = True,
+                      columns: Optional[Iterable[str]] = None, fetch_size: Optional[int] = None,
+                      row_format: str = 'namedtuple', updated_since: Optional[datetime] = None) -> Iterator[Any]:
+        """
+        Stream products, optionally filtered by platform, category and last
+        update, selecting only the given columns
+        """
+        select = sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL('*')
+        conditions = []
+        params = []
+        if active_only:
+            conditions.append(sql.SQL("is_active = TRUE"))
+        if platform:
+            conditions.append(sql.SQL("platform = %s"))
+            params.append(platform)
+        if category:
+            conditions.append(sql.SQL("category = %s"))
+            params.append(category)
+        if updated_since:
+            conditions.append(sql.SQL("updated_at > %s"))
+            params.append(updated_since)
+        
+        query = sql.SQL("SELECT {} FROM products").format(select)
+        if conditions:
+            query = sql.SQL("{} WHERE {}").format(query, sql.SQL(' AND ').join(conditions))
+        
+        return self.iter_query(query, tuple(params), fetch_size=fetch_size, row_format=row_format)
+    
+    def iter_product_batches(self, active_only: bool = True, columns: Optional[Iterable[str]] = None,
+                             updated_since: Optional[datetime] = None, batch_size: Optional[int] = None,
+                             row_format: str = 'namedtuple') -> Iterator[List[Any]]:
+        """
+        Products updated after updated_since, in (updated_at, id) order, as lists of up
+        to batch_size rows (DB_FETCH_SIZE by default).
+        
+        Each batch is its own keyset query on a connection returned to the pool before
+        the batch is yielded, so unlike iter_products no connection or transaction is
+        held while the caller works on a batch. columns always include id and updated_at;
+        rows are namedtuples or dicts.
+        """
+        if row_format not in ('namedtuple', 'dict'):
+            raise ValueError(f"Unsupported row format: {row_format}")
+        
+        columns = list(columns) if columns else None
+        if columns:
+            columns += [column for column in ('id', 'updated_at') if column not in columns]
+        select = sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL('*')
+        batch_size = batch_size or self.config.fetch_size
+        last = None
+        while True:
+            conditions = []
+            params = []
+            if active_only:
+                conditions.append(sql.SQL("is_active = TRUE"))
+            if last is not None:
+                conditions.append(sql.SQL("(updated_at, id) > (%s, %s)"))
+                params.extend(last)
+            elif updated_since:
+                conditions.append(sql.SQL("updated_at > %s"))
+                params.append(updated_since)
+            query = sql.SQL("SELECT {} FROM products").format(select)
+            if conditions:
+                query = sql.SQL("{} WHERE {}").format(query, sql.SQL(' AND ').join(conditions))
+            query = sql.SQL("{} ORDER BY updated_at, id LIMIT %s").format(query)
+            params.append(batch_size)
+            
+            with self.get_connection() as conn:
+                try:
+                    with conn.cursor(cursor_factory=ROW_CURSOR_FACTORIES[row_format]) as cursor:
+                        cursor.execute(query, tuple(params))
+                        batch = cursor.fetchall()
+                finally:
+                    conn.rollback()
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            tail = batch[-1]
+            last = (tail['updated_at'], tail['id']) if isinstance(tail, dict) else (tail.updated_at, tail.id)
+    
+    def get_all_products(self, active_only: bool = True) -> List[Dict[str, Any]]:
+        """Get all products; prefer iter_products for large catalogs"""
+        return list(self.iter_products(active_only=active_only, row_format='dict'))
+    
+    def get_products_by_platform(self, platform: str) -> List[Dict[str, Any]]:
+        """Get active products from a platform"""
+        return list(self.iter_products(platform=platform, row_format='dict'))
+    
+    def get_products_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """Get active products in a category"""
+        return list(self.iter_products(category=category, row_format='dict'))
+    
+    def iter_products_for_price_update(self, platform: str = None, limit: Optional[int] = None,
+                                       fetch_size: Optional[int] = None,
+                                       row_format: str = 'namedtuple') -> Iterator[Any]:
+        """Stream products that need price updates, least recently updated first"""
         query = """
         SELECT id, external_id, platform, product_url, current_price, last_price_update
         FROM products 
@@ -204,33 +830,165 @@ class DatabaseManager:
             query += " AND platform = %s"
             params.append(platform)
         
-        query += " ORDER BY last_price_update ASC NULLS FIRST LIMIT %s"
-        params.append(limit)
+        query += " ORDER BY last_price_update ASC NULLS FIRST"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
         
-        return self.execute_query(query, tuple(params), fetch=True)
+        return self.iter_query(query, tuple(params), fetch_size=fetch_size, row_format=row_format)
+    
+    def get_products_for_price_update(self, platform: str = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get products that need price updates"""
+        return list(self.iter_products_for_price_update(platform, limit, row_format='dict'))
     
     def get_curated_products(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get curated products meeting quality criteria"""
+        """
+        Get curated products meeting quality criteria.
+        
+        Child counts come from product_child_counts, kept current by triggers on the
+        child tables, so this is a range scan of idx_products_curated_rating plus one
+        primary-key lookup per returned product.
+        """
         query = """
         SELECT p.*, 
-               COUNT(DISTINCT pi.id) as image_count,
-               COUNT(DISTINCT ps.id) as spec_count,
-               COUNT(DISTINCT pv.id) as variation_count
+               COALESCE(c.image_count, 0) as image_count,
+               COALESCE(c.spec_count, 0) as spec_count,
+               COALESCE(c.variation_count, 0) as variation_count
         FROM products p
-        LEFT JOIN product_images pi ON p.id = pi.product_id
-        LEFT JOIN product_specifications ps ON p.id = ps.product_id
-        LEFT JOIN product_variations pv ON p.id = pv.product_id
+        LEFT JOIN product_child_counts c ON c.product_id = p.id
         WHERE p.is_active = TRUE 
             AND p.is_curated = TRUE
             AND p.availability_status = 'in_stock'
             AND p.rating >= 4.0
-        GROUP BY p.id
         ORDER BY p.rating DESC, p.review_count DESC
         LIMIT %s
         """
         
         return self.execute_query(query, (limit,), fetch=True)
     
+    def get_price_history(self, product_id: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get the price change points in effect between start and end, oldest first.
+        
+        Each row holds its price from recorded_at until valid_until; the open row
+        (valid_until NULL) is the current price. price_history is partitioned by month
+        on recorded_at, so an end bound skips the partitions after it and a start bound
+        the months before the last carried month. Rows restarted at a month boundary
+        by carry_open_prices are merged back into the change point they continue.
+        """
+        query = """
+        SELECT price, currency, platform, recorded_at, valid_until, price_change_type
+        FROM price_history
+        WHERE product_id = %s
+        """
+        params = [product_id]
+        if start:
+            query += f" AND (valid_until IS NULL OR valid_until > %s) AND recorded_at >= {CARRIED_MONTH_BOUND}"
+            params.extend([start, start])
+        if end:
+            query += " AND recorded_at < %s"
+            params.append(end)
+        query += " ORDER BY recorded_at"
+        
+        history = []
+        for row in self.execute_query(query, tuple(params), fetch=True):
+            previous = history[-1] if history else None
+            if (previous is not None and previous['valid_until'] == row['recorded_at']
+                    and previous['price'] == row['price'] and previous['currency'] == row['currency']):
+                previous['valid_until'] = row['valid_until']
+            else:
+                history.append(row)
+        return history
+    
+    def get_price_series(self, product_id: str, start: datetime, end: datetime,
+                         step: timedelta) -> List[Dict[str, Any]]:
+        """
+        Reconstruct a dense price series from the stored change points.
+        
+        Returns one {'timestamp', 'price'} entry per step from start up to end, with
+        the price in effect at that instant, or None before the first change point
+        and after the present.
+        """
+        if step <= timedelta(0):
+            raise ValueError("step must be positive")
+        
+        segments = self._price_segments(product_id, start, end)
+        series = []
+        index = 0
+        timestamp = start
+        while timestamp < end:
+            while index < len(segments) and segments[index][1] <= timestamp:
+                index += 1
+            price = None
+            if index < len(segments) and segments[index][0] <= timestamp:
+                price = segments[index][2]
+            series.append({'timestamp': timestamp, 'price': price})
+            timestamp += step
+        return series
+    
+    def get_price_aggregates(self, product_id: str, start: datetime, end: datetime,
+                             window: Optional[timedelta] = None) -> List[Dict[str, Any]]:
+        """
+        Min, max and time-weighted average price per window between start and end.
+        
+        Without a window the whole range is one window. avg weights each price by
+        how long it held within the window; windows with no known price get None
+        for every aggregate.
+        """
+        if window is not None and window <= timedelta(0):
+            raise ValueError("window must be positive")
+        
+        segments = self._price_segments(product_id, start, end)
+        aggregates = []
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + window, end) if window else end
+            prices = []
+            weighted = 0.0
+            covered = 0.0
+            for segment_start, segment_end, price in segments:
+                overlap = (min(segment_end, window_end) - max(segment_start, window_start)).total_seconds()
+                if overlap <= 0:
+                    continue
+                prices.append(price)
+                weighted += price * overlap
+                covered += overlap
+            aggregates.append({
+                'window_start': window_start,
+                'window_end': window_end,
+                'min': min(prices) if prices else None,
+                'max': max(prices) if prices else None,
+                'avg': round(weighted / covered, 2) if covered else None,
+                'price_points': len(prices),
+            })
+            window_start = window_end
+        return aggregates
+    
+    def _price_segments(self, product_id: str, start: datetime, end: datetime) -> List[tuple]:
+        """(from, until, price) intervals clipped to [start, end), oldest first"""
+        rows = self.execute_query(f"""
+            SELECT price, recorded_at, COALESCE(valid_until, LOCALTIMESTAMP) AS held_until
+            FROM price_history
+            WHERE product_id = %s AND recorded_at < %s
+              AND (valid_until IS NULL OR valid_until > %s) AND recorded_at >= {CARRIED_MONTH_BOUND}
+            ORDER BY recorded_at
+        """, (product_id, end, start, start), fetch=True)
+        
+        segments = []
+        for row in rows:
+            segment_start = max(row['recorded_at'], start)
+            segment_end = min(row['held_until'], end)
+            if segment_end <= segment_start:
+                continue
+            price = float(row['price'])
+            if segments and segments[-1][1] == segment_start and segments[-1][2] == price:
+                # A price carried into a new month continues the same segment
+                segments[-1] = (segments[-1][0], segment_end, price)
+            else:
+                segments.append((segment_start, segment_end, price))
+        return segments
+    
     def log_scraping_session(self, platform: str, spider_name: str, start_time: datetime, 
                            status: str = 'running', products_scraped: int = 0, 
                            errors_count: int = 0, error_details: str = None) -> str:
@@ -252,23 +1010,47 @@ class DatabaseManager:
     
     def close_pool(self):
         """Close connection pool"""
+        if self.product_cache:
+            cache_stats = self.product_cache.stats()
+            logger.info(f"Product cache hit rate: {cache_stats['hit_rate']:.1%} over {cache_stats['lookups']} lookups "
+                        f"({cache_stats['invalidations']} invalidations, {cache_stats['evictions']} evictions)")
+        for statement in self.query_stats.top(3):
+            logger.info(f"Top query by total time: {statement['total_ms']}ms over {statement['calls']} calls "
+                        f"(p95 {statement['execution_ms']['p95']}ms): {statement['template'][:120]}")
         if self.connection_pool:
+            stats = self.connection_pool.stats()
             self.connection_pool.closeall()
-            logger.info("Database connection pool closed")
+            logger.info(f"Database connection pool closed. Acquired: {stats['acquired']}, "
+                        f"Peak in use: {stats['peak_in_use']}/{stats['max_connections']}, "
+                        f"Timeouts: {stats['timeouts']}, p95 wait: {stats['wait_ms']['p95']}ms")
 
-# Global database manager instance
+# Global database manager, created on first use so that importing this
+# module never opens connections
 db_config = DatabaseConfig()
-db_manager = DatabaseManager(db_config)
+_db_manager: Optional[DatabaseManager] = None
+_db_manager_lock = threading.Lock()
 
 # Utility functions
 def get_db_manager() -> DatabaseManager:
-    """Get database manager instance"""
-    return db_manager
+    """Get database manager instance, initializing the connection pool on first call"""
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager(db_config)
+    return _db_manager
+
+def __getattr__(name: str):
+    # Keeps `from database.db_manager import db_manager` working without
+    # connecting at import time
+    if name == 'db_manager':
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def test_connection() -> bool:
     """Test database connection"""
     try:
-        with db_manager.get_connection() as conn:
+        with get_db_manager().get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT 1")
                 result = cursor.fetchone()
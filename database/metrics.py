@@ -0,0 +1,72 @@
+"""
+Latency metrics shared by the database layer and the scraping pipelines
+"""
+import math
+from typing import Dict
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory latency histogram with logarithmic buckets.
+
+    Buckets grow by 2**(1/8) (about 9%), so percentiles are accurate to within
+    a few percent from one microsecond up to several minutes, regardless of
+    how many samples are recorded.
+    """
+
+    BUCKETS_PER_DOUBLING = 8
+    MIN_SECONDS = 1e-6
+    NUM_BUCKETS = 8 * 28
+
+    def __init__(self):
+        self.buckets = [0] * (self.NUM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        index = int(math.log2(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DOUBLING) + 1
+        return min(index, self.NUM_BUCKETS)
+
+    def _bucket_midpoint(self, index: int) -> float:
+        # Geometric middle of the bucket, halving the worst-case error
+        return self.MIN_SECONDS * 2 ** ((index - 0.5) / self.BUCKETS_PER_DOUBLING)
+
+    def record(self, seconds: float):
+        self.buckets[self._bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Estimate of the pct-th percentile, clamped to the observed range"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * pct / 100.0))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(max(self._bucket_midpoint(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self, scale: float = 1000.0) -> Dict[str, float]:
+        """Summary in milliseconds by default"""
+        return {
+            'count': self.count,
+            'mean': round(self.mean * scale, 3),
+            'min': round((self.min if self.count else 0.0) * scale, 3),
+            'p50': round(self.percentile(50) * scale, 3),
+            'p95': round(self.percentile(95) * scale, 3),
+            'p99': round(self.percentile(99) * scale, 3),
+            'max': round(self.max * scale, 3),
+            'total': round(self.total * scale, 3),
+        }
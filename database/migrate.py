@@ -0,0 +1,170 @@
+"""
+Versioned schema migrations for Unified E-commerce Product Data Aggregator
+
+Migrations are the numbered SQL files in database/migrations, applied in
+order, each in its own transaction, and recorded in schema_migrations.
+schema.sql is the baseline for a fresh database; run this afterwards (and
+after every deploy) to bring any database to the current version:
+
+    python -m database.migrate              # apply pending migrations
+    python -m database.migrate status       # list applied and pending versions
+    python -m database.migrate explain      # check query plans for seq scans
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from database.db_manager import DatabaseManager, get_db_manager
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Arbitrary key for the advisory lock that serialises concurrent migration runs
+MIGRATION_LOCK_ID = 7_146_201
+
+Migration = namedtuple('Migration', ['version', 'name', 'path', 'checksum'])
+
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Return the migrations in directory ordered by version"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def applied_migrations(db_manager: DatabaseManager) -> Dict[int, Dict]:
+    """Return {version: row} for every recorded migration"""
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            _ensure_migrations_table(cursor)
+            cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+            rows = cursor.fetchall()
+        conn.commit()
+    return {version: {'name': name, 'checksum': checksum, 'applied_at': applied_at}
+            for version, name, checksum, applied_at in rows}
+
+
+def migrate(db_manager: DatabaseManager, target: Optional[int] = None) -> List[Migration]:
+    """
+    Apply pending migrations up to target (default: all), returning those applied.
+
+    A session advisory lock keeps two processes from migrating at once; the
+    second waits and then finds nothing left to do.
+    """
+    applied = []
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                _ensure_migrations_table(cursor)
+                conn.commit()
+                cursor.execute("SELECT version, checksum FROM schema_migrations")
+                done = dict(cursor.fetchall())
+                conn.commit()
+
+                for migration in discover_migrations():
+                    if target is not None and migration.version > target:
+                        break
+                    if migration.version in done:
+                        if done[migration.version] != migration.checksum:
+                            logger.warning(f"Migration {migration.version:04d}_{migration.name} "
+                                           f"has changed since it was applied")
+                        continue
+
+                    with open(migration.path, encoding='utf-8') as f:
+                        statements = f.read()
+                    try:
+                        cursor.execute(statements)
+                        cursor.execute(
+                            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                            (migration.version, migration.name, migration.checksum)
+                        )
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error(f"Migration {migration.version:04d}_{migration.name} failed: {e}")
+                        raise
+
+                    logger.info(f"Applied migration {migration.version:04d}_{migration.name}")
+                    applied.append(migration)
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+
+    if not applied:
+        logger.info("Database schema is up to date")
+    return applied
+
+
+def print_status(db_manager: DatabaseManager):
+    applied = applied_migrations(db_manager)
+    for migration in discover_migrations():
+        row = applied.get(migration.version)
+        if row is None:
+            state = 'pending'
+        elif row['checksum'] != migration.checksum:
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M} (file changed since)"
+        else:
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M}"
+        print(f"{migration.version:04d}_{migration.name}: {state}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Manage database schema migrations')
+    subparsers = parser.add_subparsers(dest='command')
+
+    up = subparsers.add_parser('migrate', help='Apply pending migrations (default)')
+    up.add_argument('--target', type=int, help='Stop after this version')
+    subparsers.add_parser('status', help='Show applied and pending migrations')
+    explain = subparsers.add_parser('explain', help='EXPLAIN (ANALYZE) the DatabaseManager queries')
+    explain.add_argument('--min-rows', type=int, default=1000,
+                         help='Flag sequential scans reading at least this many rows')
+    explain.add_argument('--no-analyze', action='store_true',
+                         help='Use planner estimates instead of executing the queries')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        print_status(get_db_manager())
+        return 0
+    if args.command == 'explain':
+        from database.plan_check import run_plan_check
+        findings = run_plan_check(min_rows=args.min_rows, analyze=not args.no_analyze)
+        return 1 if findings else 0
+
+    migrate(get_db_manager(), getattr(args, 'target', None))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
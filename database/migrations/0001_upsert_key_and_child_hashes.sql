@@ -0,0 +1,19 @@
+-- Products are keyed by (platform, external_id) for upserts, and carry
+-- content hashes of their child rows so unchanged children are not rewritten.
+-- Brings databases created from the original schema.sql up to date.
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS specs_hash VARCHAR(32);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS images_hash VARCHAR(32);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS variations_hash VARCHAR(32);
+
+ALTER TABLE products DROP CONSTRAINT IF EXISTS products_external_id_key;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_products_platform_external_id'
+    ) THEN
+        ALTER TABLE products
+            ADD CONSTRAINT uq_products_platform_external_id UNIQUE (platform, external_id);
+    END IF;
+END $$;
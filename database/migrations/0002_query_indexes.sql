@@ -0,0 +1,22 @@
+-- Indexes backing the hot queries in DatabaseManager.
+
+-- get_products_for_price_update: active products, stalest price first,
+-- with and without a platform filter
+CREATE INDEX IF NOT EXISTS idx_products_price_update
+    ON products (last_price_update ASC NULLS FIRST)
+    WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_products_platform_price_update
+    ON products (platform, last_price_update ASC NULLS FIRST)
+    WHERE is_active = TRUE;
+
+-- get_curated_products: curated, in-stock products ordered by rating
+CREATE INDEX IF NOT EXISTS idx_products_curated_rating
+    ON products (rating DESC, review_count DESC)
+    WHERE is_active = TRUE AND is_curated = TRUE AND availability_status = 'in_stock';
+
+-- Price history is read per product in time order; the composite index
+-- also covers lookups by product_id alone
+CREATE INDEX IF NOT EXISTS idx_price_history_product_recorded
+    ON price_history (product_id, recorded_at DESC);
+DROP INDEX IF EXISTS idx_price_history_product_id;
+
@@ -0,0 +1,107 @@
+-- Per-product child row counts, maintained by statement-level triggers on
+-- the child tables, so listings no longer LEFT JOIN all three child tables
+-- and COUNT(DISTINCT ...) over their cross product.
+
+CREATE TABLE IF NOT EXISTS product_child_counts (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    image_count INTEGER NOT NULL DEFAULT 0,
+    spec_count INTEGER NOT NULL DEFAULT 0,
+    variation_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- TG_ARGV[0] names the count column. Each statement applies one grouped
+-- change per product, so a batch insert costs one upsert per product rather
+-- than one per child row.
+CREATE OR REPLACE FUNCTION add_product_child_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    EXECUTE format(
+        'INSERT INTO product_child_counts AS c (product_id, %1$I)
+         SELECT product_id, COUNT(*) FROM new_rows WHERE product_id IS NOT NULL GROUP BY product_id
+         ON CONFLICT (product_id) DO UPDATE SET %1$I = c.%1$I + EXCLUDED.%1$I',
+        TG_ARGV[0]
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION subtract_product_child_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    EXECUTE format(
+        'UPDATE product_child_counts c SET %1$I = GREATEST(c.%1$I - d.n, 0)
+         FROM (SELECT product_id, COUNT(*) AS n FROM old_rows GROUP BY product_id) d
+         WHERE c.product_id = d.product_id',
+        TG_ARGV[0]
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_images_count_insert ON product_images;
+CREATE TRIGGER product_images_count_insert AFTER INSERT ON product_images
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION add_product_child_counts('image_count');
+DROP TRIGGER IF EXISTS product_images_count_delete ON product_images;
+CREATE TRIGGER product_images_count_delete AFTER DELETE ON product_images
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION subtract_product_child_counts('image_count');
+
+DROP TRIGGER IF EXISTS product_specifications_count_insert ON product_specifications;
+CREATE TRIGGER product_specifications_count_insert AFTER INSERT ON product_specifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION add_product_child_counts('spec_count');
+DROP TRIGGER IF EXISTS product_specifications_count_delete ON product_specifications;
+CREATE TRIGGER product_specifications_count_delete AFTER DELETE ON product_specifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION subtract_product_child_counts('spec_count');
+
+DROP TRIGGER IF EXISTS product_variations_count_insert ON product_variations;
+CREATE TRIGGER product_variations_count_insert AFTER INSERT ON product_variations
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION add_product_child_counts('variation_count');
+DROP TRIGGER IF EXISTS product_variations_count_delete ON product_variations;
+CREATE TRIGGER product_variations_count_delete AFTER DELETE ON product_variations
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION subtract_product_child_counts('variation_count');
+
+-- Backfill from the existing rows. The child tables are locked so no write
+-- can slip in between the count and the triggers taking over.
+LOCK TABLE product_images, product_specifications, product_variations IN SHARE MODE;
+
+INSERT INTO product_child_counts (product_id, image_count, spec_count, variation_count)
+SELECT p.id, COALESCE(pi.n, 0), COALESCE(ps.n, 0), COALESCE(pv.n, 0)
+FROM products p
+LEFT JOIN (SELECT product_id, COUNT(*) AS n FROM product_images GROUP BY product_id) pi ON pi.product_id = p.id
+LEFT JOIN (SELECT product_id, COUNT(*) AS n FROM product_specifications GROUP BY product_id) ps ON ps.product_id = p.id
+LEFT JOIN (SELECT product_id, COUNT(*) AS n FROM product_variations GROUP BY product_id) pv ON pv.product_id = p.id
+ON CONFLICT (product_id) DO UPDATE SET
+    image_count = EXCLUDED.image_count,
+    spec_count = EXCLUDED.spec_count,
+    variation_count = EXCLUDED.variation_count;
+
+-- Listing views read the maintained counts
+DROP VIEW IF EXISTS active_products;
+CREATE VIEW active_products AS
+SELECT
+    p.*,
+    COALESCE(c.image_count, 0) AS image_count,
+    COALESCE(c.spec_count, 0) AS spec_count,
+    COALESCE(c.variation_count, 0) AS variation_count
+FROM products p
+LEFT JOIN product_child_counts c ON c.product_id = p.id
+WHERE p.is_active = TRUE;
+
+DROP VIEW IF EXISTS curated_products;
+CREATE VIEW curated_products AS
+SELECT
+    p.*,
+    COALESCE(c.image_count, 0) AS image_count,
+    COALESCE(c.spec_count, 0) AS spec_count,
+    COALESCE(c.variation_count, 0) AS variation_count
+FROM products p
+LEFT JOIN product_child_counts c ON c.product_id = p.id
+WHERE p.is_active = TRUE
+    AND p.is_curated = TRUE
+    AND p.availability_status = 'in_stock'
+    AND p.rating >= 4.0;
@@ -0,0 +1,75 @@
+-- price_history becomes range-partitioned by month on recorded_at so that
+-- inserts and recent-history reads only touch small, recent partitions and
+-- old months can be detached and archived whole.
+-- database/partitions.py pre-creates upcoming months and archives expired
+-- ones; rows outside every monthly partition land in price_history_default.
+
+ALTER TABLE price_history RENAME TO price_history_unpartitioned;
+
+CREATE TABLE price_history (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    product_id UUID REFERENCES products(id) ON DELETE CASCADE,
+    price DECIMAL(10,2) NOT NULL,
+    currency VARCHAR(3) DEFAULT 'USD',
+    platform VARCHAR(50) NOT NULL,
+    recorded_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    price_change_type VARCHAR(20) CHECK (price_change_type IN ('increase', 'decrease', 'stable', 'new'))
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE price_history_default PARTITION OF price_history DEFAULT;
+
+-- Creates the partition for the month containing month_start, moving any
+-- rows for that month out of the default partition first. Returns the new
+-- partition's name, or NULL if it already existed.
+CREATE OR REPLACE FUNCTION ensure_price_history_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month_start)::date;
+    end_at DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    partition_name TEXT := 'price_history_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('price_history_partitions'));
+
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE price_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                   partition_name);
+    EXECUTE format('WITH moved AS (
+                        DELETE FROM price_history_default
+                        WHERE recorded_at >= %L AND recorded_at < %L
+                        RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved',
+                   start_at, end_at, partition_name);
+    EXECUTE format('ALTER TABLE price_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, start_at, end_at);
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions from the oldest existing row up to three months ahead
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    month_start := date_trunc('month', COALESCE(
+        (SELECT MIN(recorded_at) FROM price_history_unpartitioned), NOW()
+    ))::date;
+    WHILE month_start <= date_trunc('month', NOW() + INTERVAL '3 months') LOOP
+        PERFORM ensure_price_history_partition(month_start);
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+END $$;
+
+INSERT INTO price_history (id, product_id, price, currency, platform, recorded_at, price_change_type)
+SELECT id, product_id, price, currency, platform, COALESCE(recorded_at, NOW()), price_change_type
+FROM price_history_unpartitioned;
+
+DROP TABLE price_history_unpartitioned;
+
+-- Created after the copy, and after the old table's names were freed
+ALTER TABLE price_history ADD PRIMARY KEY (id, recorded_at);
+CREATE INDEX idx_price_history_product_recorded ON price_history (product_id, recorded_at DESC);
+CREATE INDEX idx_price_history_recorded_at ON price_history (recorded_at);
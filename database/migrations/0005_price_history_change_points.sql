@@ -0,0 +1,36 @@
+-- price_history keeps only change points: one row per price a product held,
+-- valid from recorded_at until valid_until. The open row (valid_until IS
+-- NULL) is the current price; a check that finds the same price writes
+-- nothing here and only bumps products.last_price_update.
+-- A row's partition is chosen by recorded_at, when the price took effect.
+-- The space freed by the compaction below is only returned to the OS by
+-- VACUUM FULL price_history, which cannot run inside this transaction.
+
+ALTER TABLE price_history ADD COLUMN valid_until TIMESTAMP;
+
+-- Drop checks that repeated the previous price (and currency)
+WITH ordered AS (
+    SELECT id, recorded_at,
+           price IS NOT DISTINCT FROM LAG(price) OVER w
+               AND currency IS NOT DISTINCT FROM LAG(currency) OVER w
+               AND LAG(id) OVER w IS NOT NULL AS repeated
+    FROM price_history
+    WINDOW w AS (PARTITION BY product_id ORDER BY recorded_at, id)
+)
+DELETE FROM price_history h
+USING ordered o
+WHERE h.id = o.id AND h.recorded_at = o.recorded_at AND o.repeated;
+
+-- Close each remaining row where the next change begins
+WITH ordered AS (
+    SELECT id, recorded_at,
+           LEAD(recorded_at) OVER (PARTITION BY product_id ORDER BY recorded_at, id) AS next_recorded_at
+    FROM price_history
+)
+UPDATE price_history h
+SET valid_until = o.next_recorded_at
+FROM ordered o
+WHERE h.id = o.id AND h.recorded_at = o.recorded_at AND o.next_recorded_at IS NOT NULL;
+
+-- Finds the open row to close when the price changes
+CREATE INDEX idx_price_history_open ON price_history (product_id) WHERE valid_until IS NULL;
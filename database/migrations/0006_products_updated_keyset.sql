@@ -0,0 +1,11 @@
+-- DatabaseManager.iter_product_batches pages through products in
+-- (updated_at, id) order, one short query per batch. The composite index
+-- serves each page as a range scan and also covers lookups by updated_at
+-- alone. A NULL updated_at would drop out of the keyset comparison, so the
+-- column is filled and made NOT NULL (it already defaults to NOW()).
+
+UPDATE products SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+ALTER TABLE products ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_products_updated_at_id ON products (updated_at, id);
+DROP INDEX IF EXISTS idx_products_updated_at;
@@ -0,0 +1,11 @@
+-- PriceHistoryPartitionManager.carry_open_prices closes the prices still in
+-- effect when a month begins and restarts them at its first instant, and
+-- records the month here. For a recorded month no earlier row is in effect
+-- after it begins, so readers asking for prices from some time on only need
+-- rows recorded since the latest recorded month before it; the bound on
+-- recorded_at lets PostgreSQL prune the older partitions.
+
+CREATE TABLE IF NOT EXISTS price_history_carried_months (
+    month DATE PRIMARY KEY,
+    carried_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
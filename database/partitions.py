@@ -0,0 +1,237 @@
+"""
+Monthly partition management for price_history
+"""
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from psycopg2 import sql
+
+from database.db_manager import DatabaseManager, get_db_manager
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_RE = re.compile(r'^price_history_(\d{4})_(\d{2})$')
+
+
+def month_start(value: date, offset: int = 0) -> date:
+    """First day of the month containing value, shifted by offset months"""
+    index = value.year * 12 + value.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PriceHistoryPartitionManager:
+    """
+    Keeps price_history's monthly partitions in shape.
+
+    ``ensure_partitions`` creates the current month and ``premake_months``
+    ahead, so inserts never fall through to the default partition.
+    ``archive_expired`` detaches months that ended before the retention
+    window and, with an ``archive_dir``, streams each one to a gzipped CSV
+    file and drops it; without one the detached table is moved to the
+    ``archive`` schema. Prices still in effect when an archived month ended
+    are carried into the next month first. ``carry_open_prices`` does the
+    same at every month boundary up to the current month, so readers can
+    bound ``recorded_at`` from below as well. Queries that bound
+    ``recorded_at`` are routed to the matching partitions by PostgreSQL's
+    partition pruning.
+    """
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, retention_months: Optional[int] = None,
+                 premake_months: Optional[int] = None, archive_dir: Optional[str] = None):
+        self.db_manager = db_manager or get_db_manager()
+        config = self.db_manager.config
+        self.retention_months = config.price_history_retention_months if retention_months is None else retention_months
+        self.premake_months = config.price_history_premake_months if premake_months is None else premake_months
+        self.archive_dir = config.price_history_archive_dir if archive_dir is None else archive_dir
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """Monthly price_history tables, attached or detached, oldest first"""
+        rows = self.db_manager.execute_query("""
+            SELECT c.relname AS name, i.inhparent IS NOT NULL AS attached
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = current_schema()
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'price_history'::regclass
+            WHERE c.relkind = 'r' AND c.relname ~ '^price_history_[0-9]{4}_[0-9]{2}$'
+        """, fetch=True)
+
+        partitions = []
+        for row in rows:
+            match = _PARTITION_RE.match(row['name'])
+            start = date(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append({'name': row['name'], 'start': start, 'end': month_start(start, 1),
+                               'attached': row['attached']})
+        return sorted(partitions, key=lambda partition: partition['start'])
+
+    def ensure_partitions(self, today: Optional[date] = None) -> List[str]:
+        """Create the partitions for this month and the next premake_months; returns those created"""
+        current = month_start(today or date.today())
+        created = []
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for offset in range(self.premake_months + 1):
+                    cursor.execute("SELECT ensure_price_history_partition(%s)", (month_start(current, offset),))
+                    name = cursor.fetchone()[0]
+                    conn.commit()
+                    if name:
+                        created.append(name)
+                        logger.info(f"Created price history partition {name}")
+        return created
+
+    def carry_open_prices(self, today: Optional[date] = None, chunk_size: int = 1000) -> int:
+        """
+        Restart the prices still in effect at each month boundary up to the start of
+        this month, for the months not carried yet; returns the number of prices
+        carried.
+
+        Writers lock a product's row before they touch its price history, so products
+        are carried under the same lock, chunk_size at a time. A month is recorded in
+        price_history_carried_months once all of its products are carried.
+        """
+        current = month_start(today or date.today())
+        carried_months = {row['month'] for row in self.db_manager.execute_query(
+            "SELECT month FROM price_history_carried_months", fetch=True
+        )}
+        boundaries = [partition['start'] for partition in self.list_partitions()
+                      if partition['attached'] and partition['start'] <= current]
+
+        total = 0
+        previous = date.min
+        for boundary in boundaries:
+            if boundary in carried_months:
+                previous = boundary
+                continue
+            bounds = {'boundary': boundary, 'previous': previous}
+            product_ids = [str(row['product_id']) for row in self.db_manager.execute_query("""
+                SELECT DISTINCT product_id FROM price_history
+                WHERE recorded_at >= %(previous)s AND recorded_at < %(boundary)s
+                  AND (valid_until IS NULL OR valid_until > %(boundary)s)
+            """, bounds, fetch=True)]
+
+            carried = 0
+            with self.db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    for offset in range(0, len(product_ids), chunk_size):
+                        chunk = product_ids[offset:offset + chunk_size]
+                        cursor.execute(
+                            "SELECT id FROM products WHERE id = ANY(%s::uuid[]) ORDER BY id FOR UPDATE", (chunk,)
+                        )
+                        cursor.execute("""
+                            WITH spanning AS (
+                                UPDATE price_history h SET valid_until = %(boundary)s
+                                FROM (
+                                    SELECT id, recorded_at, valid_until FROM price_history
+                                    WHERE product_id = ANY(%(ids)s::uuid[])
+                                      AND recorded_at >= %(previous)s AND recorded_at < %(boundary)s
+                                      AND (valid_until IS NULL OR valid_until > %(boundary)s)
+                                ) o
+                                WHERE h.id = o.id AND h.recorded_at = o.recorded_at
+                                  AND h.recorded_at >= %(previous)s AND h.recorded_at < %(boundary)s
+                                RETURNING h.product_id, h.price, h.currency, h.platform, o.valid_until
+                            )
+                            INSERT INTO price_history
+                                (product_id, price, currency, platform, recorded_at, valid_until, price_change_type)
+                            SELECT product_id, price, currency, platform, %(boundary)s, valid_until, 'stable'
+                            FROM spanning
+                        """, {**bounds, 'ids': chunk})
+                        carried += cursor.rowcount
+                        conn.commit()
+                    cursor.execute(
+                        "INSERT INTO price_history_carried_months (month) VALUES (%s) ON CONFLICT DO NOTHING",
+                        (boundary,)
+                    )
+                    conn.commit()
+            if carried:
+                logger.info(f"Carried {carried} prices into {boundary:%Y-%m}")
+            total += carried
+            previous = boundary
+        return total
+
+    def archive_expired(self, today: Optional[date] = None) -> List[str]:
+        """Detach and archive partitions that ended before the retention window; returns those archived"""
+        if self.retention_months <= 0:
+            return []
+
+        cutoff = month_start(today or date.today(), -self.retention_months)
+        archived = []
+        for partition in self.list_partitions():
+            if partition['end'] > cutoff:
+                break
+            try:
+                self._archive_partition(partition)
+                archived.append(partition['name'])
+            except Exception as e:
+                # A detached but unarchived table is picked up again next run
+                logger.error(f"Failed to archive price history partition {partition['name']}: {e}")
+        return archived
+
+    def _archive_partition(self, partition: Dict[str, Any]):
+        name = sql.Identifier(partition['name'])
+        if partition['attached']:
+            with self.db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    # Prices still in effect when the month ended restart in the next
+                    # month, so archiving never loses a product's current price
+                    cursor.execute(sql.SQL("""
+                        INSERT INTO price_history
+                            (product_id, price, currency, platform, recorded_at, valid_until, price_change_type)
+                        SELECT product_id, price, currency, platform, %(end)s, valid_until, 'stable'
+                        FROM {name}
+                        WHERE valid_until IS NULL OR valid_until > %(end)s
+                    """).format(name=name), {'end': partition['end']})
+                    carried = cursor.rowcount
+                    cursor.execute(sql.SQL("""
+                        UPDATE {name} SET valid_until = %(end)s
+                        WHERE valid_until IS NULL OR valid_until > %(end)s
+                    """).format(name=name), {'end': partition['end']})
+                    cursor.execute(sql.SQL("ALTER TABLE price_history DETACH PARTITION {}").format(name))
+                    conn.commit()
+            logger.info(f"Detached price history partition {partition['name']}, "
+                        f"carrying {carried} prices into {partition['end']:%Y-%m}")
+
+        if not self.archive_dir:
+            self.db_manager.execute_query("CREATE SCHEMA IF NOT EXISTS archive")
+            self.db_manager.execute_query(sql.SQL("ALTER TABLE {} SET SCHEMA archive").format(name))
+            logger.info(f"Moved price history partition {partition['name']} to the archive schema")
+            return
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{partition['name']}.csv.gz")
+        tmp_path = f"{path}.tmp"
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cursor:
+                with gzip.open(tmp_path, 'wb') as f:
+                    cursor.copy_expert(
+                        sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER true)").format(name).as_string(conn), f
+                    )
+                os.replace(tmp_path, path)
+                cursor.execute(sql.SQL("DROP TABLE {}").format(name))
+                conn.commit()
+        logger.info(f"Archived price history partition {partition['name']} to {path}")
+
+    def run_maintenance(self, today: Optional[date] = None) -> Dict[str, Any]:
+        """Pre-create upcoming partitions, carry open prices into this month and archive expired ones"""
+        created = self.ensure_partitions(today)
+        carried = self.carry_open_prices(today)
+        archived = self.archive_expired(today)
+        default_rows = self.db_manager.execute_query(
+            "SELECT COUNT(*) AS count FROM price_history_default", fetch=True
+        )[0]['count']
+        if default_rows:
+            logger.warning(f"{default_rows} price history rows are in the default partition")
+
+        return {
+            'created': created,
+            'carried': carried,
+            'archived': archived,
+            'partitions': len([p for p in self.list_partitions() if p['attached']]),
+            'default_partition_rows': default_rows,
+            'run_at': datetime.now().isoformat(),
+        }
+
+
+if __name__ == "__main__":
+    print(PriceHistoryPartitionManager().run_maintenance())
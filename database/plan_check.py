@@ -0,0 +1,247 @@
+"""
+Query plan checks for DatabaseManager
+
+Runs a representative workload of DatabaseManager calls against the
+configured database and EXPLAINs every statement they issue, flagging
+sequential scans over large tables. Each statement is explained under a
+savepoint and every transaction is rolled back, so the database is left
+unchanged. Run it through ``python -m database.migrate explain``.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from psycopg2 import extensions
+
+from database.db_manager import DatabaseConfig, DatabaseManager, db_config
+from database.pool import HealthCheckedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = (b'SELECT', b'INSERT', b'UPDATE', b'DELETE', b'WITH')
+
+# DatabaseManager plumbing skipped when attributing a statement to a method
+_PLUMBING = {'execute_query', 'iter_query', 'get_connection', '_insert_child_rows', '_insert_children',
+             '_record_price_changes', '_price_segments', 'load'}
+
+
+class PlanRecorder:
+    """Collects EXPLAIN output for statements issued while a workload step runs"""
+
+    def __init__(self, min_rows: int = 1000, analyze: bool = True):
+        self.min_rows = min_rows
+        self.analyze = analyze
+        self.step: Optional[str] = None
+        self.full_scan_expected = False
+        self.results: List[Dict[str, Any]] = []
+        self._table_rows: Dict[str, float] = {}
+
+    def explain(self, connection, statement: bytes):
+        if self.step is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+
+        options = b'ANALYZE, BUFFERS, FORMAT JSON' if self.analyze else b'FORMAT JSON'
+        cursor = extensions.cursor(connection)
+        try:
+            cursor.execute("SAVEPOINT plan_check")
+            try:
+                cursor.execute(b'EXPLAIN (' + options + b') ' + statement)
+                plan = cursor.fetchone()[0][0]
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT plan_check")
+                cursor.execute("RELEASE SAVEPOINT plan_check")
+            seq_scans = self._seq_scans(cursor, plan['Plan'])
+        except Exception as e:
+            logger.warning(f"Could not explain statement in {self.step}: {e}")
+            return
+        finally:
+            cursor.close()
+
+        self.results.append({
+            'step': self.step,
+            'caller': _caller(),
+            'statement': ' '.join(statement.decode('utf-8', 'replace').split())[:160],
+            'time_ms': plan.get('Execution Time', plan['Plan'].get('Total Cost')),
+            'seq_scans': seq_scans,
+            'flagged': [scan for scan in seq_scans
+                        if scan['rows'] >= self.min_rows and not self.full_scan_expected],
+        })
+
+    def _seq_scans(self, cursor, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        scans = []
+        if node.get('Node Type') == 'Seq Scan':
+            relation = node.get('Relation Name')
+            if self.analyze:
+                loops = node.get('Actual Loops', 1)
+                rows = (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * loops
+            else:
+                rows = self._estimated_table_rows(cursor, relation)
+            scans.append({'relation': relation, 'rows': rows, 'filter': node.get('Filter')})
+        for child in node.get('Plans', []):
+            scans.extend(self._seq_scans(cursor, child))
+        return scans
+
+    def _estimated_table_rows(self, cursor, relation: str) -> float:
+        if relation not in self._table_rows:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", (relation,))
+            row = cursor.fetchone()
+            self._table_rows[relation] = max(row[0], 0) if row else 0
+        return self._table_rows[relation]
+
+
+def _caller() -> str:
+    """Innermost DatabaseManager method on the stack, ignoring query plumbing"""
+    frame = sys._getframe(2)
+    plumbing = '?'
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.endswith('db_manager.py'):
+            if code.co_name not in _PLUMBING:
+                return code.co_name
+            plumbing = code.co_name
+        frame = frame.f_back
+    # Generators such as iter_query run after the method that created them returned
+    return plumbing
+
+
+_cursor_classes: Dict[type, type] = {}
+
+
+def _explaining_cursor(factory: type) -> type:
+    """Subclass of a cursor class that explains each statement before running it"""
+    if factory not in _cursor_classes:
+        class ExplainingCursor(factory):
+            def execute(self, query, vars=None):
+                self.connection.recorder.explain(self.connection, self.mogrify(query, vars))
+                return super().execute(query, vars)
+
+        _cursor_classes[factory] = ExplainingCursor
+    return _cursor_classes[factory]
+
+
+class PlanCheckConnection(extensions.connection):
+    """Connection whose cursors explain their statements and whose commits are no-ops"""
+
+    recorder: PlanRecorder = None
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _explaining_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        # Leave the transaction open; the pool rolls it back on return
+        pass
+
+
+class PlanCheckManager(DatabaseManager):
+    """DatabaseManager whose connections record query plans and never commit"""
+
+    def __init__(self, config: DatabaseConfig, recorder: PlanRecorder):
+        self.recorder = recorder
+        super().__init__(config)
+
+    def _initialize_pool(self):
+        connection_class = type('RecordingConnection', (PlanCheckConnection,), {'recorder': self.recorder})
+        self.connection_pool = HealthCheckedConnectionPool(
+            1, 2, self.config.get_connection_string(),
+            timeout=self.config.pool_timeout,
+            connection_factory=connection_class
+        )
+
+
+def default_workload(manager: DatabaseManager) -> List[Tuple[str, Callable[[], Any], bool]]:
+    """
+    (name, call, full_scan_expected) steps covering DatabaseManager's queries.
+
+    get_all_products, get_products_by_platform, get_products_by_category,
+    insert_product, upsert_product and insert_product_images/variations only
+    wrap methods that have steps, so they have no steps of their own.
+
+    Write steps reuse an existing product so they touch realistic rows; all
+    of their changes are rolled back.
+    """
+    sample = manager.execute_query(
+        "SELECT * FROM products WHERE is_active = TRUE ORDER BY updated_at DESC LIMIT 1", fetch=True
+    )
+    steps = [
+        ('get_products_for_price_update', lambda: manager.get_products_for_price_update(), False),
+        ('get_curated_products', lambda: manager.get_curated_products(), False),
+    ]
+    if not sample:
+        logger.warning("No products in the database; only read queries will be checked")
+        return steps
+
+    product = dict(sample[0])
+    product_id = str(product['id'])
+    price = float(product['current_price'] or 0)
+    changed = {column: product.get(column) for column in ('external_id', 'platform', 'title', 'product_url')}
+    changed.update({
+        'current_price': price + 1,
+        'specifications': {'Plan Check': 'yes'},
+        'images': [{'url': 'https://example.com/plan-check.jpg', 'type': 'primary'}],
+    })
+
+    month_ago = datetime.now() - timedelta(days=30)
+    steps += [
+        ('get_products_for_price_update(platform)',
+         lambda: manager.get_products_for_price_update(product['platform']), False),
+        ('get_product_by_id', lambda: manager.get_product_by_id(product_id), False),
+        ('iter_products(platform)',
+         lambda: list(islice(manager.iter_products(platform=product['platform'], columns=('id',)), 100)), True),
+        ('iter_product_batches',
+         lambda: list(islice(manager.iter_product_batches(columns=('id',), batch_size=100), 2)), False),
+        ('iter_products(category)',
+         lambda: list(islice(manager.iter_products(category=product['category'], columns=('id',)), 100)), True),
+        ('upsert_products', lambda: manager.upsert_products([changed]), False),
+        ('update_product', lambda: manager.update_product(product_id, {'title': f"{product['title']} (plan check)"}),
+         False),
+        ('update_product_price', lambda: manager.update_product_price(product_id, price + 2), False),
+        ('get_price_history', lambda: manager.get_price_history(product_id, month_ago, datetime.now()), False),
+        ('get_price_series',
+         lambda: manager.get_price_series(product_id, month_ago, datetime.now(), timedelta(hours=1)), False),
+        ('get_price_aggregates',
+         lambda: manager.get_price_aggregates(product_id, month_ago, datetime.now(), timedelta(days=1)), False),
+        ('insert_product_specifications',
+         lambda: manager.insert_product_specifications(product_id, {'Plan Check': 'yes'}), False),
+        ('log_scraping_session',
+         lambda: manager.log_scraping_session(product['platform'], 'plan_check', datetime.now()), False),
+    ]
+    return steps
+
+
+def run_plan_check(min_rows: int = 1000, analyze: bool = True,
+                   config: Optional[DatabaseConfig] = None) -> List[Dict[str, Any]]:
+    """Run the workload, print a plan report and return the statements with flagged scans"""
+    recorder = PlanRecorder(min_rows=min_rows, analyze=analyze)
+    manager = PlanCheckManager(config or db_config, recorder)
+    try:
+        for name, call, full_scan_expected in default_workload(manager):
+            recorder.step = name
+            recorder.full_scan_expected = full_scan_expected
+            try:
+                call()
+            except Exception as e:
+                logger.error(f"Plan check step {name} failed: {e}")
+            finally:
+                recorder.step = None
+    finally:
+        manager.close_pool()
+
+    unit = 'ms' if analyze else ' cost'
+    flagged = []
+    for result in recorder.results:
+        label = f"{result['step']} [{result['caller']}]: {result['time_ms']:.2f}{unit}"
+        if result['flagged']:
+            flagged.append(result)
+            scans = ', '.join(f"Seq Scan on {scan['relation']} ({scan['rows']:.0f} rows)"
+                              for scan in result['flagged'])
+            print(f"❌ {label} - {scans}\n    {result['statement']}")
+        else:
+            print(f"✅ {label}")
+
+    print(f"{len(recorder.results)} statements checked, {len(flagged)} with sequential scans "
+          f"over {min_rows} rows")
+    return flagged
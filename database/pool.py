@@ -0,0 +1,264 @@
+"""
+Thread-safe, health-checked PostgreSQL connection pool
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from database.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class HealthCheckedConnectionPool:
+    """
+    Connection pool safe to share between threads.
+
+    ``getconn`` blocks until a connection is free, opening new ones up to
+    ``maxconn``, and raises PoolTimeoutError after ``timeout`` seconds instead
+    of failing immediately when the pool is exhausted. On checkout a
+    connection is discarded if it is closed or older than ``max_lifetime``,
+    and one that sat idle longer than ``validate_idle`` seconds is pinged with
+    ``SELECT 1`` first. Connections come back rolled back to an idle
+    transaction state. Idle connections are reused most-recently-returned
+    first, so surplus ones age out through ``max_lifetime``. Waiters are
+    served in arrival order, so a burst of new requests cannot starve a
+    thread that is already queued.
+
+    Connecting, pinging and rolling back happen outside the pool lock.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, dsn: str, timeout: float = 30.0,
+                 max_lifetime: float = 1800.0, validate_idle: float = 30.0, connection_factory=None):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_idle = validate_idle
+        self.connection_factory = connection_factory
+        self.closed = False
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, returned_at)
+        self._created_at: Dict[int, float] = {}
+        self._checked_out_at: Dict[int, float] = {}
+        self._size = 0  # open connections plus ones being opened
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+
+        # Metrics
+        self.wait_time = LatencyHistogram()
+        self.hold_time = LatencyHistogram()
+        self.acquired_count = 0
+        self.timeout_count = 0
+        self.created_count = 0
+        self.stale_count = 0
+        self.recycled_count = 0
+        self.peak_in_use = 0
+        self._in_use = 0
+        self._busy_integral = 0.0
+        self._started_at = time.monotonic()
+        self._last_change = self._started_at
+
+        for _ in range(minconn):
+            connection = self._connect()
+            self._size += 1
+            self.created_count += 1
+            self._idle.append((connection, time.monotonic()))
+
+    def _connect(self):
+        connection = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _track_in_use(self, delta: int):
+        # Called with the lock held; integrates connections-in-use over time
+        now = time.monotonic()
+        self._busy_integral += self._in_use * (now - self._last_change)
+        self._last_change = now
+        self._in_use += delta
+        self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+    def _next_waiter(self):
+        # Called with the lock held; hands the turn to the next live ticket
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.remove(self._serving)
+            self._serving += 1
+        self._condition.notify_all()
+
+    def _expired(self, connection) -> bool:
+        created_at = self._created_at.get(id(connection))
+        return bool(self.max_lifetime) and created_at is not None \
+            and time.monotonic() - created_at > self.max_lifetime
+
+    def _check(self, connection, idle_since: float) -> Optional[str]:
+        """Checkout validation, run outside the lock; returns why the connection is unusable"""
+        if connection.closed:
+            return 'stale'
+        if self._expired(connection):
+            return 'recycled'
+        if self.validate_idle is not None and time.monotonic() - idle_since > self.validate_idle:
+            try:
+                # A plain cursor: the check is part of the pool wait, not a recorded statement
+                with extensions.cursor(connection) as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Discarding stale pooled connection: {e}")
+                return 'stale'
+        return None
+
+    def _discard(self, connection, reason: Optional[str] = None):
+        """Close a connection and free its slot"""
+        self._created_at.pop(id(connection), None)
+        try:
+            if not connection.closed:
+                connection.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            if reason == 'stale':
+                self.stale_count += 1
+            elif reason == 'recycled':
+                self.recycled_count += 1
+            self._condition.notify_all()
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a connection, waiting up to ``timeout`` seconds for one"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            connection = None
+            idle_since = None
+            created = False
+            with self._condition:
+                ticket = self._next_ticket
+                self._next_ticket += 1
+                while True:
+                    if self.closed:
+                        raise PoolError("connection pool is closed")
+                    if ticket == self._serving:
+                        if self._idle:
+                            connection, idle_since = self._idle.pop()
+                            self._next_waiter()
+                            break
+                        if self._size < self.maxconn:
+                            self._size += 1
+                            self._next_waiter()
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if ticket == self._serving:
+                            self._next_waiter()
+                        else:
+                            self._abandoned.add(ticket)
+                        self.timeout_count += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {timeout:.1f}s "
+                            f"({self._in_use}/{self.maxconn} in use)"
+                        )
+                    self._condition.wait(remaining)
+
+            if connection is None:
+                try:
+                    connection = self._connect()
+                    created = True
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify_all()
+                    raise
+            else:
+                reason = self._check(connection, idle_since)
+                if reason is not None:
+                    self._discard(connection, reason)
+                    continue
+
+            with self._condition:
+                if created:
+                    self.created_count += 1
+                now = time.monotonic()
+                self.wait_time.record(now - start)
+                self.acquired_count += 1
+                self._checked_out_at[id(connection)] = now
+                self._track_in_use(1)
+            return connection
+
+    def putconn(self, connection, close: bool = False):
+        """Return a connection; broken, expired or closed-pool connections are closed instead"""
+        key = id(connection)
+        with self._condition:
+            if key not in self._checked_out_at:
+                raise PoolError("trying to put unkeyed connection")
+            self.hold_time.record(time.monotonic() - self._checked_out_at.pop(key))
+            self._track_in_use(-1)
+
+        if not close and not connection.closed:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        if close or connection.closed or self.closed or self._expired(connection):
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify_all()
+
+    def closeall(self):
+        """Close idle connections now; checked-out ones are closed when returned"""
+        with self._condition:
+            self.closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, utilisation and wait-time metrics"""
+        with self._condition:
+            now = time.monotonic()
+            busy = self._busy_integral + self._in_use * (now - self._last_change)
+            elapsed = now - self._started_at
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_connections': self.maxconn,
+                'peak_in_use': self.peak_in_use,
+                'utilisation': round(self._in_use / self.maxconn, 3),
+                'average_utilisation': round(busy / (elapsed * self.maxconn), 3) if elapsed > 0 else 0.0,
+                'acquired': self.acquired_count,
+                'timeouts': self.timeout_count,
+                'created': self.created_count,
+                'stale_discarded': self.stale_count,
+                'recycled': self.recycled_count,
+                'wait_ms': self.wait_time.to_dict(),
+                'hold_ms': self.hold_time.to_dict(),
+            }
@@ -0,0 +1,302 @@
+"""
+Per-statement query metrics and slow-query log for DatabaseManager
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from psycopg2 import extensions
+
+from database.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('database.slow_queries')
+
+_DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pipeline, job or task on whose behalf queries currently run
+_query_source: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('query_source', default=None)
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_VALUES_KEYWORD_RE = re.compile(r"\bVALUES\s*(?=\()", re.IGNORECASE)
+# One VALUES row: string literals are skipped whole and one level of nested
+# parentheses, such as NOW() or a cast, is allowed inside. Written as unrolled
+# loops so the regex engine consumes runs of plain text without backtracking
+_QUOTED = r"'[^']*(?:''[^']*)*'"
+_NESTED = rf"\([^'()]*(?:{_QUOTED}[^'()]*)*\)"
+_VALUES_ROW = rf"\([^'()]*(?:(?:{_QUOTED}|{_NESTED})[^'()]*)*\)"
+_VALUES_ROWS_RE = re.compile(rf"{_VALUES_ROW}(?:\s*,\s*{_VALUES_ROW})*")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Longer statements, once their VALUES rows are collapsed, are not cached
+_MAX_CACHED_STATEMENT = 4096
+
+
+@contextmanager
+def query_source(name: str) -> Iterator[None]:
+    """Attribute the queries run inside the block to name in slow-query logs"""
+    token = _query_source.set(name)
+    try:
+        yield
+    finally:
+        _query_source.reset(token)
+
+
+def current_query_source() -> Optional[str]:
+    return _query_source.get()
+
+
+def statement_template(query: str) -> str:
+    """
+    Normalise a statement into the template it is grouped under.
+
+    Whitespace is collapsed and inline string and number literals become
+    '?', so statements built with different literal values share a template;
+    placeholder lists such as IN (%s, %s, %s) and the rows of a VALUES list
+    collapse to (...).
+
+    VALUES rows are collapsed in a single scan before anything else, so a
+    multi-row insert from execute_values costs one pass over its payload and
+    then templates and caches like any short statement.
+    """
+    query = _collapse_values_lists(query)
+    if len(query) > _MAX_CACHED_STATEMENT:
+        return _statement_template(query)
+    return _cached_statement_template(query)
+
+
+def _collapse_values_lists(query: str) -> str:
+    """Replace the rows of every VALUES list with a fixed (...)"""
+    match = _VALUES_KEYWORD_RE.search(query)
+    if match is None:
+        return query
+    parts = []
+    pos = 0
+    while match is not None:
+        rows = _VALUES_ROWS_RE.match(query, match.end())
+        if rows is None:
+            parts.append(query[pos:match.end()])
+            pos = match.end()
+        else:
+            parts.append(query[pos:match.start()])
+            parts.append('VALUES (...)')
+            pos = rows.end()
+        match = _VALUES_KEYWORD_RE.search(query, pos)
+    parts.append(query[pos:])
+    return ''.join(parts)
+
+
+def _statement_template(query: str) -> str:
+    template = _STRING_LITERAL_RE.sub('?', query)
+    template = _NUMBER_LITERAL_RE.sub('?', template)
+    template = _WHITESPACE_RE.sub(' ', template).strip()
+    return _PLACEHOLDER_LIST_RE.sub('(...)', template)
+
+
+_cached_statement_template = lru_cache(maxsize=2048)(_statement_template)
+
+
+def _caller() -> str:
+    """file:function:line of the innermost frame outside the database package"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not os.path.abspath(filename).startswith(_DATABASE_DIR) and 'contextlib' not in filename \
+                and 'psycopg2' not in filename:
+            return f"{os.path.relpath(filename)}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return '?'
+
+
+class StatementStats:
+    """Counters and latency histograms for one statement template"""
+
+    __slots__ = ('template', 'calls', 'errors', 'rows', 'execution', 'pool_wait')
+
+    def __init__(self, template: str):
+        self.template = template
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.execution = LatencyHistogram()
+        self.pool_wait = LatencyHistogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'template': self.template,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'rows_per_call': round(self.rows / self.calls, 1) if self.calls else 0.0,
+            'total_ms': round((self.execution.total + self.pool_wait.total) * 1000, 3),
+            'execution_ms': self.execution.to_dict(),
+            'pool_wait_ms': self.pool_wait.to_dict(),
+        }
+
+
+class QueryStats:
+    """
+    Thread-safe registry of per-template query metrics.
+
+    ``record`` is called once per statement with the time spent waiting for
+    a pooled connection and the time spent executing. Statements slower than
+    ``slow_threshold`` seconds (execution only; None disables the log) are
+    logged to the ``database.slow_queries`` logger with their parameters and
+    caller, and the last ``slow_log_size`` are kept for ``slow_queries()``.
+    """
+
+    def __init__(self, slow_threshold: Optional[float] = 0.5, slow_log_size: int = 100,
+                 max_param_length: int = 200):
+        self.slow_threshold = slow_threshold
+        self.max_param_length = max_param_length
+        self._lock = threading.Lock()
+        self._statements: Dict[str, StatementStats] = {}
+        self._slow: deque = deque(maxlen=slow_log_size)
+
+    def record(self, query: str, params: Any, pool_wait: float, execution: float, rows: int,
+               error: bool = False):
+        template = statement_template(query)
+        with self._lock:
+            stats = self._statements.get(template)
+            if stats is None:
+                stats = self._statements[template] = StatementStats(template)
+            stats.calls += 1
+            stats.rows += max(rows, 0)
+            stats.errors += error
+            stats.execution.record(execution)
+            stats.pool_wait.record(pool_wait)
+
+        if self.slow_threshold is not None and execution >= self.slow_threshold:
+            self._log_slow(template, params, pool_wait, execution, rows, error)
+
+    def _log_slow(self, template: str, params: Any, pool_wait: float, execution: float, rows: int,
+                  error: bool):
+        entry = {
+            'at': datetime.now().isoformat(),
+            'template': template,
+            'params': self._format_params(params),
+            'execution_ms': round(execution * 1000, 3),
+            'pool_wait_ms': round(pool_wait * 1000, 3),
+            'rows': rows,
+            'error': error,
+            'source': current_query_source(),
+            'caller': _caller(),
+        }
+        with self._lock:
+            self._slow.append(entry)
+        slow_query_logger.warning(
+            f"Slow query {entry['execution_ms']}ms (pool wait {entry['pool_wait_ms']}ms, {rows} rows) "
+            f"from {entry['source'] or '-'} at {entry['caller']}: {template[:300]} params={entry['params']}"
+        )
+
+    def _format_params(self, params: Any) -> Optional[str]:
+        if params is None:
+            return None
+        text = repr(params)
+        if len(text) > self.max_param_length:
+            text = text[:self.max_param_length] + '...'
+        return text
+
+    def top(self, n: int = 10, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        """
+        The n statement templates with the highest order_by: 'total_ms' (execution
+        plus pool wait), 'calls', 'rows', 'errors', or a percentile of execution
+        time such as 'p95'.
+        """
+        with self._lock:
+            statements = [stats.to_dict() for stats in self._statements.values()]
+
+        def key(stats: Dict[str, Any]):
+            if order_by in stats:
+                return stats[order_by]
+            return stats['execution_ms'][order_by]
+
+        return sorted(statements, key=key, reverse=True)[:n]
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Most recent slow queries, oldest first"""
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+
+
+class InstrumentedConnection(extensions.connection):
+    """
+    Connection whose cursors record every statement in ``query_stats``, set
+    on a subclass per DatabaseManager. get_connection sets ``pool_wait`` at
+    checkout; it is charged to the first statement run afterwards.
+    """
+
+    query_stats: Optional[QueryStats] = None
+    pool_wait = 0.0
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _instrumented_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+    def take_pool_wait(self) -> float:
+        pool_wait, self.pool_wait = self.pool_wait, 0.0
+        return pool_wait
+
+
+def _record(cursor, query: Any, params: Any, started: float, error: bool):
+    connection = cursor.connection
+    if connection.query_stats is None:
+        return
+    if isinstance(query, bytes):
+        statement = query.decode('utf-8', 'replace')
+    elif isinstance(query, str):
+        statement = query
+    else:
+        statement = query.as_string(connection)
+    connection.query_stats.record(statement, params, connection.take_pool_wait(),
+                                  time.perf_counter() - started, cursor.rowcount, error)
+
+
+_cursor_classes: Dict[type, type] = {}
+
+
+def _instrumented_cursor(factory: type) -> type:
+    """Subclass of a cursor class that records the time and rows of each statement"""
+    if factory not in _cursor_classes:
+        class InstrumentedCursor(factory):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                error = False
+                try:
+                    return super().execute(query, vars)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    _record(self, query, vars, started, error)
+
+            def executemany(self, query, vars_list):
+                started = time.perf_counter()
+                error = False
+                try:
+                    return super().executemany(query, vars_list)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    # The parameter list is not logged; it may be long or already consumed
+                    _record(self, query, None, started, error)
+
+        _cursor_classes[factory] = InstrumentedCursor
+    return _cursor_classes[factory]
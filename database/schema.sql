@@ -1,5 +1,8 @@
 -- Unified E-commerce Product Data Aggregator Database Schema
 -- PostgreSQL Database Setup
+--
+-- This is the baseline schema. After loading it, apply the versioned
+-- migrations in database/migrations with: python -m database.migrate
 
 -- Create database (run this manually)
 -- CREATE DATABASE ecommerce_aggregator;
@@ -13,7 +16,7 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 -- Products table - Main product information
 CREATE TABLE products (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    external_id VARCHAR(255) UNIQUE NOT NULL,
+    external_id VARCHAR(255) NOT NULL,
     platform VARCHAR(50) NOT NULL CHECK (platform IN ('amazon', 'walmart', 'target', 'bestbuy')),
     title TEXT NOT NULL,
     description TEXT,
@@ -35,7 +38,12 @@ CREATE TABLE products (
     last_price_update TIMESTAMP,
     last_availability_update TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
-    is_curated BOOLEAN DEFAULT FALSE
+    is_curated BOOLEAN DEFAULT FALSE,
+    -- Content hashes of the child rows, used by upserts to skip unchanged children
+    specs_hash VARCHAR(32),
+    images_hash VARCHAR(32),
+    variations_hash VARCHAR(32),
+    CONSTRAINT uq_products_platform_external_id UNIQUE (platform, external_id)
 );
 
 -- Product specifications table
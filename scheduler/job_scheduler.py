@@ -13,6 +13,8 @@ from dataclasses import dataclass, asdict
 import subprocess
 import platform
 
+from database.query_stats import query_source
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -189,17 +191,18 @@ class JobScheduler:
             job.last_run = datetime.now()
             
             # Execute based on job type
-            if job.job_type == 'scraping':
-                result = self._execute_scraping_job(job)
-            elif job.job_type == 'deduplication':
-                result = self._execute_deduplication_job(job)
-            elif job.job_type == 'sync':
-                result = self._execute_sync_job(job)
-            elif job.job_type == 'maintenance':
-                result = self._execute_maintenance_job(job)
-            else:
-                logger.error(f"Unknown job type: {job.job_type}")
-                return
+            with query_source(f"job:{job.name}"):
+                if job.job_type == 'scraping':
+                    result = self._execute_scraping_job(job)
+                elif job.job_type == 'deduplication':
+                    result = self._execute_deduplication_job(job)
+                elif job.job_type == 'sync':
+                    result = self._execute_sync_job(job)
+                elif job.job_type == 'maintenance':
+                    result = self._execute_maintenance_job(job)
+                else:
+                    logger.error(f"Unknown job type: {job.job_type}")
+                    return
             
             # Update next run time
             job.next_run = self._calculate_next_run(job)
@@ -299,6 +302,15 @@ class JobScheduler:
                 # Optimize database
                 result = self.db_manager.optimize_database()
                 
+            elif maintenance_type == 'partitions':
+                # Pre-create, carry forward and archive price history partitions
+                from database.partitions import PriceHistoryPartitionManager
+                result = PriceHistoryPartitionManager(
+                    self.db_manager,
+                    retention_months=config.get('retention_months'),
+                    archive_dir=config.get('archive_dir')
+                ).run_maintenance()
+                
             else:
                 return {'success': False, 'error': f'Unknown maintenance type: {maintenance_type}'}
             
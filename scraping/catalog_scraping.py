@@ -103,8 +103,11 @@ class CatalogScrapingManager:
             logger.info(f"Starting initial catalog scraping for {session.platform}")
             
             # Get existing products to avoid duplicates
-            existing_products = self.db_manager.get_products_by_platform(session.platform)
-            existing_ids = {p['external_id'] for p in existing_products}
+            existing_ids = {
+                external_id for (external_id,) in self.db_manager.iter_products(
+                    platform=session.platform, columns=('external_id',), row_format='tuple'
+                )
+            }
             
             # Start URLs for deep scraping
             start_urls = self._get_catalog_start_urls(session.platform, session.category)
@@ -124,10 +127,11 @@ class CatalogScrapingManager:
                     if product['external_id'] in existing_ids:
                         continue
                     
-                    # Process and store new product
+                    # Process and store new product; existing_ids only holds active products,
+                    # so a deactivated one found again is updated in place
                     processed_product = self._process_new_product(product)
                     if processed_product:
-                        self.db_manager.insert_product(processed_product)
+                        self.db_manager.upsert_product(processed_product)
                         session.products_scraped += 1
                         
                         logger.debug(f"Added new product: {product['external_id']}")
@@ -341,9 +345,9 @@ class CatalogScrapingManager:
         """Process a new product before storing"""
         try:
             # Apply data processing and curation rules
-            from data_processing.processor import data_processor
+            from data_processing.processor import get_data_processor
             
-            processed_product = data_processor.process_product(product)
+            processed_product = get_data_processor().process_product(product)
             
             if processed_product:
                 # Add additional metadata
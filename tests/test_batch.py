@@ -0,0 +1,89 @@
+"""
+Tests for DataProcessor.process_products against the per-item process_product path
+"""
+import pandas as pd
+import pytest
+
+from data_processing.processor import DataProcessor
+
+
+def product(external_id, **fields):
+    data = {
+        'external_id': external_id,
+        'platform': 'Amazon',
+        'title': f'  Product {external_id}\n',
+        'description': 'A\tdescription',
+        'brand': 'Acme',
+        'model': 'X1',
+        'current_price': 49.99,
+        'original_price': 59.99,
+        'currency': 'usd',
+        'availability_status': 'In Stock.',
+        'rating': 4.5,
+        'review_count': 120,
+        'category': 'electronics',
+        'subcategory': 'Computers & Electronics',
+        'product_url': f'https://www.amazon.com/dp/{external_id}',
+        'images': [{'url': f'https://img.example.com/{external_id}.jpg', 'type': 'primary'}],
+        'specifications': {'Colour': 'Black'},
+        'variations': [],
+        'scraped_at': '2024-01-01T00:00:00',
+        'spider_name': 'amazon',
+    }
+    data.update(fields)
+    return data
+
+
+BATCH = [
+    product('KEEP000001'),
+    product('KEEP000002', original_price=None, images=[], specifications={}),
+    product('KEEP000003', rating=None, review_count=15, brand='  Some   Brand '),
+    product('KEEP000004', current_price=25, original_price=20, category='home'),
+    product('DROP000001', title=''),
+    product('DROP000002', product_url=None),
+    product('DROP000003', rating=3.0),
+    product('DROP000004', review_count=3),
+    product('DROP000005', category='Alcohol & Spirits'),
+    product('DROP000006', current_price=20000),
+    product('DROP000007', brand='Generic'),
+    product('DROP000008', availability_status='out_of_stock'),
+]
+
+
+@pytest.fixture(scope='module')
+def processor():
+    return DataProcessor()
+
+
+def test_kept_rows_match_process_product(processor):
+    expected = {item['external_id']: processor.process_product(item) for item in BATCH}
+    expected = {key: value for key, value in expected.items() if value is not None}
+
+    records = processor.process_products(BATCH).records()
+    assert [record['external_id'] for record in records] == list(expected)
+    for record in records:
+        assert record == expected[record['external_id']]
+
+
+def test_drop_reasons(processor):
+    result = processor.process_products(BATCH)
+    assert list(result.drop_reasons) == [
+        None, None, None, None, 'missing_title', 'missing_product_url', 'low_rating', 'few_reviews',
+        'excluded_category', 'price_out_of_range', 'blacklisted_brand', 'out_of_stock',
+    ]
+    assert result.summary()['kept'] == 4
+
+
+@pytest.mark.parametrize('batch', [BATCH, pd.DataFrame(BATCH), {key: [item[key] for item in BATCH] for key in BATCH[0]}])
+def test_accepts_records_frames_and_columns(processor, batch):
+    assert len(processor.process_products(batch)) == 4
+
+
+def test_text_values_are_judged_by_the_number_they_hold(processor):
+    result = processor.process_products([
+        product('TEXT000001', current_price='$1,299.00', rating='4.6 out of 5 stars', review_count='2,417 ratings'),
+        product('TEXT000002', rating='3.9 out of 5 stars'),
+    ])
+    record = result.records()[0]
+    assert (record['current_price'], record['rating'], record['review_count']) == (1299.0, 4.6, 2417)
+    assert list(result.drop_reasons) == [None, 'low_rating']
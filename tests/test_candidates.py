@@ -0,0 +1,89 @@
+"""
+Tests for candidate pair generation in deduplication
+"""
+import os
+
+import numpy as np
+import pytest
+
+from benchmark_deduplication import ROOT, build_catalog, load_products
+from data_processing.candidates import CandidateGenerator, LSHBands, MinHasher, price_bucket
+from data_processing.deduplication import ProductDeduplicator
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    base = load_products([os.path.join(ROOT, 'amazon-assembled.json')])
+    return build_catalog(base, 200, 0.3, seed=0)
+
+
+def product(external_id, title, brand='Acme', price=100.0, platform='amazon'):
+    return {'external_id': external_id, 'platform': platform, 'title': title, 'brand': brand,
+            'current_price': price, 'specifications': []}
+
+
+def test_minhash_estimates_jaccard_similarity():
+    minhasher = MinHasher(num_perm=256)
+    first = 'apple iphone 13 pro max 256gb graphite'
+    second = 'apple iphone 13 pro max 256gb sierra blue'
+    shingles1, shingles2 = minhasher.shingles(first), minhasher.shingles(second)
+    jaccard = len(shingles1 & shingles2) / len(shingles1 | shingles2)
+    estimate = np.mean(minhasher.signature(first) == minhasher.signature(second))
+    assert abs(estimate - jaccard) < 0.1
+    assert minhasher.signature('') is None
+    assert np.array_equal(MinHasher(num_perm=256).signature(first), minhasher.signature(first))
+
+
+def test_lsh_bands_must_divide_signature():
+    with pytest.raises(ValueError):
+        LSHBands(num_perm=128, bands=30)
+    assert len(LSHBands(num_perm=128, bands=32).keys(MinHasher().signature('some title'))) == 32
+
+
+def test_price_buckets_neighbour_close_prices():
+    assert price_bucket(None, 1.5) is None
+    assert price_bucket(0, 1.5) is None
+    assert abs(price_bucket(100, 1.5) - price_bucket(140, 1.5)) <= 1
+    assert abs(price_bucket(100, 1.5) - price_bucket(400, 1.5)) > 1
+
+
+def test_pairs_from_blocks_and_title_lsh():
+    deduplicator = ProductDeduplicator()
+    features = deduplicator.featurize([
+        product('1', 'Acme Blender 500W Stainless Steel', price=100),
+        product('2', 'Acme Blender Stainless Steel 500W', brand='ACME', price=105, platform='walmart'),
+        product('3', 'Totally different kettle', price=110),
+        product('4', 'Acme Blender 500W Stainless Steel', brand='', price=None, platform='target'),
+        product('5', 'Unrelated garden hose 50ft', brand='Other', price=20),
+        product('1', 'Renamed listing of the same item', brand='', price=None),
+    ])
+    generator = CandidateGenerator()
+    pairs = generator.pairs(features)
+    # Same brand and price range; same title without brand or price; same platform item
+    assert {(0, 1), (0, 2), (1, 2), (0, 3), (0, 5)} <= pairs
+    assert not any(4 in pair for pair in pairs)
+    assert generator.stats['all_pairs'] == 15
+    assert generator.neighbours(features)[0] == sorted(second for first, second in pairs if first == 0)
+
+
+def test_oversized_blocks_are_not_expanded():
+    deduplicator = ProductDeduplicator()
+    features = deduplicator.featurize([product(str(i), f'item {i} ' + 'x' * (i % 7), price=100) for i in range(20)])
+    generator = CandidateGenerator(max_block_size=10)
+    generator.pairs(features)
+    assert generator.stats['oversized_blocks'] == 1
+    assert generator.stats['block_pairs'] == 0
+
+
+def test_candidate_recall_on_fixture_catalog(catalog):
+    recall = ProductDeduplicator(kernel='token_set').candidate_recall(catalog, sample_size=len(catalog))
+    assert recall['duplicate_pairs'] > 0
+    assert recall['recall'] == 1.0
+    assert recall['pair_reduction'] > 0.9
+
+
+def test_find_duplicates_matches_exhaustive_search(catalog):
+    deduplicator = ProductDeduplicator(kernel='token_set')
+    groups = sorted(sorted(group) for group in deduplicator.find_duplicates(catalog))
+    assert groups
+    assert groups == sorted(sorted(group) for group in deduplicator.find_duplicates_exhaustive(catalog))
@@ -0,0 +1,86 @@
+"""
+Tests for the product feature records deduplication compares
+"""
+import pytest
+
+from data_processing.deduplication import ProductDeduplicator
+from data_processing.features import Featurizer, extract_key_specs, specification_rows
+
+PRODUCTS = [
+    {'external_id': 'A1', 'platform': 'amazon', 'title': 'Acme Blender, 500W (Stainless Steel)', 'brand': 'Acme',
+     'current_price': 49.99, 'category': 'Home',
+     'specifications': [{'spec_name': 'Color', 'spec_value': 'Silver'}, {'spec_name': 'Wattage', 'spec_value': '500W'}]},
+    {'external_id': 'W1', 'platform': 'walmart', 'title': 'ACME blender 500 W stainless steel', 'brand': 'ACME ',
+     'current_price': 52.0, 'category': 'Home',
+     'specifications': {'Color': 'silver', 'Details': {'Power': {'Wattage': 500}}}},
+    {'external_id': 'T1', 'platform': 'target', 'title': None, 'brand': None, 'current_price': None},
+    {'external_id': 'B1', 'platform': 'bestbuy', 'title': '', 'brand': '', 'current_price': 10,
+     'specifications': [{'spec_name': 'Size', 'spec_value': None}]},
+]
+
+
+def test_specification_rows_flatten_scraped_dicts():
+    assert specification_rows({'Color': 'Black', 'Details': {'Power': {'Wattage': 500, 'Volts': '220V'}}}) == [
+        {'spec_name': 'Color', 'spec_value': 'Black'},
+        {'spec_name': 'Wattage', 'spec_value': '500'},
+        {'spec_name': 'Volts', 'spec_value': '220V'},
+    ]
+    rows = [{'spec_name': 'Color', 'spec_value': 'Black'}]
+    assert specification_rows(rows) is rows
+    assert specification_rows(None) == []
+
+
+def test_key_specs_keep_the_last_value_of_each_kind():
+    assert extract_key_specs([
+        {'spec_name': 'Colour Name', 'spec_value': 'Black'},
+        {'spec_name': 'Storage Capacity', 'spec_value': '64 GB'},
+        {'spec_name': 'Color', 'spec_value': 'Blue'},
+        {'spec_name': 'Weight', 'spec_value': None},
+    ]) == {'capacity': '64 gb', 'color': 'blue', 'weight': ''}
+
+
+def test_featurizer_shares_token_and_brand_ids():
+    featurizer = ProductDeduplicator().featurizer()
+    first, second, *_ = featurizer.featurize(PRODUCTS)
+    assert first.brand == second.brand == 'acme'
+    assert first.brand_id == second.brand_id == 0
+    assert [featurizer.tokens[token] for token in first.tokens] == first.title.split()
+    assert set(first.tokens) & set(second.tokens)
+    assert second.specs == {'color': 'silver', 'wattage': '500'}
+
+
+@pytest.mark.parametrize('index', [2, 3])
+def test_missing_title_and_brand_become_none(index):
+    features = ProductDeduplicator().featurize(PRODUCTS)[index]
+    assert features.title is None
+    assert features.tokens == ()
+    assert features.brand is None
+    assert features.brand_id == -1
+    assert features.category == ''
+
+
+def test_products_without_title_or_brand_are_scored_and_fingerprinted():
+    deduplicator = ProductDeduplicator()
+    assert deduplicator.find_duplicates(PRODUCTS) == [['A1', 'W1']]
+    assert deduplicator._calculate_similarity(PRODUCTS[2], PRODUCTS[3]) == 0.0
+    assert len(deduplicator.generate_fingerprint(PRODUCTS[2])) == 32
+
+
+# tfidf weighs terms by the block's corpus, and a lone pair by term frequency only
+@pytest.mark.parametrize('kernel', ['sequence', 'token_set'])
+def test_block_scores_match_pairwise_scores(kernel):
+    deduplicator = ProductDeduplicator(kernel=kernel)
+    featurizer = deduplicator.featurizer()
+    features = featurizer.featurize(PRODUCTS)
+    prepared = deduplicator._prepare(features, featurizer.tokens)
+    others = [1, 2, 3]
+    block = deduplicator._block_similarity(features, prepared, 0, others)
+    assert block == pytest.approx([deduplicator._features_similarity(features[0], features[j]) for j in others])
+
+
+def test_fingerprint_ignores_text_noise():
+    deduplicator = ProductDeduplicator()
+    noisy = dict(PRODUCTS[0], title='  acme BLENDER 500w stainless-steel ', brand='acme')
+    clean = dict(PRODUCTS[0], title='Acme Blender 500W Stainless Steel')
+    assert deduplicator.generate_fingerprint(noisy) == deduplicator.generate_fingerprint(clean)
+    assert Featurizer(str.lower).features(clean).title == clean['title'].lower()
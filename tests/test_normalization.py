@@ -0,0 +1,81 @@
+"""
+Tests for the compiled NormalizationEngine against the original per-call normalisers
+"""
+import glob
+import os
+
+import pytest
+
+from benchmark_normalization import ROOT, LegacyDataProcessor, load_items
+from data_processing.normalization import KeywordMatcher, NormalizationEngine
+from data_processing.processor import DataProcessor
+
+
+@pytest.fixture(scope='module')
+def processors():
+    return LegacyDataProcessor(), DataProcessor()
+
+
+@pytest.mark.parametrize('price', [None, 19, 19.5, '$1,299.99', '₹ 12,499', 'USD 5', 'free', '', '1.2.3', [], 0])
+def test_price_matches_scalar_path(processors, price):
+    legacy, compiled = processors
+    assert compiled.normalize_price(price) == legacy.normalize_price(price)
+
+
+@pytest.mark.parametrize('rating', [None, 4, 9, 4.5, '4.5 out of 5 stars', '8/10', 'no rating', '', -1, {}])
+def test_rating_matches_scalar_path(processors, rating):
+    legacy, compiled = processors
+    assert compiled.normalize_rating(rating) == legacy.normalize_rating(rating)
+
+
+@pytest.mark.parametrize('review_count', [None, 0, 120, '1,234 ratings', '(87)', 'none', '', 3.0])
+def test_review_count_matches_scalar_path(processors, review_count):
+    legacy, compiled = processors
+    assert compiled.normalize_review_count(review_count) == legacy.normalize_review_count(review_count)
+
+
+@pytest.mark.parametrize('availability', [
+    '', 'In Stock.', 'Only 3 left in stock - order soon.', 'Currently unavailable.', 'Temporarily out of stock.',
+    'Pre-order now', 'Coming soon', 'Limited stock', 'Usually ships within 2 to 3 days.', 'Add to Cart',
+    'SOLD OUT',
+])
+def test_availability_matches_scalar_path(processors, availability):
+    legacy, compiled = processors
+    assert compiled.normalize_availability(availability) == legacy.normalize_availability(availability)
+
+
+@pytest.mark.parametrize('category', [
+    '', 'Electronics', 'Computers & Electronics > Laptops', 'Home & Kitchen', "Children's Toys",
+    'Clothing, Shoes & Jewelry', 'Books & Magazines', '  Garden\n Tools ', 'Automotive & Motorcycle',
+])
+def test_category_matches_scalar_path(processors, category):
+    legacy, compiled = processors
+    assert compiled.normalize_category(category) == legacy.normalize_category(category)
+
+
+def test_text_cleaning_matches_scalar_path(processors):
+    legacy, compiled = processors
+    for text in ['', None, '  a\tb\r\nc  ', 'plain', '\n\n']:
+        assert compiled.clean_text(text) == legacy.clean_text(text)
+
+
+def test_products_from_dumps_match_scalar_path(processors):
+    legacy, compiled = processors
+    items = load_items(sorted(glob.glob(os.path.join(ROOT, '*.json'))))
+    assert items
+    for item in items:
+        assert compiled.normalize_product_data(item) == legacy.normalize_product_data(item)
+
+
+def test_keyword_matcher_prefers_earlier_rules():
+    matcher = KeywordMatcher([('first', ['stock']), ('second', ['in stock', 'out'])])
+    assert matcher.match('in stock') == 'first'
+    assert matcher.match('sold out') == 'second'
+    assert matcher.match('nothing') is None
+
+
+def test_memoised_normalisers_count_hits():
+    engine = NormalizationEngine(cache_size=8)
+    for _ in range(3):
+        engine.normalize_category('Home & Kitchen')
+    assert engine.cache_info()['normalize_category']['hits'] == 2
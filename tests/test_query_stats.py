@@ -0,0 +1,38 @@
+"""
+Tests for statement templating in the query metrics
+"""
+import pytest
+
+from database.query_stats import statement_template
+
+
+@pytest.mark.parametrize('query, template', [
+    ("SELECT * FROM products WHERE id = %s", "SELECT * FROM products WHERE id = %s"),
+    ("SELECT  *\n  FROM products\tWHERE id = 42", "SELECT * FROM products WHERE id = ?"),
+    ("SELECT * FROM products WHERE title = 'it''s (new)' AND price > 9.99",
+     "SELECT * FROM products WHERE title = ? AND price > ?"),
+    ("SELECT * FROM products WHERE id IN (%s, %s, %s)", "SELECT * FROM products WHERE id IN (...)"),
+    ("SELECT * FROM t WHERE v = -1 AND col2 = 3", "SELECT * FROM t WHERE v = ? AND col2 = ?"),
+    ("INSERT INTO t (a, b) VALUES (%s, %s)", "INSERT INTO t (a, b) VALUES (...)"),
+    ("INSERT INTO t (a, b) VALUES ('x', 1), ('y''s', 2.5) ON CONFLICT (a) DO NOTHING RETURNING id",
+     "INSERT INTO t (a, b) VALUES (...) ON CONFLICT (a) DO NOTHING RETURNING id"),
+    ("insert into t values (1, NOW()), (2, '{\"a\": [1]}'::jsonb) returning id",
+     "insert into t VALUES (...) returning id"),
+    ("SELECT * FROM (VALUES (1, 'a'), (2, 'b')) AS v(id, name) JOIN t USING (id)",
+     "SELECT * FROM (VALUES (...)) AS v(id, name) JOIN t USING (id)"),
+])
+def test_statement_template(query, template):
+    assert statement_template(query) == template
+
+
+def test_literal_values_share_a_template():
+    assert statement_template("SELECT * FROM products WHERE title = 'a' LIMIT 10") == \
+        statement_template("SELECT * FROM products WHERE title = 'b' LIMIT 20")
+
+
+def test_large_values_batch_collapses_to_a_short_template():
+    row = "('B{0:09d}', 'Title (with parens) it''s', 19.99, '{{\"k\": [1, 2]}}'::jsonb, NOW())"
+    rows = ', '.join(row.format(i) for i in range(20000))
+    query = f"INSERT INTO products (a, b, c, d, e) VALUES {rows} ON CONFLICT (platform, external_id) DO NOTHING"
+    assert statement_template(query) == \
+        "INSERT INTO products (a, b, c, d, e) VALUES (...) ON CONFLICT (platform, external_id) DO NOTHING"
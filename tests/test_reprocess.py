@@ -0,0 +1,116 @@
+"""
+Tests for reading and mapping historical scrape dumps
+"""
+import gzip
+import json
+
+import pytest
+
+from data_processing import reprocess
+from data_processing.reprocess import iter_chunks, iter_dump, platform_hint, to_product_item
+
+LEGACY_RECORD = {
+    'url': ['/Redmi-Storage-Segment-Qualcomm-Snapdragon/dp/B09QS8V5N8/ref=sr_1_1'],
+    'title': ['Redmi Note 11 (Space Black, 4GB RAM, 64GB Storage)'],
+    'price': ['12,499'],
+    'star_rating': ['4.1 out of 5 stars'],
+    'no_rating': ['1,234'],
+    'brand': ['Redmi'],
+    'model_name': ['Note', '11'],
+    'colour': ['Space Black'],
+    'storage_cap': [['64 GB', '4 GB RAM']],
+    'about_item': ['Fast charging', 'AMOLED display'],
+    'img_url': ['https://m.media-amazon.com/images/I/81.jpg'],
+}
+
+RECORDS = [{'title': f'Item {i}', 'product_url': f'https://www.walmart.com/ip/{i}', 'current_price': i}
+           for i in range(25)]
+
+
+def test_legacy_record_is_mapped_onto_product_fields():
+    item = to_product_item(LEGACY_RECORD, 'amazon')
+    assert item == {
+        'external_id': 'B09QS8V5N8',
+        'platform': 'amazon',
+        'title': 'Redmi Note 11 (Space Black, 4GB RAM, 64GB Storage)',
+        'description': 'Fast charging AMOLED display',
+        'brand': 'Redmi',
+        'model': 'Note 11',
+        'current_price': '12,499',
+        'rating': '4.1 out of 5 stars',
+        'review_count': '1,234',
+        'product_url': 'https://www.amazon.com/Redmi-Storage-Segment-Qualcomm-Snapdragon/dp/B09QS8V5N8/ref=sr_1_1',
+        'images': [{'url': 'https://m.media-amazon.com/images/I/81.jpg', 'type': 'primary'}],
+        'specifications': {'Colour': 'Space Black', 'Storage': '64 GB, 4 GB RAM'},
+    }
+
+
+@pytest.mark.parametrize('url, platform, external_id', [
+    ('https://www.walmart.com/ip/Some-Product/123456789', 'walmart', '123456789'),
+    ('https://www.target.com/p/thing/-/A-54321', 'target', '54321'),
+    ('https://www.bestbuy.com/site/x.p?skuId=6789', 'bestbuy', '6789'),
+])
+def test_platform_and_external_id_come_from_the_url(url, platform, external_id):
+    item = to_product_item({'url': url, 'title': 'x'})
+    assert (item['platform'], item['external_id']) == (platform, external_id)
+
+
+def test_unknown_url_gets_a_stable_hashed_id_and_the_default_platform():
+    first = to_product_item({'url': '/some/relative/path'}, 'amazon')
+    second = to_product_item({'url': '/some/relative/path'}, 'amazon')
+    assert first['platform'] == 'amazon'
+    assert first['external_id'] == second['external_id']
+    assert len(first['external_id']) == 32
+
+
+def test_product_item_records_pass_through():
+    record = {'title': 'x', 'product_url': 'https://example.com/x', 'platform': 'WALMART', 'extra': 1}
+    item = to_product_item(record, 'amazon')
+    assert item == dict(record, platform='walmart')
+    assert record['platform'] == 'WALMART'
+    assert to_product_item({'current_price': 5}, 'Target')['platform'] == 'target'
+
+
+def test_platform_hint():
+    assert platform_hint('/dumps/walmart_products.json') == 'walmart'
+    assert platform_hint('scraped_data_x.jsonl.gz') is None
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_iter_dump_streams_json_arrays(tmp_path, monkeypatch, indent):
+    # A small read size makes elements straddle read boundaries
+    monkeypatch.setattr(reprocess, '_READ_SIZE', 16)
+    path = tmp_path / 'dump.json'
+    path.write_text(json.dumps(RECORDS, indent=indent), encoding='utf-8')
+    assert list(iter_dump(str(path))) == RECORDS
+
+
+def test_iter_dump_reads_empty_array(tmp_path):
+    path = tmp_path / 'empty.json'
+    path.write_text('[]', encoding='utf-8')
+    assert list(iter_dump(str(path))) == []
+
+
+def test_iter_dump_rejects_truncated_array(tmp_path):
+    path = tmp_path / 'truncated.json'
+    path.write_text(json.dumps(RECORDS)[:-40], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_dump(str(path)))
+
+
+def test_iter_dump_yields_json_lines_undecoded(tmp_path, monkeypatch):
+    monkeypatch.setattr(reprocess, '_READ_SIZE', 16)
+    path = tmp_path / 'dump.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for record in RECORDS:
+            f.write(json.dumps(record) + '\n\n')
+    lines = list(iter_dump(str(path)))
+    assert [json.loads(line) for line in lines] == RECORDS
+
+
+def test_iter_chunks_splits_each_dump(tmp_path):
+    first, second = tmp_path / 'a.json', tmp_path / 'b.json'
+    first.write_text(json.dumps(RECORDS), encoding='utf-8')
+    second.write_text(json.dumps(RECORDS[:3]), encoding='utf-8')
+    sizes = [(path, len(chunk)) for path, chunk in iter_chunks([str(first), str(second)], 10)]
+    assert sizes == [(str(first), 10), (str(first), 10), (str(first), 5), (str(second), 3)]
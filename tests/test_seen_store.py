@@ -0,0 +1,139 @@
+"""
+Tests for the seen-item store behind DuplicatesPipeline
+"""
+import pytest
+
+from amazonscraper.seen_store import BloomSlice, ScalableBloomFilter, SeenStore, item_fingerprint
+
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+
+def test_fingerprint_is_stable_and_normalises_title():
+    assert item_fingerprint('Amazon', 'B0001', '  Echo   Dot ') == item_fingerprint('amazon', 'B0001', 'echo dot')
+    assert item_fingerprint('amazon', 'B0001', 'Echo Dot') != item_fingerprint('walmart', 'B0001', 'Echo Dot')
+    assert item_fingerprint(None, None, None) == item_fingerprint('', '', '')
+    assert 0 <= item_fingerprint('amazon', 'B0001', 'Echo Dot') < 1 << 64
+
+
+def test_bloom_slice_has_no_false_negatives():
+    bloom_slice = BloomSlice(capacity=1000, error_rate=0.01)
+    fingerprints = [item_fingerprint('amazon', str(i), 'title') for i in range(1000)]
+    for fingerprint in fingerprints:
+        bloom_slice.add(fingerprint)
+    assert all(fingerprint in bloom_slice for fingerprint in fingerprints)
+    assert bloom_slice.is_full
+
+
+def test_bloom_slice_false_positive_rate_is_near_target():
+    bloom_slice = BloomSlice(capacity=2000, error_rate=0.01)
+    for i in range(2000):
+        bloom_slice.add(item_fingerprint('amazon', str(i), 'title'))
+    false_positives = sum(item_fingerprint('walmart', str(i), 'title') in bloom_slice for i in range(10000))
+    assert false_positives / 10000 < 0.03
+
+
+def test_scalable_filter_grows_within_budget():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01, max_bytes=1024 * 1024)
+    fingerprints = [item_fingerprint('amazon', str(i), 'title') for i in range(1000)]
+    for fingerprint in fingerprints:
+        bloom.add(fingerprint, now=0)
+    assert len(bloom.slices) > 1
+    assert [bloom_slice.step for bloom_slice in bloom.slices] == list(range(len(bloom.slices)))
+    assert all(fingerprint in bloom for fingerprint in fingerprints)
+    assert bloom.count == 1000
+
+
+def test_scalable_filter_stops_growing_at_budget():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01, max_bytes=512)
+    for i in range(1000):
+        bloom.add(item_fingerprint('amazon', str(i), 'title'), now=0)
+    assert bloom.budget_exhausted
+    assert bloom.size_bytes <= 512
+    assert bloom.count == 1000
+
+
+def test_slices_expire_after_ttl():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01, ttl=WEEK, windows=7)
+    old = item_fingerprint('amazon', 'old', 'title')
+    new = item_fingerprint('amazon', 'new', 'title')
+    bloom.add(old, now=10 * DAY)
+    bloom.add(new, now=14 * DAY)
+    assert bloom.expire(now=16 * DAY) == 0
+    assert old in bloom
+
+    assert bloom.expire(now=18.5 * DAY) == 1
+    assert old not in bloom
+    assert new in bloom
+
+
+def test_slice_over_budget_lives_until_its_last_window_expires():
+    # Past the memory budget later windows write into the existing slice,
+    # which must then be kept until their items expire too
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01, max_bytes=1, ttl=WEEK, windows=7)
+    bloom.add(item_fingerprint('amazon', 'first', 'title'), now=0)
+    late = item_fingerprint('amazon', 'late', 'title')
+    bloom.add(late, now=3.5 * DAY)
+    assert len(bloom.slices) == 1
+    assert bloom.slices[0].last_window == 3
+
+    assert bloom.expire(now=8.5 * DAY) == 0
+    assert late in bloom
+    assert bloom.expire(now=11.5 * DAY) == 1
+    assert late not in bloom
+
+
+def test_store_suppresses_repeats_across_runs(tmp_path):
+    path = str(tmp_path / 'seen.sqlite3')
+    fingerprints = [item_fingerprint('amazon', str(i), 'title') for i in range(50)]
+
+    store = SeenStore(path, initial_capacity=100, flush_every=10)
+    assert not any(store.seen(fingerprint) for fingerprint in fingerprints)
+    assert all(store.seen(fingerprint) for fingerprint in fingerprints)
+    store.close()
+
+    reopened = SeenStore(path, initial_capacity=100)
+    assert reopened.bloom.count == 50
+    assert all(reopened.seen(fingerprint) for fingerprint in fingerprints)
+    assert not reopened.seen(item_fingerprint('amazon', 'other', 'title'))
+    reopened.close()
+
+
+def test_store_sees_items_flushed_by_another_process(tmp_path):
+    path = str(tmp_path / 'seen.sqlite3')
+    first = SeenStore(path, initial_capacity=100)
+    second = SeenStore(path, initial_capacity=100)
+    fingerprint = item_fingerprint('amazon', 'B0001', 'title')
+
+    assert not first.seen(fingerprint)
+    first.flush()
+    second.flush()
+    assert second.seen(fingerprint)
+    first.close()
+    second.close()
+
+
+def test_store_passes_items_again_after_ttl(tmp_path, monkeypatch):
+    clock = [100 * DAY]
+    monkeypatch.setattr('amazonscraper.seen_store.time.time', lambda: clock[0])
+    store = SeenStore(str(tmp_path / 'seen.sqlite3'), initial_capacity=100, ttl=WEEK)
+    fingerprint = item_fingerprint('amazon', 'B0001', 'title')
+
+    assert not store.seen(fingerprint)
+    store.flush()
+    clock[0] += 3 * DAY
+    assert store.seen(fingerprint)
+
+    clock[0] += 5 * DAY
+    assert not store.seen(fingerprint)
+    assert store.seen(fingerprint)
+    store.close()
+
+
+@pytest.mark.parametrize('ttl', [None, WEEK])
+def test_close_is_idempotent(tmp_path, ttl):
+    store = SeenStore(str(tmp_path / 'seen.sqlite3'), ttl=ttl, initial_capacity=100)
+    store.seen(item_fingerprint('amazon', 'B0001', 'title'))
+    store.close()
+    store.close()
+    assert store.connection is None
@@ -4,20 +4,29 @@ Supports Amazon, Walmart, Target, and Best Buy with Playwright browser automatio
 """
 
 import asyncio
+import hashlib
 import json
 import random
+import re
+import sys
 import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 
 
 class UnifiedEcommerceScraper:
-    def __init__(self, platform='amazon', keywords='electronics', max_pages=3):
+    def __init__(self, platform='amazon', keywords='electronics', max_pages=3, db_manager=None):
         self.platform = platform.lower()
         self.keywords = keywords
         self.max_pages = max_pages
         self.scraped_products = []
         
+        # Optional AsyncDatabaseManager; each page is upserted in the background
+        # while the browser moves on to the next one
+        self.db_manager = db_manager
+        self.pending_writes = []
+        self.saved_count = 0
+        
         # Platform-specific configurations
         self.platform_configs = {
             'amazon': {
@@ -159,6 +168,8 @@ class UnifiedEcommerceScraper:
                         # Extract product data
                         products = await self.extract_products_from_page(page, config)
                         self.scraped_products.extend(products)
+                        if self.db_manager and products:
+                            self.pending_writes.append(asyncio.create_task(self.save_to_database(products)))
                         
                         print(f"✅ Scraped {len(products)} products from page {page_num}")
                         
@@ -178,6 +189,8 @@ class UnifiedEcommerceScraper:
             print(f"❌ Playwright scraping failed: {e}")
             # Fallback to sample data
             self.scraped_products = self.generate_sample_products()
+        
+        await self.flush_database_writes()
 
     async def extract_products_from_page(self, page, config):
         """Extract product data from the current page"""
@@ -321,6 +334,60 @@ class UnifiedEcommerceScraper:
             print(f"⚠️ Error extracting single product: {e}")
             return None
 
+    async def save_to_database(self, products):
+        """Upsert one page of scraped products through the async database manager"""
+        records = [record for record in map(self.to_product_record, products) if record]
+        if not records:
+            return
+        try:
+            await self.db_manager.upsert_products(records)
+            self.saved_count += len(records)
+            print(f"💾 Saved {len(records)} products to the database")
+        except Exception as e:
+            print(f"❌ Error saving products to the database: {e}")
+
+    async def flush_database_writes(self):
+        """Wait for the page writes still in flight"""
+        if self.pending_writes:
+            await asyncio.gather(*self.pending_writes)
+            self.pending_writes = []
+
+    def to_product_record(self, product):
+        """Map a scraped product onto the products table columns"""
+        try:
+            product_url = product['url'][0]
+            title = product['title'][0]
+            if not product_url or title == "Unknown Product":
+                return None
+            
+            # Platform item ids from the product URL, falling back to a URL hash
+            id_match = re.search(r'/dp/([A-Z0-9]{10})|/ip/(?:[^/]+/)?(\d+)|/A-(\d+)|skuId=(\d+)', product_url)
+            if id_match:
+                external_id = next(group for group in id_match.groups() if group)
+            else:
+                external_id = hashlib.md5(product_url.encode('utf-8')).hexdigest()
+            
+            price = self.clean_price(product['price'][0])
+            model = product['model_name'][0]
+            if isinstance(model, list):
+                model = ' '.join(model)
+            return {
+                'external_id': external_id,
+                'platform': self.platform,
+                'title': title,
+                'brand': product['brand'][0],
+                'model': model,
+                'current_price': price or None,
+                'currency': 'USD',
+                'rating': self.extract_rating(product['star_rating'][0]) or None,
+                'review_count': self.extract_review_count(product['no_rating'][0]),
+                'product_url': product_url,
+                'images': [{'url': product['img_url'][0], 'type': 'primary'}] if product['img_url'][0] else [],
+            }
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"⚠️ Skipping product that could not be mapped: {e}")
+            return None
+
     def get_base_url(self):
         """Get base URL for the platform"""
         base_urls = {
@@ -531,15 +598,31 @@ class UnifiedEcommerceScraper:
 
 
 async def main():
-    """Main function to run the scraper"""
+    """Main function to run the scraper; pass --save-db to also write to PostgreSQL"""
     platforms = ['amazon', 'walmart', 'target', 'bestbuy']
     
+    db_manager = None
+    if '--save-db' in sys.argv:
+        from database.async_db_manager import get_async_db_manager
+        db_manager = get_async_db_manager()
+        await db_manager.connect()
+    
+    try:
+        await scrape_platforms(platforms, db_manager)
+    finally:
+        if db_manager:
+            await db_manager.close()
+
+
+async def scrape_platforms(platforms, db_manager=None):
+    """Scrape each platform in turn"""
     for platform in platforms:
         print(f"\n{'='*60}")
         print(f"🛒 SCRAPING {platform.upper()}")
         print(f"{'='*60}")
         
-        scraper = UnifiedEcommerceScraper(platform=platform, keywords='electronics', max_pages=2)
+        scraper = UnifiedEcommerceScraper(platform=platform, keywords='electronics', max_pages=2,
+                                          db_manager=db_manager)
         await scraper.scrape_platform()
         scraper.save_results()
         
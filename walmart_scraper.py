@@ -6,17 +6,33 @@ This script scrapes Walmart products using browser automation
 import asyncio
 import json
 import random
+import sys
 import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 
+from unified_scraper import UnifiedEcommerceScraper
+
 
 class StandaloneWalmartScraper:
-    def __init__(self, keywords='electronics', max_pages=3):
+    platform = 'walmart'
+    
+    # Page writes work as in UnifiedEcommerceScraper
+    save_to_database = UnifiedEcommerceScraper.save_to_database
+    flush_database_writes = UnifiedEcommerceScraper.flush_database_writes
+    to_product_record = UnifiedEcommerceScraper.to_product_record
+    
+    def __init__(self, keywords='electronics', max_pages=3, db_manager=None):
         self.keywords = keywords
         self.max_pages = max_pages
         self.scraped_products = []
         
+        # Optional AsyncDatabaseManager; each page is upserted in the background
+        # while the browser moves on to the next one
+        self.db_manager = db_manager
+        self.pending_writes = []
+        self.saved_count = 0
+        
         # Build URL with keywords for Walmart USA
         self.url = f'https://www.walmart.com/search?q={keywords.replace(" ", "+")}'
         
@@ -112,6 +128,8 @@ class StandaloneWalmartScraper:
                         # Extract product data
                         products = await self.extract_products_from_page(page)
                         self.scraped_products.extend(products)
+                        if self.db_manager and products:
+                            self.pending_writes.append(asyncio.create_task(self.save_to_database(products)))
                         
                         print(f"✅ Scraped {len(products)} products from page {page_num}")
                         
@@ -131,6 +149,8 @@ class StandaloneWalmartScraper:
             print(f"❌ Playwright scraping failed: {e}")
             # Fallback to sample data
             self.scraped_products = self.generate_sample_products()
+        
+        await self.flush_database_writes()
 
     async def extract_products_from_page(self, page):
         """Extract product data from the current page"""
@@ -463,9 +483,19 @@ class StandaloneWalmartScraper:
 
 
 async def main():
-    """Main function to run the scraper"""
-    scraper = StandaloneWalmartScraper(keywords='electronics', max_pages=2)
-    await scraper.scrape_walmart()
+    """Main function to run the scraper; pass --save-db to also write to PostgreSQL"""
+    db_manager = None
+    if '--save-db' in sys.argv:
+        from database.async_db_manager import get_async_db_manager
+        db_manager = get_async_db_manager()
+        await db_manager.connect()
+    
+    try:
+        scraper = StandaloneWalmartScraper(keywords='electronics', max_pages=2, db_manager=db_manager)
+        await scraper.scrape_walmart()
+    finally:
+        if db_manager:
+            await db_manager.close()
     scraper.save_results()
     
     print(f"\n🎉 Walmart scraping completed! Found {len(scraper.scraped_products)} products")